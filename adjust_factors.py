@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+复权因子缓存
+
+行情缓存只保存不复权的日线，复权价格由每只股票的后复权因子序列现算：
+    后复权价 = 不复权价 × 当日的后复权因子
+    前复权价 = 不复权价 × 当日的后复权因子 / 最新的后复权因子
+因子是按除权除息日变化的阶梯序列，每只股票只有几十个点，以 .npz 保存在行情缓存目录下
+（factor_<代码>.npz），进程内常驻内存。切换复权方式不需要重新下载行情，只做一次向量乘法。
+因子文件每天最多向数据源更新一次；数据源不可用时使用本地已有的因子。
+"""
+import os
+import threading
+from datetime import date
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+from http_fetch import UpstreamError
+from metrics import NULL_METRICS
+from price_cache import DEFAULT_CACHE_DIR, provider_cache_dir, to_date
+from providers import get_default_provider
+
+# 复权方式：不复权、前复权、后复权
+ADJUST_MODES = ("", "qfq", "hfq")
+ADJUST_NAMES = {"": "不复权", "qfq": "前复权", "hfq": "后复权"}
+
+
+def provider_factor_fetcher(stock_code):
+    """默认数据源：通过当前默认的 DataProvider 获取后复权因子，返回 date、hfq_factor 两列"""
+    return get_default_provider().hfq_factor(stock_code)
+
+
+class AdjustFactorCache:
+    """
+    按股票缓存后复权因子
+
+    fetcher 签名为 fetcher(stock_code)，返回包含 date、hfq_factor 两列的 DataFrame，
+    每行表示从该日起生效的因子。
+    """
+
+    def __init__(self, cache_dir=None, fetcher=None, today=None):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.fetcher = fetcher or provider_factor_fetcher
+        self.today = today or date.today
+        self.fetches = 0
+        # 股票代码 -> (生效日期, 后复权因子, 最后更新日期)
+        self._factors = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, stock_code):
+        return os.path.join(self.cache_dir, f"factor_{stock_code}.npz")
+
+    def _lock_for(self, stock_code):
+        with self._locks_guard:
+            lock = self._locks.get(stock_code)
+            if lock is None:
+                lock = self._locks[stock_code] = threading.Lock()
+            return lock
+
+    def _load(self, stock_code):
+        path = self._path(stock_code)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return data["date"].astype("datetime64[D]"), data["hfq_factor"].astype(np.float64), data["fetched_on"][()]
+
+    def _save(self, stock_code, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        dates, factors, fetched_on = entry
+        path = self._path(stock_code)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, date=dates, hfq_factor=factors, fetched_on=np.datetime64(fetched_on, "D"))
+        os.replace(tmp_path, path)
+
+    def _fetch(self, stock_code):
+        frame = self.fetcher(stock_code)
+        self.fetches += 1
+        if frame is None or frame.empty:
+            return np.array([], dtype="datetime64[D]"), np.array([], dtype=np.float64)
+        dates = pd.to_datetime(frame["date"]).to_numpy().astype("datetime64[D]")
+        factors = pd.to_numeric(frame["hfq_factor"], errors="coerce").to_numpy(dtype=np.float64)
+        order = np.argsort(dates, kind="stable")
+        keep = ~np.isnan(factors[order])
+        return dates[order][keep], factors[order][keep]
+
+    def factors(self, stock_code, until=None, metrics=NULL_METRICS):
+        """
+        返回 (生效日期数组, 后复权因子数组)，按日期排序
+        本地因子在 until（默认今天）当天或之后更新过时不访问数据源
+        """
+        today = np.datetime64(self.today(), "D")
+        need = min(np.datetime64(to_date(until), "D"), today) if until is not None else today
+        with self._lock_for(stock_code):
+            entry = self._factors.get(stock_code)
+            if entry is None:
+                entry = self._load(stock_code)
+            if entry is not None and entry[2] >= need:
+                metrics.count("adjust_factor_hit")
+            else:
+                metrics.count("adjust_factor_miss")
+                try:
+                    dates, factors = self._fetch(stock_code)
+                except UpstreamError:
+                    if entry is None:
+                        raise
+                    metrics.count("adjust_factor_stale")
+                else:
+                    entry = (dates, factors, today)
+                    self._save(stock_code, entry)
+            self._factors[stock_code] = entry
+            return entry[0], entry[1]
+
+    def scale(self, stock_code, dates, adjust, until=None, metrics=NULL_METRICS):
+        """
+        每个交易日的复权系数：复权价 = 不复权价 × 系数，不复权时全为1
+        dates 为 datetime64[D] 数组，早于第一个因子生效日的交易日使用第一个因子
+        """
+        if adjust not in ADJUST_MODES:
+            raise ValueError(f"复权方式应为 {' / '.join(repr(mode) for mode in ADJUST_MODES)}")
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if adjust == "":
+            return np.ones(len(dates))
+        factor_dates, factors = self.factors(stock_code, until, metrics)
+        if len(factors) == 0:
+            return np.ones(len(dates))
+        positions = np.maximum(np.searchsorted(factor_dates, dates, side="right") - 1, 0)
+        scale = factors[positions]
+        if adjust == "qfq":
+            scale = scale / factors[-1]
+        return scale
+
+    def adjust(self, stock_code, dates, closes, adjust, until=None, metrics=NULL_METRICS):
+        """返回复权后的收盘价数组"""
+        return np.asarray(closes, dtype=np.float64) * self.scale(stock_code, dates, adjust, until, metrics)
+
+
+_default_factors = None
+_default_factors_provider = None
+_default_factors_lock = threading.Lock()
+
+
+def get_adjust_factors():
+    """返回进程内共享的复权因子缓存，默认数据源切换后会换用对应的缓存目录"""
+    global _default_factors, _default_factors_provider
+    with _default_factors_lock:
+        provider = get_default_provider()
+        if _default_factors is None or (_default_factors_provider is not None and _default_factors_provider is not provider):
+            _default_factors = AdjustFactorCache(cache_dir=provider_cache_dir(provider))
+            _default_factors_provider = provider
+        return _default_factors
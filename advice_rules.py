@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异动监管建议规则表
+
+建议由一张有序的规则表决定，按顺序取第一条满足条件的规则：
+    综合偏离度 = (|累计偏离值| + |平均日收益率偏离|) / 2
+    above      综合偏离度大于该值时满足，省略表示不限（最后一条必须省略，作为兜底）
+    direction  up 要求累计偏离值 > 0，down 要求累计偏离值 <= 0，省略表示不限
+    level      none / medium / high，供滚动扫描、盘中监控等按等级筛选
+    advice     第1天、第2天、第3天的建议
+
+内置规则与原先的 generate_advice 完全一致。修改阈值或文字不需要改代码：把
+`python advice_rules.py --dump` 的输出保存到 ~/.stock_tools/advice_rules.json
+（或环境变量 STOCK_TOOLS_ADVICE_RULES 指定的文件）后编辑即可，用 --check 检查格式。
+
+单只股票用 AdviceRules.advise 逐条比较；全市场用 rule_ids / levels / advice_texts，
+每条规则一次数组掩码运算，一遍得到全部股票的结果。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+RULES_VERSION = 1
+DEFAULT_RULES_PATH = os.environ.get(
+    "STOCK_TOOLS_ADVICE_RULES",
+    os.path.join(os.path.expanduser("~"), ".stock_tools", "advice_rules.json"),
+)
+
+# 内置规则的偏离度阈值
+HIGH_DEVIATION_THRESHOLD = 0.05
+MEDIUM_DEVIATION_THRESHOLD = 0.02
+
+LEVELS = ("none", "medium", "high")
+DIRECTIONS = ("up", "down")
+
+DEFAULT_RULES = [
+    {
+        "level": "high", "above": HIGH_DEVIATION_THRESHOLD, "direction": "up",
+        "advice": [
+            "股票表现强势，偏离大盘较多，注意监管风险，建议关注资金流向",
+            "强势股需关注后续资金持续性，警惕高位调整风险",
+            "若偏离度持续扩大，可能触发异动监管，建议谨慎操作",
+        ],
+    },
+    {
+        "level": "high", "above": HIGH_DEVIATION_THRESHOLD, "direction": "down",
+        "advice": [
+            "股票表现弱势，持续跑输大盘，关注基本面变化",
+            "弱势股需关注是否有资金抄底，或存在利空消息",
+            "若持续弱势，可能影响投资者信心，建议等待企稳信号",
+        ],
+    },
+    {
+        "level": "medium", "above": MEDIUM_DEVIATION_THRESHOLD,
+        "advice": [
+            "股票有一定偏离，属于正常波动范围，继续观察",
+            "偏离度中等，建议关注后续走势是否收敛",
+            "偏离度适中，暂无明显监管风险，持续观察",
+        ],
+    },
+    {
+        "level": "none",
+        "advice": [
+            "股票走势与大盘基本同步，偏离度较小，风险较低",
+            "与大盘同步运行，符合市场预期，风险可控",
+            "走势稳定，偏离度小，暂无监管风险",
+        ],
+    },
+]
+
+
+class AdviceRules:
+    """校验后的规则表，rules 为 DEFAULT_RULES 格式的列表"""
+
+    def __init__(self, rules):
+        self.rules = [_check_rule(position, rule) for position, rule in enumerate(rules)]
+        if not self.rules or self.rules[-1]["above"] is not None or self.rules[-1]["direction"] is not None:
+            raise ValueError("最后一条规则不能设置 above 或 direction，以保证每只股票都有建议")
+        self.advice = [tuple(rule["advice"]) for rule in self.rules]
+        self.level_codes = [LEVELS.index(rule["level"]) for rule in self.rules]
+
+    def thresholds(self, level):
+        """返回等级为 level 的规则中最小的 above，没有时返回None"""
+        values = [rule["above"] for rule in self.rules if rule["level"] == level and rule["above"] is not None]
+        return min(values) if values else None
+
+    def rule_id(self, cumulative_deviation, avg_deviation):
+        """单只股票满足的第一条规则的序号"""
+        combined = (abs(cumulative_deviation) + abs(avg_deviation)) / 2
+        for position, rule in enumerate(self.rules):
+            if rule["above"] is not None and not combined > rule["above"]:
+                continue
+            if rule["direction"] == "up" and not cumulative_deviation > 0:
+                continue
+            if rule["direction"] == "down" and cumulative_deviation > 0:
+                continue
+            return position
+        return len(self.rules) - 1
+
+    def advise(self, cumulative_deviation, avg_deviation):
+        """单只股票的 (第1天, 第2天, 第3天) 建议"""
+        return self.advice[self.rule_id(cumulative_deviation, avg_deviation)]
+
+    def rule_ids(self, cumulative_deviation, avg_deviation):
+        """数组版 rule_id，输入为形状相同的数组，返回每个元素满足的第一条规则的序号"""
+        cumulative_deviation = np.asarray(cumulative_deviation, dtype=np.float64)
+        avg_deviation = np.asarray(avg_deviation, dtype=np.float64)
+        combined = (np.abs(cumulative_deviation) + np.abs(avg_deviation)) / 2
+        up = cumulative_deviation > 0
+        result = np.full(combined.shape, len(self.rules) - 1, dtype=np.int16)
+        undecided = np.ones(combined.shape, dtype=bool)
+        for position, rule in enumerate(self.rules[:-1]):
+            mask = undecided.copy()
+            if rule["above"] is not None:
+                mask &= combined > rule["above"]
+            if rule["direction"] == "up":
+                mask &= up
+            elif rule["direction"] == "down":
+                mask &= ~up
+            result[mask] = position
+            undecided &= ~mask
+        return result
+
+    def levels(self, cumulative_deviation, avg_deviation):
+        """每个元素的等级编号：0 none，1 medium，2 high"""
+        return np.array(self.level_codes, dtype=np.int8)[self.rule_ids(cumulative_deviation, avg_deviation)]
+
+    def advice_texts(self, cumulative_deviation, avg_deviation):
+        """每个元素第1天至第3天的建议，形状为 输入形状 + (3,) 的字符串数组"""
+        return np.array(self.advice)[self.rule_ids(cumulative_deviation, avg_deviation)]
+
+    def to_json(self):
+        return {"version": RULES_VERSION, "rules": self.rules}
+
+
+def _check_rule(position, rule):
+    name = f"第{position + 1}条规则"
+    if not isinstance(rule, dict):
+        raise ValueError(f"{name}应为对象")
+    unknown = set(rule) - {"level", "above", "direction", "advice"}
+    if unknown:
+        raise ValueError(f"{name}包含未知的字段: {', '.join(sorted(unknown))}")
+    level = rule.get("level")
+    if level not in LEVELS:
+        raise ValueError(f"{name}的 level 应为 {' / '.join(LEVELS)}")
+    above = rule.get("above")
+    if above is not None and (isinstance(above, bool) or not isinstance(above, (int, float)) or above < 0):
+        raise ValueError(f"{name}的 above 应为非负数")
+    direction = rule.get("direction")
+    if direction is not None and direction not in DIRECTIONS:
+        raise ValueError(f"{name}的 direction 应为 {' / '.join(DIRECTIONS)}")
+    advice = rule.get("advice")
+    if not isinstance(advice, list) or len(advice) != 3 or not all(isinstance(text, str) for text in advice):
+        raise ValueError(f"{name}的 advice 应为第1天至第3天的三条文字")
+    return {"level": level, "above": None if above is None else float(above), "direction": direction,
+            "advice": list(advice)}
+
+
+def load_rules(path):
+    """读取规则文件，格式不正确时抛出 ValueError"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or data.get("version") != RULES_VERSION:
+        raise ValueError(f"不支持的规则文件版本: {path}")
+    return AdviceRules(data.get("rules") or [])
+
+
+_default_rules = None
+_default_rules_lock = threading.Lock()
+
+
+def get_advice_rules():
+    """返回进程内共享的规则表：规则文件存在时读取它，否则使用内置规则"""
+    global _default_rules
+    with _default_rules_lock:
+        if _default_rules is None:
+            if os.path.exists(DEFAULT_RULES_PATH):
+                _default_rules = load_rules(DEFAULT_RULES_PATH)
+            else:
+                _default_rules = AdviceRules(DEFAULT_RULES)
+        return _default_rules
+
+
+def set_advice_rules(rules):
+    """替换进程内共享的规则表，rules 为 AdviceRules 或 None（下次使用时重新读取）"""
+    global _default_rules
+    with _default_rules_lock:
+        _default_rules = rules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="异动监管建议规则表")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--dump", action="store_true", help="打印内置规则，可保存为规则文件后编辑")
+    group.add_argument("--check", metavar="FILE", help="检查规则文件的格式")
+    args = parser.parse_args(argv)
+
+    if args.dump:
+        json.dump(AdviceRules(DEFAULT_RULES).to_json(), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+    try:
+        rules = load_rules(args.check)
+    except (OSError, ValueError) as e:
+        print(f"规则文件无效: {str(e)}", file=sys.stderr)
+        return 1
+    print(f"规则文件有效，共{len(rules.rules)}条规则")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分析流程的 asyncio 接口
+
+股票历史和大盘指数互不依赖，这里把两次阻塞的数据源调用放到线程池中同时进行，
+单只股票的耗时约等于较慢的一次获取，而不是两者之和。
+同时进行中的相同请求（例如多只股票共用的同一指数区间）只获取一次，结果共享。
+
+    result = asyncio.run(analyze_async("600000", "2025-01-02", "2025-01-24"))
+    results = asyncio.run(analyze_many_async(["600000", "000001"], "2025-01-02", "2025-01-24"))
+"""
+import asyncio
+import threading
+
+from analysis_core import (
+    DEFAULT_ADJUST,
+    AnalysisError,
+    compute_result,
+    fetch_index_history,
+    fetch_stock_history,
+    get_index_for_stock,
+    validate_adjust,
+    validate_request,
+)
+from metrics import NULL_METRICS, make_metrics
+
+DEFAULT_CONCURRENCY = 8
+
+
+class _LockedMetrics:
+    """两次获取在不同线程中同时记录指标，用锁保护同一个 Metrics"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.enabled = metrics.enabled
+        self._lock = threading.Lock()
+
+    def mark(self, stage, rows=None):
+        with self._lock:
+            self.metrics.mark(stage, rows)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.metrics.count(name, value)
+
+
+class AsyncAnalyzer:
+    """
+    在线程池中执行阻塞的数据源调用，最多同时进行 concurrency 个
+    同一个 key 的调用在完成前只执行一次，之后的调用方等待同一个结果
+    一个 AsyncAnalyzer 只能在一个事件循环中使用
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, executor=None):
+        if concurrency < 1:
+            raise ValueError("concurrency 必须大于0")
+        self.concurrency = concurrency
+        self.executor = executor
+        self.coalesced = 0
+        self._semaphore = None
+        self._in_flight = {}
+
+    async def run(self, key, func, *args):
+        """在线程池中执行 func(*args)；相同 key 的请求进行中时直接等待它的结果"""
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(self._execute(func, *args))
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _execute(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def analyze(self, stock_code, start_date, end_date, metrics=None, adjust=DEFAULT_ADJUST):
+        """与 analysis_core.analyze 相同，但同时获取股票和指数数据；由调用方负责 metrics 的 begin/finish"""
+        metrics = metrics or NULL_METRICS
+        stock_code, start_date, end_date = validate_request(stock_code, start_date, end_date)
+        adjust = validate_adjust(adjust)
+        index_symbol, _ = get_index_for_stock(stock_code)
+        shared = _LockedMetrics(metrics) if metrics.enabled else NULL_METRICS
+        # 两个请求都完成后再处理异常，避免一个失败时另一个在后台继续写指标
+        stock_arrays, index_arrays = await asyncio.gather(
+            self.run(("stock", stock_code, start_date, end_date, adjust), fetch_stock_history,
+                     stock_code, start_date, end_date, shared, adjust),
+            self.run(("index", index_symbol, start_date, end_date), fetch_index_history, index_symbol, start_date, end_date, shared),
+            return_exceptions=True,
+        )
+        for outcome in (stock_arrays, index_arrays):
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return compute_result(stock_code, start_date, end_date, stock_arrays, index_arrays, metrics, adjust=adjust)
+
+
+async def analyze_async(stock_code, start_date, end_date, metrics=None, analyzer=None, adjust=DEFAULT_ADJUST):
+    """
+    异步分析单只股票，返回 AnalysisResult，无法完成时抛出 AnalysisError
+    metrics 为 metrics.Metrics 时记录各阶段耗时；两次获取同时进行，fetch_stock/fetch_index 按完成先后计时
+    adjust 为复权方式：""（不复权）、"qfq"（前复权）或 "hfq"（后复权）
+    """
+    analyzer = analyzer or AsyncAnalyzer()
+    metrics = metrics or NULL_METRICS
+    metrics.begin()
+    result = None
+    try:
+        result = await analyzer.analyze(stock_code, start_date, end_date, metrics, adjust)
+        return result
+    finally:
+        metrics.finish(code=stock_code, start_date=start_date, end_date=end_date, ok=result is not None)
+
+
+async def analyze_many_async(stock_codes, start_date, end_date, concurrency=DEFAULT_CONCURRENCY, metrics_sink=None, analyzer=None,
+                             adjust=DEFAULT_ADJUST):
+    """
+    异步分析多只股票，最多同时进行 concurrency 个数据源请求
+    返回 {股票代码: AnalysisResult 或 AnalysisError}，顺序与 stock_codes 相同
+    metrics_sink 不为None时每只股票的分阶段指标都会写入该输出
+    """
+    analyzer = analyzer or AsyncAnalyzer(concurrency)
+
+    async def run(stock_code):
+        try:
+            return await analyze_async(stock_code, start_date, end_date, make_metrics(metrics_sink), analyzer, adjust)
+        except AnalysisError as e:
+            return e
+
+    stock_codes = list(dict.fromkeys(stock_codes))
+    results = await asyncio.gather(*(run(code) for code in stock_codes))
+    return dict(zip(stock_codes, results))
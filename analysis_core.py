@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+单只股票偏离值分析的核心流程
+
+命令行版和图形界面版共用这里的实现：获取股票与对应大盘指数的收盘价，计算区间累计涨幅、
+日均收益率和偏离值，生成异动监管建议，返回 AnalysisResult。
+模块本身只导入标准库，numpy、行情缓存和数据源在第一次分析时才加载，
+命令行的 --help 和输入校验因此不需要等待 pandas、akshare 导入。
+
+计算口径与原先基于 pandas 的流程逐位一致：
+- 累计涨幅 = (区间最后收盘价 - 区间第一个收盘价) / 区间第一个收盘价
+- 日收益率 = 收盘价 / 前一交易日收盘价 - 1，按日期与指数收益率内连接后去掉缺失值再求平均
+"""
+import re
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+from adjust_factors import ADJUST_MODES, ADJUST_NAMES
+from advice_rules import HIGH_DEVIATION_THRESHOLD, MEDIUM_DEVIATION_THRESHOLD, get_advice_rules
+from benchmark_table import get_benchmark_table
+from trading_calendar import align_sorted
+from trigger_projection import DEFAULT_INDEX_MOVE, default_threshold, project_for_stock
+
+# 复权方式：默认不复权，前复权、后复权价格由 adjust_factors 按缓存的复权因子现算
+DEFAULT_ADJUST = ""
+
+# 分析过程中各步骤对应的进度，与图形界面的进度条一致
+PROGRESS_FETCH_STOCK = 0.2
+PROGRESS_FETCH_INDEX = 0.4
+PROGRESS_RETURNS = 0.5
+PROGRESS_DEVIATION = 0.6
+PROGRESS_ADVICE = 0.8
+
+_STOCK_CODE_PATTERN = re.compile(r"^\d{6}$")
+
+
+class AnalysisError(Exception):
+    """分析无法完成，消息为面向用户的中文说明"""
+
+
+def calculate_deviation(stock_returns, index_returns):
+    """
+    计算股票相对于大盘的偏离值
+    偏离值 = 股票收益率 - 大盘收益率
+    """
+    if len(stock_returns) == 0 or len(index_returns) == 0:
+        return 0.0
+
+    stock_avg = np.mean(stock_returns)
+    index_avg = np.mean(index_returns)
+
+    return stock_avg - index_avg
+
+
+def generate_advice(cumulative_deviation, avg_deviation):
+    """
+    根据偏离值生成异动监管建议，返回 (第1天, 第2天, 第3天)
+    规则和阈值来自 advice_rules 的规则表，内置规则按综合偏离度分为较大（再分强势/弱势）、中等、较小
+    """
+    return get_advice_rules().advise(cumulative_deviation, avg_deviation)
+
+
+def get_index_for_stock(stock_code):
+    """
+    根据股票代码格式确定对应的大盘指数，返回 (指数代码, 指数名称)
+    对应关系见 benchmark_table：科创板用科创50，北交所用北证50，其余按交易所和板块
+    """
+    return get_benchmark_table().board(stock_code)
+
+
+def validate_request(stock_code, start_date, end_date):
+    """
+    校验并规范化输入，返回去掉首尾空白的 (股票代码, 起始日期, 结束日期)
+    输入无效时抛出 AnalysisError，不需要加载任何数据
+    """
+    stock_code = (stock_code or "").strip()
+    start_date = (start_date or "").strip()
+    end_date = (end_date or "").strip()
+    if not stock_code or not start_date or not end_date:
+        raise AnalysisError("请输入有效的股票代码和日期范围")
+    if not _STOCK_CODE_PATTERN.match(stock_code):
+        raise AnalysisError(f"股票代码应为6位数字: {stock_code}")
+    for value in (start_date, end_date):
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            raise AnalysisError(f"日期格式应为YYYY-MM-DD: {value}")
+    if start_date > end_date:
+        raise AnalysisError("起始日期不能晚于结束日期")
+    return stock_code, start_date, end_date
+
+
+def validate_adjust(adjust):
+    """校验复权方式，None 视为不复权"""
+    adjust = adjust or DEFAULT_ADJUST
+    if adjust not in ADJUST_MODES:
+        raise AnalysisError(f"复权方式应为 qfq（前复权）或 hfq（后复权），不复权时留空: {adjust}")
+    return adjust
+
+
+@dataclass
+class AnalysisResult:
+    """一次分析的结果"""
+
+    stock_code: str
+    index_symbol: str
+    index_name: str
+    start_date: str
+    end_date: str
+    stock_cumulative_return: float
+    index_cumulative_return: float
+    deviation: float
+    stock_avg_return: float
+    index_avg_return: float
+    advice: tuple
+    analyzed_at: datetime = field(default_factory=datetime.now)
+    # 未来第1～3天的触发价格（trigger_projection.TriggerPrice），以及预测时假设的大盘每日涨跌和阈值
+    trigger_prices: tuple = ()
+    index_move: float = DEFAULT_INDEX_MOVE
+    trigger_threshold: float = None
+    adjust: str = DEFAULT_ADJUST
+
+    @property
+    def avg_deviation(self):
+        """日均收益率偏离值"""
+        return self.stock_avg_return - self.index_avg_return
+
+    def as_tuple(self):
+        """返回原先 analyze_stock 的6元组：(股票累计涨幅, 大盘累计涨幅, 偏离值, 第1/2/3天建议)"""
+        return (self.stock_cumulative_return, self.index_cumulative_return, self.deviation) + tuple(self.advice)
+
+    def format_report(self):
+        """格式化为命令行和图形界面显示的结果文本"""
+        advice_1d, advice_2d, advice_3d = self.advice
+        projection = ""
+        if self.trigger_prices:
+            lines = "\n".join(f"- 第{item.day}天: {item.describe()}" for item in self.trigger_prices)
+            projection = (f"\n触发价格预测（其间股价不变、{self.index_name}每日涨跌{self.index_move*100:.2f}%，"
+                          f"综合偏离度超过{self.trigger_threshold*100:.2f}%）:\n{lines}\n")
+        adjust = f"（{ADJUST_NAMES[self.adjust]}）" if self.adjust else ""
+        return f"""
+股票代码: {self.stock_code}
+分析时间: {self.analyzed_at.strftime('%Y-%m-%d %H:%M:%S')}
+时间范围: {self.start_date} 至 {self.end_date}{adjust}
+
+涨跌幅分析:
+- 股票区间累计涨幅: {self.stock_cumulative_return:.4f} ({self.stock_cumulative_return*100:.2f}%)
+- {self.index_name}区间累计涨幅: {self.index_cumulative_return:.4f} ({self.index_cumulative_return*100:.2f}%)
+- 累计涨幅偏离值: {self.deviation:.4f} ({self.deviation*100:.2f}%)
+
+异动监管建议:
+- 第1天: {advice_1d}
+- 第2天: {advice_2d}
+- 第3天: {advice_3d}
+{projection}
+分析完成！
+    """
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典"""
+        return {
+            "stock_code": self.stock_code,
+            "index_symbol": self.index_symbol,
+            "index_name": self.index_name,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "stock_cumulative_return": float(self.stock_cumulative_return),
+            "index_cumulative_return": float(self.index_cumulative_return),
+            "deviation": float(self.deviation),
+            "stock_avg_return": float(self.stock_avg_return),
+            "index_avg_return": float(self.index_avg_return),
+            "avg_deviation": float(self.avg_deviation),
+            "advice": list(self.advice),
+            "trigger_prices": [item.to_dict() for item in self.trigger_prices],
+            "index_move": float(self.index_move),
+            "trigger_threshold": None if self.trigger_threshold is None else float(self.trigger_threshold),
+            "adjust": self.adjust,
+            "analyzed_at": self.analyzed_at.isoformat(timespec="seconds"),
+        }
+
+
+def fetch_stock_history(stock_code, start_date, end_date, metrics, adjust=DEFAULT_ADJUST):
+    """
+    返回股票在区间内的 (日期数组, 收盘价数组, 复权系数数组)，本地缓存已覆盖时不导入pandas
+    行情缓存只保存不复权价格，adjust 为 qfq/hfq 时收盘价乘以缓存的复权系数，不重新下载行情
+    """
+    from price_cache import get_price_cache
+
+    try:
+        dates, closes = get_price_cache().get_arrays(stock_code, start_date.replace("-", ""), end_date.replace("-", ""), metrics=metrics)
+    except Exception as e:
+        raise AnalysisError(f"获取股票数据时出现错误: {str(e)}") from e
+    metrics.mark("fetch_stock", rows=len(dates))
+    if len(dates) == 0:
+        raise AnalysisError("无法获取股票数据，请检查股票代码和日期范围是否正确")
+    if adjust == DEFAULT_ADJUST:
+        return dates, closes, np.ones(len(closes))
+    from adjust_factors import get_adjust_factors
+
+    try:
+        scale = get_adjust_factors().scale(stock_code, dates, adjust, until=end_date, metrics=metrics)
+    except Exception as e:
+        raise AnalysisError(f"获取复权因子时出现错误: {str(e)}") from e
+    metrics.mark("adjust", rows=len(dates))
+    return dates, closes * scale, scale
+
+
+def fetch_index_history(index_symbol, start_date, end_date, metrics):
+    """返回指数在区间内的 (日期数组, 收盘价数组)，本地文件已覆盖时不导入pandas"""
+    from index_store import get_index_store
+
+    try:
+        index_store = get_index_store()
+        dates, closes = index_store.get_range_arrays(index_symbol, start_date, end_date, metrics=metrics)
+        metrics.mark("fetch_index", rows=len(dates))
+        if len(dates) == 0 and index_store.history(index_symbol, until=end_date).empty:
+            raise AnalysisError("无法获取大盘数据")
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise AnalysisError(f"获取大盘数据时出现错误: {str(e)}") from e
+    return dates, closes
+
+
+def _daily_returns(dates, closes):
+    """收益率 = 收盘价 / 前一收盘价 - 1，与 pandas 的 pct_change 相同，返回对应的 (日期, 收益率)"""
+    return dates[1:], closes[1:] / closes[:-1] - 1
+
+
+def compute_result(stock_code, start_date, end_date, stock_arrays, index_arrays, metrics, progress=None,
+                   index_move=DEFAULT_INDEX_MOVE, adjust=DEFAULT_ADJUST):
+    """
+    由股票和指数的 (日期, 收盘价) 计算 AnalysisResult，数据不足时抛出 AnalysisError
+    stock_arrays 也可以是 fetch_stock_history 返回的 (日期, 复权收盘价, 复权系数)，
+    此时触发价格按最后一个交易日的复权系数换算回实际价格
+    index_move 为预测触发价格时假设的大盘每日涨跌幅
+    """
+    progress = progress or _no_progress
+    index_symbol, index_name = get_index_for_stock(stock_code)
+    stock_dates, stock_closes = stock_arrays[:2]
+    index_dates, index_closes = index_arrays
+
+    # 按日期排序
+    order = np.argsort(stock_dates, kind="stable")
+    stock_dates = stock_dates[order]
+    stock_closes = stock_closes[order]
+    price_scale = float(stock_arrays[2][order][-1]) if len(stock_arrays) > 2 else 1.0
+    metrics.mark("preprocess", rows=len(stock_dates))
+
+    stock_cumulative_return = (stock_closes[-1] - stock_closes[0]) / stock_closes[0]
+    metrics.mark("filter", rows=len(index_dates))
+    if len(index_dates) < 2:
+        raise AnalysisError("指数数据不足，无法进行分析")
+    index_cumulative_return = (index_closes[-1] - index_closes[0]) / index_closes[0]
+
+    progress("正在计算偏离值...", PROGRESS_DEVIATION)
+
+    # 按日期内连接两组收益率（在已排序的指数日期上二分查找）并去掉缺失值
+    stock_return_dates, stock_returns = _daily_returns(stock_dates, stock_closes)
+    index_return_dates, index_returns = _daily_returns(index_dates, index_closes)
+    stock_rows, index_rows = align_sorted(stock_return_dates, index_return_dates)
+    stock_returns = stock_returns[stock_rows]
+    index_returns = index_returns[index_rows]
+    valid = ~(np.isnan(stock_returns) | np.isnan(index_returns))
+    stock_returns = stock_returns[valid]
+    index_returns = index_returns[valid]
+    metrics.mark("merge", rows=len(stock_returns))
+    if len(stock_returns) < 1:
+        raise AnalysisError("数据不足，无法进行分析")
+
+    stock_avg_return = stock_returns.mean()
+    index_avg_return = index_returns.mean()
+    deviation = stock_cumulative_return - index_cumulative_return
+
+    progress("正在生成异动监管建议...", PROGRESS_ADVICE)
+    advice = generate_advice(deviation, stock_avg_return - index_avg_return)
+    threshold = default_threshold()
+    trigger_prices = ()
+    if threshold is not None:
+        trigger_prices = tuple(project_for_stock(stock_dates, stock_closes, index_dates, index_closes,
+                                                 index_move, threshold))
+        if price_scale != 1.0:
+            trigger_prices = tuple(replace(item, lower=item.lower / price_scale, upper=item.upper / price_scale)
+                                   for item in trigger_prices)
+    metrics.mark("advice")
+
+    return AnalysisResult(
+        stock_code=stock_code,
+        index_symbol=index_symbol,
+        index_name=index_name,
+        start_date=start_date,
+        end_date=end_date,
+        stock_cumulative_return=stock_cumulative_return,
+        index_cumulative_return=index_cumulative_return,
+        deviation=deviation,
+        stock_avg_return=stock_avg_return,
+        index_avg_return=index_avg_return,
+        advice=advice,
+        trigger_prices=trigger_prices,
+        index_move=index_move,
+        trigger_threshold=threshold,
+        adjust=adjust,
+    )
+
+
+def _no_progress(message, fraction):
+    pass
+
+
+def analyze(stock_code, start_date, end_date, metrics=None, progress=None, cache=None,
+            index_move=DEFAULT_INDEX_MOVE, adjust=DEFAULT_ADJUST):
+    """
+    分析股票的偏离值并生成监管建议，返回 AnalysisResult
+    progress(消息, 进度) 在每个步骤开始时调用，进度为0到1之间的小数，只更新进度时消息为None
+    metrics 为 metrics.Metrics 时记录各阶段耗时、行数和缓存命中情况，由调用方负责 begin/finish
+    cache 为 result_cache.ResultCache 时先查找已有的结果，计算完成后写入（只缓存默认的 index_move）
+    index_move 为预测触发价格时假设的大盘每日涨跌幅
+    adjust 为复权方式，累计涨幅、平均收益率和偏离值都按复权后的收盘价计算
+    无法完成分析时抛出 AnalysisError
+    """
+    from metrics import NULL_METRICS
+
+    metrics = metrics or NULL_METRICS
+    progress = progress or _no_progress
+    stock_code, start_date, end_date = validate_request(stock_code, start_date, end_date)
+    adjust = validate_adjust(adjust)
+    index_symbol, index_name = get_index_for_stock(stock_code)
+
+    if cache is not None and index_move == DEFAULT_INDEX_MOVE:
+        from result_cache import result_key
+
+        key = result_key(stock_code, start_date, end_date, adjust, index_symbol)
+        result = cache.get(key)
+        if result is not None:
+            metrics.count("result_cache_hit")
+            return result
+        metrics.count("result_cache_miss")
+        result = analyze(stock_code, start_date, end_date, metrics, progress, adjust=adjust)
+        cache.put(key, result)
+        return result
+
+    progress(f"正在获取股票 {stock_code} 的数据...", PROGRESS_FETCH_STOCK)
+    stock_arrays = fetch_stock_history(stock_code, start_date, end_date, metrics, adjust)
+
+    progress(f"正在获取{index_name}数据...", PROGRESS_FETCH_INDEX)
+    index_arrays = fetch_index_history(index_symbol, start_date, end_date, metrics)
+
+    progress(None, PROGRESS_RETURNS)
+    return compute_result(stock_code, start_date, end_date, stock_arrays, index_arrays, metrics, progress,
+                          index_move, adjust)
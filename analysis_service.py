@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地分析服务（HTTP/JSON）
+
+常驻进程，其他工具通过HTTP获取偏离值，不必各自承担 akshare 的导入和行情获取开销。
+行情缓存和指数仓库在进程内常驻内存，同时到达的相同请求只计算一次。
+
+接口：
+    GET  /health                                        运行状态
+    GET  /metrics                                       请求计数、缓存命中和各阶段耗时分位数
+    GET  /analyze?code=600000&start=2025-01-02&end=2025-01-24
+    GET  /analyze?code=600000&trading_days=10           最近N个交易日
+    GET  /analyze?code=600000&trading_days=10&adjust=qfq 前复权（hfq 后复权，默认不复权）
+    POST /analyze  {"codes": ["600000", "000001"], "start": "...", "end": "..."}  批量分析
+
+python analysis_service.py --port 8765
+python analysis_service.py --provider synthetic      # 完全离线运行
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import analysis_core
+from analysis_core import AnalysisError
+from metrics import Metrics, MemorySink
+from price_cache import get_price_cache
+from providers import get_default_provider, provider_from_spec, set_default_provider
+from result_cache import DEFAULT_MAX_ENTRIES, ResultCache
+from trading_calendar import last_trading_days
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MEMORY_SIZE = 6000
+DEFAULT_WORKERS = 8
+MAX_BATCH = 10000
+METRICS_WINDOW = 10000
+
+
+class SingleFlight:
+    """同一个 key 同时只执行一次，其余调用方等待并共享它的结果或异常"""
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class BadRequest(Exception):
+    """请求参数无效"""
+
+
+class AnalysisService:
+    """服务的业务部分，与HTTP无关，便于直接调用和测试"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, memory_size=DEFAULT_MEMORY_SIZE, result_cache=None):
+        self.started = time.time()
+        self.workers = workers
+        self.result_cache = result_cache or ResultCache()
+        self.sink = MemorySink(max_records=METRICS_WINDOW)
+        self.flights = SingleFlight()
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis")
+        get_price_cache().memory_size = memory_size
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def analyze(self, stock_code, start_date, end_date, adjust=analysis_core.DEFAULT_ADJUST):
+        """分析一只股票并返回结果字典；相同的请求同时到达时只计算一次"""
+        self._count("requests")
+        try:
+            key = analysis_core.validate_request(stock_code, start_date, end_date) + (analysis_core.validate_adjust(adjust),)
+            return self.flights.do(key, lambda: self._analyze(*key))
+        except AnalysisError:
+            self._count("errors")
+            raise
+
+    def _analyze(self, stock_code, start_date, end_date, adjust):
+        metrics = Metrics(self.sink)
+        result = None
+        try:
+            result = analysis_core.analyze(stock_code, start_date, end_date, metrics=metrics, cache=self.result_cache,
+                                           adjust=adjust)
+            return result.to_dict()
+        finally:
+            metrics.finish(code=stock_code, start_date=start_date, end_date=end_date, ok=result is not None)
+
+    def analyze_batch(self, stock_codes, start_date, end_date, adjust=analysis_core.DEFAULT_ADJUST):
+        """并发分析多只股票，返回 {股票代码: 结果字典 或 {"error": 消息}}"""
+        stock_codes = list(dict.fromkeys(stock_codes))
+        if len(stock_codes) > MAX_BATCH:
+            raise BadRequest(f"单次最多分析{MAX_BATCH}只股票")
+
+        def run(stock_code):
+            try:
+                return self.analyze(stock_code, start_date, end_date, adjust)
+            except AnalysisError as e:
+                return {"error": str(e)}
+
+        return dict(zip(stock_codes, self._pool.map(run, stock_codes)))
+
+    def health(self):
+        return {
+            "status": "ok",
+            "provider": get_default_provider().name,
+            "uptime_seconds": round(time.time() - self.started, 3),
+        }
+
+    def metrics(self):
+        price_cache = get_price_cache()
+        with self._lock:
+            requests, errors = self.requests, self.errors
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "requests": requests,
+            "errors": errors,
+            "coalesced": self.flights.coalesced,
+            "price_cache": {"hits": price_cache.hits, "misses": price_cache.misses},
+            "result_cache": self.result_cache.stats(),
+            "counters": self.sink.counters(),
+            "stages": self.sink.summary(),
+        }
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+def _date_param(params, name):
+    """读取 YYYY-MM-DD 格式的日期参数，缺省时返回None，格式错误时抛出 BadRequest"""
+    value = params.get(name)
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise BadRequest(f"{name} 的日期格式应为YYYY-MM-DD: {value}")
+    return value
+
+
+def _resolve_range(params):
+    """从请求参数得到 (起始日期, 结束日期)：start/end，或 trading_days（可配合 end）"""
+    end_date = _date_param(params, "end") or datetime.now().strftime("%Y-%m-%d")
+    start_date = _date_param(params, "start")
+    if start_date:
+        if start_date > end_date:
+            raise BadRequest("起始日期不能晚于结束日期")
+        return start_date, end_date
+    trading_days = params.get("trading_days")
+    if trading_days is None:
+        raise BadRequest("缺少 start 或 trading_days 参数")
+    try:
+        trading_days = int(trading_days)
+    except (TypeError, ValueError):
+        raise BadRequest("trading_days 应为正整数")
+    if trading_days < 1:
+        raise BadRequest("trading_days 应为正整数")
+    return last_trading_days(trading_days, end_date)
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """把HTTP请求转交给 server.service"""
+
+    server_version = "StockAnalysisService/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        service = self.server.service
+        if url.path == "/health":
+            self._respond(200, service.health())
+        elif url.path == "/metrics":
+            self._respond(200, service.metrics())
+        elif url.path == "/analyze":
+            self._handle(lambda: service.analyze(params.get("code", ""), *_resolve_range(params), params.get("adjust", "")))
+        else:
+            self._respond(404, {"error": f"未知的路径: {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/analyze":
+            self._respond(404, {"error": f"未知的路径: {url.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, UnicodeDecodeError):
+            self._respond(400, {"error": "请求体应为JSON"})
+            return
+        codes = body.get("codes") if isinstance(body, dict) else None
+        if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+            self._respond(400, {"error": "codes 应为股票代码列表"})
+            return
+        service = self.server.service
+        self._handle(lambda: {"results": service.analyze_batch(codes, *_resolve_range(body), body.get("adjust", ""))})
+
+    def _handle(self, func):
+        try:
+            self._respond(200, func())
+        except BadRequest as e:
+            self._respond(400, {"error": str(e)})
+        except AnalysisError as e:
+            self._respond(422, {"error": str(e)})
+        except Exception as e:
+            self._respond(500, {"error": f"分析过程中出现错误: {str(e)}"})
+
+    def _respond(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, service=None, verbose=False):
+    """创建HTTP服务器，port 为0时由系统分配端口（server.server_address[1]）"""
+    server = ThreadingHTTPServer((host, port), AnalysisRequestHandler)
+    server.daemon_threads = True
+    server.service = service or AnalysisService()
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地分析服务（HTTP/JSON）")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"监听地址，默认 {DEFAULT_HOST}")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"监听端口，默认 {DEFAULT_PORT}")
+    parser.add_argument("--provider", help="数据源：akshare、synthetic[:N]、replay:<目录> 或 record:<目录>")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"批量请求的并发数，默认{DEFAULT_WORKERS}")
+    parser.add_argument("--memory", type=int, default=DEFAULT_MEMORY_SIZE,
+                        help=f"常驻内存的股票数，默认{DEFAULT_MEMORY_SIZE}")
+    parser.add_argument("--results", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help=f"缓存的分析结果数，默认{DEFAULT_MAX_ENTRIES}")
+    parser.add_argument("--verbose", action="store_true", help="打印每个请求的访问日志")
+    args = parser.parse_args(argv)
+
+    if args.provider:
+        set_default_provider(provider_from_spec(args.provider))
+    service = AnalysisService(args.workers, args.memory, ResultCache(max_entries=args.results))
+    server = make_server(args.host, args.port, service, args.verbose)
+    print(f"分析服务已启动: http://{args.host}:{server.server_address[1]}（数据源: {get_default_provider().name}）", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+图形界面使用的后台分析线程
+
+所有分析在同一个后台线程中依次执行，请求通过队列提交：
+- 新请求会取代还没开始或正在进行的旧请求，旧请求在下一个步骤处停止，结果不再回调
+- 与正在进行的请求相同的新请求直接并入，不会重新开始
+- 已完成的结果保存在 result_cache.ResultCache 中，重复请求不再访问数据源；
+  包含今天的结果在行情更新后失效
+
+回调都在后台线程中调用，图形界面需要自己切换到主线程（如 root.after）。
+"""
+import queue
+import threading
+
+import analysis_core
+from analysis_core import DEFAULT_ADJUST, AnalysisError, get_index_for_stock
+from metrics import make_metrics
+from result_cache import ResultCache, result_key
+
+DEFAULT_CACHE_SIZE = 64
+
+_STOP = object()
+
+
+class AnalysisCancelled(Exception):
+    """请求已被更新的请求取代"""
+
+
+class AnalysisWorker:
+    """
+    单个后台线程的分析队列
+
+    on_progress(请求编号, 消息, 进度)、on_result(请求编号, AnalysisResult)、on_error(请求编号, 消息)
+    只会为最新的请求调用；消息为None时只更新进度。
+    """
+
+    def __init__(self, on_progress=None, on_result=None, on_error=None, cache_size=DEFAULT_CACHE_SIZE,
+                 metrics_sink=None, analyze=None):
+        self.on_progress = on_progress or (lambda request_id, message, fraction: None)
+        self.on_result = on_result or (lambda request_id, result: None)
+        self.on_error = on_error or (lambda request_id, message: None)
+        self.cache_size = cache_size
+        self.metrics_sink = metrics_sink
+        self.analyze = analyze or analysis_core.analyze
+        self.cache_hits = 0
+        self.cancelled = 0
+        self.cache = ResultCache(max_entries=cache_size)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._latest = 0
+        self._running = None  # (请求编号, 请求参数)
+        self._thread = threading.Thread(target=self._loop, name="analysis-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, stock_code, start_date, end_date, adjust=DEFAULT_ADJUST):
+        """提交一个分析请求并返回请求编号，之前的请求随之作废；adjust 为复权方式"""
+        key = (stock_code.strip(), start_date.strip(), end_date.strip(), adjust or DEFAULT_ADJUST)
+        with self._lock:
+            if self._running is not None and self._running[1] == key and self._running[0] == self._latest:
+                return self._latest
+            self._latest += 1
+            request_id = self._latest
+        self._queue.put((request_id, key))
+        return request_id
+
+    def is_current(self, request_id):
+        """request_id 是否仍是最新的请求"""
+        with self._lock:
+            return request_id == self._latest
+
+    def clear_cache(self):
+        self.cache.clear()
+
+    def stop(self, timeout=None):
+        """处理完当前步骤后停止后台线程"""
+        with self._lock:
+            self._latest += 1
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            # 只处理队列中最新的请求，其余的已被取代
+            while item is not _STOP and not self._queue.empty():
+                self.cancelled += 1
+                item = self._queue.get()
+            if item is _STOP:
+                return
+            request_id, key = item
+            if self.is_current(request_id):
+                self._run(request_id, key)
+            else:
+                self.cancelled += 1
+
+    def _run(self, request_id, key):
+        cache_key = result_key(*key, get_index_for_stock(key[0])[0])
+        result = self.cache.get(cache_key)
+        with self._lock:
+            if result is not None:
+                self.cache_hits += 1
+            else:
+                self._running = (request_id, key)
+        if result is not None:
+            self.on_result(request_id, result)
+            return
+
+        def progress(message, fraction):
+            if not self.is_current(request_id):
+                raise AnalysisCancelled()
+            self.on_progress(request_id, message, fraction)
+
+        metrics = make_metrics(self.metrics_sink)
+        metrics.begin()
+        result = None
+        try:
+            result = self.analyze(*key[:3], metrics=metrics, progress=progress, adjust=key[3])
+        except AnalysisCancelled:
+            self.cancelled += 1
+            return
+        except AnalysisError as e:
+            self._report_error(request_id, str(e))
+            return
+        except Exception as e:
+            self._report_error(request_id, f"分析过程中出现错误: {str(e)}")
+            return
+        finally:
+            with self._lock:
+                self._running = None
+            metrics.finish(code=key[0], start_date=key[1], end_date=key[2], ok=result is not None)
+
+        self.cache.put(cache_key, result)
+        if self.is_current(request_id):
+            self.on_result(request_id, result)
+        else:
+            self.cancelled += 1
+
+    def _report_error(self, request_id, message):
+        if self.is_current(request_id):
+            self.on_error(request_id, message)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分析流程基准测试
+
+在模拟行情上逐只调用 analysis_core.analyze（与命令行、图形界面和分析服务相同的流程），
+由 metrics.Metrics 记录各阶段耗时：获取股票数据、获取指数数据、预处理、区间筛选、合并收益率、
+生成建议，并单独测量横截面引擎的耗时和每个场景的峰值内存。
+结果写入JSON文件，可用 --compare 与之前的结果对比，发现性能回退。
+
+python bench_analysis.py                      # 1/100/5000只股票 × 1/5/20年
+python bench_analysis.py --stocks 1 100 --years 1 --output quick.json
+python bench_analysis.py --compare bench_results.json
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from analysis_core import analyze, get_index_for_stock
+from deviation_engine import build_price_matrix, cross_sectional_deviation
+from index_store import IndexStore, set_index_store
+from metrics import MemorySink, Metrics
+from price_cache import PriceCache, set_price_cache
+from providers import SyntheticProvider
+
+# analysis_core 记录的阶段，顺序与流程一致
+STAGES = ["fetch_stock", "fetch_index", "preprocess", "filter", "merge", "advice"]
+DEFAULT_OUTPUT = "bench_results.json"
+END_DATE = "2025-12-31"
+
+
+def stage_totals(sink):
+    """把每只股票的分阶段耗时累加为整个场景的耗时（秒）"""
+    totals = dict.fromkeys(STAGES, 0.0)
+    for record in sink.records:
+        for stage, seconds in record["stages"].items():
+            totals[stage] = totals.get(stage, 0.0) + seconds
+    return totals
+
+
+def run_scenario(n_stocks, years, collect_frames=True):
+    """运行一个场景，返回逐段耗时与横截面引擎耗时"""
+    end = pd.Timestamp(END_DATE)
+    start = end - pd.DateOffset(years=years)
+    provider = SyntheticProvider(n_stocks=n_stocks, start=start - pd.DateOffset(days=7), end=end)
+    start_date, end_date = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+    codes = provider.stock_codes()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        today = lambda: end.date()
+        price_cache = PriceCache(cache_dir=cache_dir, fetcher=provider.stock_hist, today=today)
+        index_store = IndexStore(cache_dir=cache_dir, fetcher=provider.index_daily, today=today)
+        set_price_cache(price_cache)
+        set_index_store(index_store)
+        try:
+            sink = MemorySink()
+            started = time.perf_counter()
+            for code in codes:
+                metrics = Metrics(sink)
+                analyze(code, start_date, end_date, metrics=metrics)
+                metrics.finish(code=code)
+            pipeline_seconds = time.perf_counter() - started
+
+            engine_seconds = None
+            if collect_frames:
+                frames = {code: price_cache.get(code, start_date, end_date) for code in codes}
+                symbols = sorted({get_index_for_stock(code)[0] for code in codes})
+                index_frames = {symbol: index_store.get_range(symbol, start_date, end_date) for symbol in symbols}
+                dates = index_frames[symbols[0]]["date"]
+                index_prices = np.column_stack([index_frames[symbol]["close"].to_numpy() for symbol in symbols])
+                prices, matrix_codes = build_price_matrix(frames, dates)
+                benchmarks = [symbols.index(get_index_for_stock(code)[0]) for code in matrix_codes]
+                started = time.perf_counter()
+                cross_sectional_deviation(prices, index_prices, benchmarks)
+                engine_seconds = time.perf_counter() - started
+        finally:
+            set_price_cache(None)
+            set_index_store(None)
+
+    return {
+        "stocks": n_stocks,
+        "years": years,
+        "trading_days": int(len(provider.calendar)),
+        "pipeline_seconds": pipeline_seconds,
+        "per_stock_ms": pipeline_seconds / n_stocks * 1000,
+        "stages_seconds": stage_totals(sink),
+        "engine_seconds": engine_seconds,
+    }
+
+
+def measure_peak_memory(n_stocks, years):
+    """在 tracemalloc 下重跑场景，返回峰值内存（字节）"""
+    tracemalloc.start()
+    try:
+        run_scenario(n_stocks, years)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def compare(results, baseline, tolerance):
+    """与基准结果对比，返回耗时超出 tolerance 比例的场景与阶段"""
+    previous = {(item["stocks"], item["years"]): item for item in baseline["scenarios"]}
+    regressions = []
+    for item in results["scenarios"]:
+        old = previous.get((item["stocks"], item["years"]))
+        if old is None:
+            continue
+        pairs = [("pipeline", old["pipeline_seconds"], item["pipeline_seconds"])]
+        # 旧结果文件中没有的阶段（阶段划分调整前的结果）不参与对比
+        pairs += [(stage, old["stages_seconds"][stage], item["stages_seconds"][stage])
+                  for stage in STAGES if stage in old["stages_seconds"]]
+        for name, before, after in pairs:
+            if before > 0 and after > before * (1 + tolerance):
+                regressions.append((item["stocks"], item["years"], name, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分析流程基准测试（模拟行情）")
+    parser.add_argument("--stocks", type=int, nargs="+", default=[1, 100, 5000], help="股票数量，默认 1 100 5000")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20], help="历史年数，默认 1 5 20")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"结果文件，默认 {DEFAULT_OUTPUT}")
+    parser.add_argument("--no-memory", action="store_true", help="不测量峰值内存（测量需要重跑一遍场景）")
+    parser.add_argument("--compare", metavar="FILE", help="与之前的结果文件对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="对比时允许的耗时增长比例，默认0.2")
+    args = parser.parse_args(argv)
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "scenarios": [],
+    }
+    for n_stocks in args.stocks:
+        for years in args.years:
+            item = run_scenario(n_stocks, years)
+            if not args.no_memory:
+                item["peak_memory_bytes"] = measure_peak_memory(n_stocks, years)
+            results["scenarios"].append(item)
+            print(f"{n_stocks}只股票 × {years}年: 流程 {item['pipeline_seconds']:.3f}s "
+                  f"（每只 {item['per_stock_ms']:.2f}ms），横截面引擎 {item['engine_seconds'] * 1000:.1f}ms")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for n_stocks, years, name, before, after in regressions:
+            print(f"性能回退: {n_stocks}只股票 × {years}年 {name}: {before:.4f}s -> {after:.4f}s")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
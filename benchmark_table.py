@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+股票代码 → 基准指数对照表，以及同时相对多个基准的偏离值
+
+对照表按代码前缀（取最长匹配）给出每只股票的：
+    board      所在板块的指数（偏离值和监管建议默认使用它）
+    composite  所在交易所的综合指数
+以及所有股票共同的基准 common（默认沪深300）。内置对照表：
+    688/689          科创50   sh000688    上证指数 sh000001
+    6                上证指数 sh000001    上证指数 sh000001
+    300/301          创业板指 sz399006    深证综指 sz399106
+    00               深证成指 sz399001    深证综指 sz399106
+    8/4/92           北证50   bj899050    北证50   bj899050
+其余代码使用上证指数。修改对照表不需要改代码：把 `python benchmark_table.py --dump`
+的输出保存到 ~/.stock_tools/benchmarks.json（或环境变量 STOCK_TOOLS_BENCHMARKS 指定的文件）后编辑。
+
+多基准偏离值：所有股票用到的指数各取一次，组成一个 交易日 × 指数 的共享矩阵，
+股票收盘价矩阵与它按交易日对齐；每增加一个基准只多一列下标，不再重复获取和合并数据。
+
+python benchmark_table.py --codes watchlist.txt --start 2025-01-02 --end 2025-03-31
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+TABLE_VERSION = 1
+DEFAULT_TABLE_PATH = os.environ.get(
+    "STOCK_TOOLS_BENCHMARKS",
+    os.path.join(os.path.expanduser("~"), ".stock_tools", "benchmarks.json"),
+)
+
+ROLES = ("board", "composite", "common")
+ROLE_NAMES = {"board": "板块指数", "composite": "综合指数", "common": "共同基准"}
+
+SSE_COMPOSITE = {"symbol": "sh000001", "name": "上证指数"}
+SZSE_COMPOSITE = {"symbol": "sz399106", "name": "深证综指"}
+BSE_50 = {"symbol": "bj899050", "name": "北证50"}
+
+DEFAULT_TABLE = {
+    "version": TABLE_VERSION,
+    "boards": [
+        {"prefixes": ["688", "689"], "board": {"symbol": "sh000688", "name": "科创50"}, "composite": SSE_COMPOSITE},
+        {"prefixes": ["6"], "board": SSE_COMPOSITE, "composite": SSE_COMPOSITE},
+        {"prefixes": ["300", "301"], "board": {"symbol": "sz399006", "name": "创业板指"}, "composite": SZSE_COMPOSITE},
+        {"prefixes": ["00"], "board": {"symbol": "sz399001", "name": "深证成指"}, "composite": SZSE_COMPOSITE},
+        {"prefixes": ["8", "4", "92"], "board": BSE_50, "composite": BSE_50},
+    ],
+    "default": {"board": SSE_COMPOSITE, "composite": SSE_COMPOSITE},
+    "common": [{"symbol": "sh000300", "name": "沪深300"}],
+}
+
+
+def _check_index(value, name):
+    if (not isinstance(value, dict) or not isinstance(value.get("symbol"), str) or not value["symbol"]
+            or not isinstance(value.get("name"), str)):
+        raise ValueError(f"{name} 应为包含 symbol 和 name 的对象")
+    return value["symbol"], value["name"]
+
+
+class BenchmarkTable:
+    """校验后的对照表，table 为 DEFAULT_TABLE 格式的字典"""
+
+    def __init__(self, table):
+        if not isinstance(table, dict) or table.get("version") != TABLE_VERSION:
+            raise ValueError("不支持的对照表版本")
+        self.prefixes = []
+        for position, row in enumerate(table.get("boards") or []):
+            name = f"第{position + 1}个板块"
+            prefixes = row.get("prefixes") if isinstance(row, dict) else None
+            if not isinstance(prefixes, list) or not prefixes or not all(isinstance(p, str) and p for p in prefixes):
+                raise ValueError(f"{name}的 prefixes 应为非空的代码前缀列表")
+            entry = (_check_index(row.get("board"), f"{name}的 board"),
+                     _check_index(row.get("composite", row.get("board")), f"{name}的 composite"))
+            self.prefixes.extend((prefix, entry) for prefix in prefixes)
+        # 最长前缀优先
+        self.prefixes.sort(key=lambda item: len(item[0]), reverse=True)
+        default = table.get("default") or {}
+        self.default = (_check_index(default.get("board"), "default 的 board"),
+                        _check_index(default.get("composite", default.get("board")), "default 的 composite"))
+        self.common = [_check_index(value, "common 中的指数") for value in table.get("common") or []]
+        self.table = table
+
+    def _entry(self, stock_code):
+        for prefix, entry in self.prefixes:
+            if stock_code.startswith(prefix):
+                return entry
+        return self.default
+
+    def board(self, stock_code):
+        """股票所在板块的指数 (指数代码, 指数名称)"""
+        return self._entry(stock_code)[0]
+
+    def benchmarks(self, stock_code, roles=ROLES):
+        """返回 [(用途, 指数代码, 指数名称)]，按 roles 的顺序，同一指数只出现一次"""
+        board, composite = self._entry(stock_code)
+        candidates = {"board": [board], "composite": [composite], "common": self.common}
+        result, seen = [], set()
+        for role in roles:
+            for symbol, name in candidates[role]:
+                if symbol not in seen:
+                    seen.add(symbol)
+                    result.append((role, symbol, name))
+        return result
+
+
+def load_table(path):
+    """读取对照表文件，格式不正确时抛出 ValueError"""
+    with open(path, encoding="utf-8") as f:
+        return BenchmarkTable(json.load(f))
+
+
+_default_table = None
+_default_table_lock = threading.Lock()
+
+
+def get_benchmark_table():
+    """返回进程内共享的对照表：对照表文件存在时读取它，否则使用内置对照表"""
+    global _default_table
+    with _default_table_lock:
+        if _default_table is None:
+            if os.path.exists(DEFAULT_TABLE_PATH):
+                _default_table = load_table(DEFAULT_TABLE_PATH)
+            else:
+                _default_table = BenchmarkTable(DEFAULT_TABLE)
+        return _default_table
+
+
+def set_benchmark_table(table):
+    """替换进程内共享的对照表，table 为 BenchmarkTable 或 None（下次使用时重新读取）"""
+    global _default_table
+    with _default_table_lock:
+        _default_table = table
+
+
+def load_index_matrix(index_symbols, start_date, end_date, index_store=None):
+    """
+    每个指数取一次区间内的收盘价，返回 (交易日, 交易日 × 指数 的收盘价矩阵)
+    交易日为全部指数交易日的并集，某个指数缺少的日期为NaN
+    """
+    from index_store import get_index_store
+
+    index_store = index_store or get_index_store()
+    series = [index_store.get_range_arrays(symbol, start_date, end_date) for symbol in index_symbols]
+    dates = np.unique(np.concatenate([days for days, _ in series])) if series else np.array([], dtype="datetime64[D]")
+    matrix = np.full((len(dates), len(series)), np.nan)
+    for column, (days, closes) in enumerate(series):
+        matrix[np.searchsorted(dates, days), column] = closes
+    return dates, matrix
+
+
+def multi_benchmark_layout(stock_codes, roles=ROLES, table=None):
+    """
+    返回 (指数代码列表, 指数名称列表, 基准列号矩阵, 用途矩阵)
+    每只股票的基准取自 table.benchmarks：按 roles 的顺序，同一指数只出现一次，共同基准可以有多个。
+    两个矩阵的形状均为 (最多的基准数, 股票数)，第 k 行为每只股票第 k 个基准的列号和用途；
+    基准较少的股票多出的位置用途为None，列号指向它的第一个基准
+    """
+    table = table or get_benchmark_table()
+    per_stock = [table.benchmarks(stock_code, roles) for stock_code in stock_codes]
+    slots = max((len(items) for items in per_stock), default=0)
+    symbols, names, columns = [], [], {}
+    benchmark_columns = np.zeros((slots, len(stock_codes)), dtype=np.intp)
+    benchmark_roles = np.full((slots, len(stock_codes)), None, dtype=object)
+    for stock_position, items in enumerate(per_stock):
+        for slot, (role, symbol, name) in enumerate(items):
+            if symbol not in columns:
+                columns[symbol] = len(symbols)
+                symbols.append(symbol)
+                names.append(name)
+            benchmark_columns[slot, stock_position] = columns[symbol]
+            benchmark_roles[slot, stock_position] = role
+        benchmark_columns[len(items):, stock_position] = benchmark_columns[0, stock_position]
+    return symbols, names, benchmark_columns, benchmark_roles
+
+
+def analyze_benchmarks(stock_codes, start_date, end_date, roles=ROLES, table=None,
+                       price_cache=None, index_store=None, adjust=""):
+    """
+    计算每只股票相对 roles 中各基准的偏离值，返回 DataFrame（每只股票每个基准一行，基准同 BenchmarkTable.benchmarks）：
+    code, role, benchmark, benchmark_name, stock_cumulative_return, index_cumulative_return,
+    deviation, stock_avg_return, index_avg_return, avg_deviation, valid
+    每只股票、每个指数的行情各获取一次，计算口径与 analyze 相同；adjust 为股票的复权方式
+    """
+    from adjust_factors import get_adjust_factors
+    from deviation_engine import multi_benchmark_deviation
+    from price_cache import get_price_cache
+    from trading_calendar import align_sorted
+
+    price_cache = price_cache or get_price_cache()
+    factors = get_adjust_factors()
+    stock_codes = list(dict.fromkeys(stock_codes))
+    symbols, names, benchmark_columns, benchmark_roles = multi_benchmark_layout(stock_codes, roles, table)
+    dates, index_prices = load_index_matrix(symbols, start_date, end_date, index_store)
+
+    start, end = start_date.replace("-", ""), end_date.replace("-", "")
+    prices = np.full((len(dates), len(stock_codes)), np.nan)
+    for column, stock_code in enumerate(stock_codes):
+        stock_dates, closes = price_cache.get_arrays(stock_code, start, end)
+        if adjust:
+            closes = factors.adjust(stock_code, stock_dates, closes, adjust, until=end_date)
+        stock_rows, rows = align_sorted(stock_dates, dates)
+        prices[rows, column] = closes[stock_rows]
+
+    result = multi_benchmark_deviation(prices, index_prices, benchmark_columns)
+    # 按股票排列，同一只股票的各个基准相邻；去掉基准较少的股票多出的位置
+    role_values = benchmark_roles.T.ravel()
+    used = np.array([role is not None for role in role_values], dtype=bool)
+    columns = benchmark_columns.T.ravel()[used]
+    frame = pd.DataFrame({
+        "code": np.repeat(np.array(stock_codes, dtype=object), benchmark_columns.shape[0])[used],
+        "role": role_values[used],
+        "benchmark": np.array(symbols, dtype=object)[columns],
+        "benchmark_name": np.array(names, dtype=object)[columns],
+    })
+    for name, values in result.items():
+        frame[name] = values.T.ravel()[used]
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="股票代码与基准指数对照表；多基准偏离值")
+    parser.add_argument("--dump", action="store_true", help="打印内置对照表，可保存为对照表文件后编辑")
+    parser.add_argument("--codes", metavar="FILE", help="股票代码列表文件，格式同批量模式；为 - 时从标准输入读取")
+    parser.add_argument("--start", help="起始日期（YYYY-MM-DD）")
+    parser.add_argument("--end", help="结束日期（YYYY-MM-DD），默认为今天")
+    parser.add_argument("--roles", nargs="+", choices=ROLES, default=list(ROLES), help="计算哪些基准，默认全部")
+    parser.add_argument("--adjust", choices=("qfq", "hfq"), default="", help="复权方式：qfq 前复权、hfq 后复权，默认不复权")
+    args = parser.parse_args(argv)
+
+    if args.dump:
+        json.dump(DEFAULT_TABLE, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+    if not args.codes or not args.start:
+        parser.error("需要 --codes 和 --start，或使用 --dump")
+
+    from datetime import datetime
+
+    from stock_analyzer_cli import read_watchlist
+
+    if args.codes == "-":
+        stock_codes = read_watchlist(sys.stdin)
+    else:
+        with open(args.codes, encoding="utf-8") as f:
+            stock_codes = read_watchlist(f)
+    end_date = args.end or datetime.now().strftime("%Y-%m-%d")
+    frame = analyze_benchmarks(stock_codes, args.start, end_date, tuple(args.roles), adjust=args.adjust)
+    frame.to_csv(sys.stdout, index=False, float_format="%.6f")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
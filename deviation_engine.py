@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+横截面偏离值计算引擎
+
+输入为 交易日 × 股票 的收盘价矩阵（停牌日为NaN）以及每只股票对应的大盘列，
+一次NumPy运算得到全部股票的累计涨幅、平均日收益率和偏离值。
+计算口径与 stock_analyzer_cli.analyze_stock 完全一致：
+- 累计涨幅取区间内第一个和最后一个有效收盘价
+- 日收益率为相对上一个有效收盘价的涨跌幅（等同于对停牌剔除后的序列做 pct_change）
+- 平均收益率只统计股票和大盘当天都有收益率的交易日（等同于按日期 merge 后 dropna），
+  求和顺序也与逐只计算时的 ndarray.mean() 相同，结果逐位一致
+"""
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+
+def _first_last(values, valid):
+    """返回每列第一个和最后一个有效值，以及是否存在有效值"""
+    rows = values.shape[0]
+    has_any = valid.any(axis=0)
+    first_row = valid.argmax(axis=0)
+    last_row = rows - 1 - valid[::-1].argmax(axis=0)
+    columns = np.arange(values.shape[1])
+    return values[first_row, columns], values[last_row, columns], has_any
+
+
+def _last_valid_rows(valid):
+    """每个位置之前（含）最近一个有效值所在的行，不存在时为-1"""
+    rows = valid.shape[0]
+    last_valid = np.where(valid, np.arange(rows)[:, None], -1)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    return last_valid
+
+
+def forward_fill(values):
+    """沿交易日方向用上一个有效值填充NaN，首个有效值之前仍为NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    last_valid = _last_valid_rows(~np.isnan(values))
+    filled = np.take_along_axis(values, np.maximum(last_valid, 0), axis=0)
+    filled[last_valid < 0] = np.nan
+    return filled
+
+
+def _returns(values, valid):
+    """相对上一个有效值的收益率，第一个有效值及无效位置为NaN"""
+    last_valid = _last_valid_rows(valid)
+    prev_row = np.empty_like(last_valid)
+    prev_row[0] = -1
+    prev_row[1:] = last_valid[:-1]
+    prev_values = np.take_along_axis(values, np.maximum(prev_row, 0), axis=0)
+    has_return = valid & (prev_row >= 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.where(has_return, values / prev_values - 1, np.nan)
+    return returns, has_return
+
+
+def _masked_means(values, mask):
+    """
+    每列中 mask 为真的值的平均值及个数，没有值时为NaN
+    有效值按原顺序移到每行开头后按个数分组，对连续的 (列数, 个数) 数组沿最后一维求平均：
+    NumPy 对每行使用与一维 ndarray.mean() 相同的成对求和，结果与逐列取出后求平均逐位一致
+    """
+    values = np.ascontiguousarray(values.T)
+    mask = mask.T
+    order = np.argsort(~mask, axis=1, kind="stable")
+    packed = np.take_along_axis(values, order, axis=1)
+    count = mask.sum(axis=1)
+    means = np.full(len(count), np.nan)
+    for size in np.unique(count[count > 0]):
+        rows = np.flatnonzero(count == size)
+        means[rows] = np.ascontiguousarray(packed[rows, :size]).mean(axis=1)
+    return means, count
+
+
+def cross_sectional_deviation(prices, index_prices, benchmark_columns):
+    """
+    计算全部股票相对各自大盘的偏离值
+
+    prices: 形状为 (交易日, 股票) 的收盘价矩阵，停牌或无数据为NaN
+    index_prices: 形状为 (交易日, 指数) 的指数收盘价矩阵，行与 prices 对齐
+    benchmark_columns: 长度为股票数的整数数组，表示每只股票对应 index_prices 的列
+
+    返回字典，值均为长度为股票数的数组：
+    stock_cumulative_return, index_cumulative_return, deviation,
+    stock_avg_return, index_avg_return, avg_deviation,
+    valid（满足 analyze_stock 的最少数据要求）
+    """
+    benchmark_columns = np.asarray(benchmark_columns, dtype=np.intp)
+    result = multi_benchmark_deviation(prices, index_prices, benchmark_columns[None, :])
+    return {name: values[0] for name, values in result.items()}
+
+
+def multi_benchmark_deviation(prices, index_prices, benchmark_columns):
+    """
+    同时计算每只股票相对多个基准的偏离值
+
+    benchmark_columns: 形状为 (基准数, 股票数) 的整数数组，第 k 行为每只股票第 k 个基准在 index_prices 中的列
+    返回值与 cross_sectional_deviation 相同，但每个数组的形状为 (基准数, 股票数)
+
+    股票一侧（累计涨幅、日收益率）和每个指数列只计算一次，每多一个基准只多一次对齐后的求平均
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    index_prices = np.asarray(index_prices, dtype=np.float64)
+    if index_prices.ndim == 1:
+        index_prices = index_prices[:, None]
+    benchmark_columns = np.asarray(benchmark_columns, dtype=np.intp)
+    if benchmark_columns.ndim == 1:
+        benchmark_columns = benchmark_columns[None, :]
+
+    stock_valid = ~np.isnan(prices)
+    index_valid = ~np.isnan(index_prices)
+
+    # 累计涨幅
+    stock_start, stock_end, stock_has_data = _first_last(prices, stock_valid)
+    index_start, index_end, _ = _first_last(index_prices, index_valid)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stock_cumulative_return = (stock_end - stock_start) / stock_start
+        index_cumulative_return_by_column = (index_end - index_start) / index_start
+    index_cumulative_return = index_cumulative_return_by_column[benchmark_columns]
+    deviation = stock_cumulative_return - index_cumulative_return
+
+    # 日收益率及按日期对齐后的平均值
+    stock_returns, stock_has_return = _returns(prices, stock_valid)
+    index_returns, index_has_return = _returns(index_prices, index_valid)
+    count = np.empty(benchmark_columns.shape, dtype=np.intp)
+    stock_avg_return = np.empty(benchmark_columns.shape)
+    index_avg_return = np.empty(benchmark_columns.shape)
+    for role, columns in enumerate(benchmark_columns):
+        both = stock_has_return & index_has_return[:, columns]
+        stock_avg_return[role], count[role] = _masked_means(stock_returns, both)
+        index_avg_return[role], _ = _masked_means(index_returns[:, columns], both)
+
+    index_rows = index_valid.sum(axis=0)[benchmark_columns]
+    valid = stock_has_data & (index_rows >= 2) & (count >= 1)
+
+    return {
+        "stock_cumulative_return": np.broadcast_to(stock_cumulative_return, benchmark_columns.shape).copy(),
+        "index_cumulative_return": index_cumulative_return,
+        "deviation": deviation,
+        "stock_avg_return": stock_avg_return,
+        "index_avg_return": index_avg_return,
+        "avg_deviation": stock_avg_return - index_avg_return,
+        "valid": valid,
+    }
+
+
+def build_price_matrix(stock_frames, dates, date_column="日期", price_column="收盘"):
+    """
+    将按股票代码组织的日线 DataFrame 转为收盘价矩阵
+    stock_frames: {股票代码: DataFrame}，dates: 矩阵行对应的交易日
+    返回 (矩阵, 股票代码列表)，缺失的交易日为NaN
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    codes = list(stock_frames)
+    matrix = np.full((len(dates), len(codes)), np.nan)
+    for column, code in enumerate(codes):
+        frame = stock_frames[code]
+        if frame is None or frame.empty:
+            continue
+        rows = dates.get_indexer(pd.to_datetime(frame[date_column]))
+        found = rows >= 0
+        matrix[rows[found], column] = frame[price_column].to_numpy(dtype=np.float64)[found]
+    return matrix, codes
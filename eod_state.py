@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+收盘后增量更新的逐股状态
+
+为每只股票和每个大盘指数保存滚动窗口所需的最少数据：最近 max(窗口)+1 个收盘价
+（即各窗口的基准价）、各窗口的日收益率累计和以及最后处理的交易日。
+收盘后只需把当天的收盘价逐个应用到状态上，每只股票O(1)即可得到最新偏离值和监管建议，
+不必重新加载历史。状态文件带版本号，版本不符、文件损坏或状态过期时从本地行情缓存重建。
+停牌日沿用上一个收盘价（当天收益率为0），与 rolling_scanner 的口径一致。
+"""
+import json
+import math
+import os
+import threading
+
+from index_store import get_index_store
+from price_cache import DEFAULT_CACHE_DIR, get_price_cache, to_date
+from providers import get_default_provider
+from advice_rules import LEVELS, get_advice_rules
+from analysis_core import generate_advice, get_index_for_stock
+
+STATE_VERSION = 1
+DEFAULT_WINDOWS = (3, 5, 10, 30)
+DEFAULT_STATE_PATH = os.path.join(DEFAULT_CACHE_DIR, "eod_state.json")
+
+
+def _format_date(value):
+    return to_date(value).strftime("%Y-%m-%d")
+
+
+class SeriesState:
+    """单个股票或指数的滚动状态"""
+
+    def __init__(self, windows, last_date=None, closes=None, returns=None, sums=None):
+        self.windows = tuple(windows)
+        self.capacity = max(self.windows) + 1
+        self.last_date = last_date
+        self.closes = list(closes or [])
+        self.returns = list(returns or [])
+        self.sums = {int(w): float(v) for w, v in (sums or {}).items()} or {w: 0.0 for w in self.windows}
+
+    def apply(self, trade_date, close):
+        """应用一个新交易日的收盘价，close 为None或非有限值（NaN、inf）表示停牌"""
+        if close is not None and not math.isfinite(close):
+            close = None
+        if self.closes and close is None:
+            close = self.closes[-1]
+        if close is None:
+            # 还没有任何有效收盘价时不记录，避免之后的收益率都变成NaN
+            self.last_date = trade_date
+            return
+        if self.closes:
+            daily_return = close / self.closes[-1] - 1
+            self.returns.append(daily_return)
+            for window in self.windows:
+                self.sums[window] += daily_return
+                if len(self.returns) > window:
+                    self.sums[window] -= self.returns[-window - 1]
+            if len(self.returns) > self.capacity:
+                del self.returns[0]
+        self.closes.append(close)
+        if len(self.closes) > self.capacity:
+            del self.closes[0]
+        self.last_date = trade_date
+
+    def window_returns(self, window):
+        """返回 (窗口累计涨幅, 窗口平均日收益率)，数据不足时返回None"""
+        if len(self.closes) <= window:
+            return None
+        anchor = self.closes[-window - 1]
+        return self.closes[-1] / anchor - 1, self.sums[window] / window
+
+    def to_dict(self):
+        return {
+            "last_date": self.last_date,
+            "closes": self.closes,
+            "returns": self.returns,
+            "sums": {str(w): v for w, v in self.sums.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, windows, data):
+        return cls(windows, data["last_date"], data["closes"], data["returns"], data["sums"])
+
+
+class EodStateStore:
+    """
+    全市场收盘后状态
+
+    price_cache / index_store 仅在状态缺失、过期或损坏时用于重建。
+    """
+
+    def __init__(self, path=None, windows=DEFAULT_WINDOWS, price_cache=None, index_store=None):
+        self.path = path or DEFAULT_STATE_PATH
+        self.windows = tuple(sorted(windows))
+        self.price_cache = price_cache or get_price_cache()
+        self.index_store = index_store or get_index_store()
+        self.stocks = {}
+        self.indices = {}
+        self.rebuilt = 0
+        self.skipped = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        """读取状态文件；版本或窗口不符、文件损坏时丢弃旧状态，之后按需重建"""
+        self.stocks, self.indices = {}, {}
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != STATE_VERSION or tuple(data.get("windows", ())) != self.windows:
+                return False
+            self.stocks = {code: SeriesState.from_dict(self.windows, item) for code, item in data["stocks"].items()}
+            self.indices = {symbol: SeriesState.from_dict(self.windows, item) for symbol, item in data["indices"].items()}
+        except (ValueError, KeyError, TypeError):
+            self.stocks, self.indices = {}, {}
+            return False
+        return True
+
+    def save(self):
+        """原子地写入状态文件"""
+        data = {
+            "version": STATE_VERSION,
+            "windows": list(self.windows),
+            "stocks": {code: state.to_dict() for code, state in self.stocks.items()},
+            "indices": {symbol: state.to_dict() for symbol, state in self.indices.items()},
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _trading_days(self, index_symbol, end_date):
+        """从指数历史取截至 end_date 的最近 max(窗口)+1 个交易日"""
+        history = self.index_store.history(index_symbol, until=end_date)
+        dates = history["date"].dt.strftime("%Y-%m-%d").to_numpy()
+        dates = dates[dates <= end_date]
+        return dates[-(max(self.windows) + 1):], history
+
+    def rebuild_index(self, index_symbol, end_date):
+        days, history = self._trading_days(index_symbol, end_date)
+        closes = dict(zip(history["date"].dt.strftime("%Y-%m-%d"), history["close"]))
+        state = SeriesState(self.windows)
+        for day in days:
+            state.apply(day, closes[day])
+        self.indices[index_symbol] = state
+        return state
+
+    def rebuild_stock(self, stock_code, end_date):
+        """从本地行情缓存重建一只股票的状态"""
+        index_symbol, _ = get_index_for_stock(stock_code)
+        days, _ = self._trading_days(index_symbol, end_date)
+        state = SeriesState(self.windows)
+        if len(days):
+            frame = self.price_cache.get(stock_code, days[0], end_date)
+            closes = {}
+            if not frame.empty:
+                closes = dict(zip(frame["日期"].astype(str).str[:10], frame["收盘"]))
+            for day in days:
+                state.apply(day, closes.get(day))
+        self.stocks[stock_code] = state
+        self.rebuilt += 1
+        return state
+
+    def ensure(self, stock_codes, end_date):
+        """确保状态已处理到 end_date，缺失或过期的股票/指数会被重建"""
+        end_date = _format_date(end_date)
+        with self._lock:
+            for index_symbol in {get_index_for_stock(code)[0] for code in stock_codes}:
+                state = self.indices.get(index_symbol)
+                if state is None or state.last_date != end_date:
+                    self.rebuild_index(index_symbol, end_date)
+            for stock_code in stock_codes:
+                state = self.stocks.get(stock_code)
+                if state is None or state.last_date != end_date:
+                    self.rebuild_stock(stock_code, end_date)
+
+    def _previous_day(self, index_symbol, trade_date, previous_dates):
+        """trade_date 的上一交易日：优先取指数状态原来处理到的日期，没有时从指数历史查找"""
+        previous = previous_dates.get(index_symbol)
+        if previous is None or previous >= trade_date:
+            days, _ = self._trading_days(index_symbol, trade_date)
+            days = days[days < trade_date]
+            previous = str(days[-1]) if len(days) else None
+        return previous
+
+    def apply_day(self, trade_date, stock_closes, index_closes):
+        """
+        应用一个交易日的收盘价
+        stock_closes: {股票代码: 收盘价}，缺失的股票视为停牌
+        index_closes: {指数代码: 收盘价}
+        上一交易日未处理的股票（状态过期）先从行情缓存重建到上一交易日，再应用传入的当日收盘价；
+        已处理过该日的状态不会重复应用。基准指数当天没有推进的股票不更新，记入 skipped
+        返回 {股票代码: 最新的窗口偏离值}，不含 skipped 中的股票
+        """
+        trade_date = _format_date(trade_date)
+        with self._lock:
+            previous_dates = {symbol: state.last_date for symbol, state in self.indices.items()}
+            for index_symbol, close in index_closes.items():
+                state = self.indices.get(index_symbol)
+                if state is None:
+                    state = self.rebuild_index(index_symbol, trade_date)
+                if state.last_date is None or state.last_date < trade_date:
+                    state.apply(trade_date, close)
+
+            previous_days = {}
+            self.skipped = []
+            results = {}
+            for stock_code in set(self.stocks) | set(stock_closes):
+                index_symbol, _ = get_index_for_stock(stock_code)
+                index_state = self.indices.get(index_symbol)
+                if index_state is None or index_state.last_date != trade_date:
+                    # 指数停在之前的交易日时推进股票状态，之后各窗口就与指数错开一天
+                    self.skipped.append(stock_code)
+                    continue
+                state = self.stocks.get(stock_code)
+                if state is None or state.last_date is None or state.last_date < trade_date:
+                    if index_symbol not in previous_days:
+                        previous_days[index_symbol] = self._previous_day(index_symbol, trade_date, previous_dates)
+                    previous = previous_days[index_symbol]
+                    if state is None or state.last_date != previous:
+                        # 只重建到上一交易日，当天使用传入的收盘价，不再读取当天的行情
+                        if previous is None:
+                            state = self.stocks[stock_code] = SeriesState(self.windows)
+                        else:
+                            state = self.rebuild_stock(stock_code, previous)
+                    state.apply(trade_date, stock_closes.get(stock_code))
+                results[stock_code] = self._evaluate(stock_code, state)
+            return results
+
+    def _evaluate(self, stock_code, state):
+        index_symbol, _ = get_index_for_stock(stock_code)
+        index_state = self.indices.get(index_symbol)
+        windows = {}
+        for window in self.windows:
+            stock_window = state.window_returns(window)
+            index_window = index_state.window_returns(window) if index_state else None
+            if stock_window is None or index_window is None:
+                continue
+            deviation = stock_window[0] - index_window[0]
+            avg_deviation = stock_window[1] - index_window[1]
+            windows[window] = {
+                "stock_return": stock_window[0],
+                "index_return": index_window[0],
+                "deviation": deviation,
+                "avg_deviation": avg_deviation,
+                "advice": generate_advice(deviation, avg_deviation),
+            }
+        return windows
+
+    def snapshot(self, stock_code):
+        """返回一只股票当前各窗口的偏离值和建议"""
+        with self._lock:
+            state = self.stocks.get(stock_code)
+            return self._evaluate(stock_code, state) if state else {}
+
+
+def fetch_spot_closes(provider=None):
+    """通过数据源的实时行情一次性获取全市场收盘价，收盘后调用时即为当日收盘价；停牌的股票不包含在内"""
+    spot = (provider or get_default_provider()).stock_spot().dropna(subset=["最新价"])
+    return dict(zip(spot["代码"], spot["最新价"].astype(float)))
+
+
+def run_post_close(trade_date, store=None, stock_closes=None):
+    """
+    收盘后任务：读取状态，应用当日全市场收盘价并写回
+    stock_closes 缺省时通过默认数据源的实时行情获取全市场收盘价，指数收盘价取自指数仓库
+    """
+    trade_date = _format_date(trade_date)
+    store = store or EodStateStore()
+    store.load()
+    if stock_closes is None:
+        stock_closes = fetch_spot_closes()
+    index_closes = {}
+    for index_symbol in {get_index_for_stock(code)[0] for code in stock_closes}:
+        history = store.index_store.history(index_symbol, until=trade_date)
+        day = history[history["date"] == trade_date]
+        if not day.empty:
+            index_closes[index_symbol] = float(day["close"].iloc[-1])
+    results = store.apply_day(trade_date, stock_closes, index_closes)
+    store.save()
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    from datetime import date
+
+    store = EodStateStore()
+    results = run_post_close(date.today(), store)
+    if store.skipped:
+        print(f"{len(store.skipped)} 只股票的基准指数当天没有收盘价，未更新", file=sys.stderr)
+    rules = get_advice_rules()
+    for stock_code, windows in sorted(results.items()):
+        for window, item in windows.items():
+            # 与建议相同，按规则表判断等级，只列出偏离度较大的
+            if LEVELS[rules.level_codes[rules.rule_id(item["deviation"], item["avg_deviation"])]] == "high":
+                print(f"{stock_code}\t{window}日\t{item['deviation']:.4f}\t{item['advice'][0]}")
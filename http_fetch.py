@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+行情接口的HTTP访问层
+
+所有日线请求共用一个保持连接的 requests.Session（连接池按主机复用连接），并且：
+- 连接失败、超时、HTTP 429/5xx 或返回内容无法解析时按指数退避重试，
+  每次等待 [0, min(max_backoff, backoff × 2^重试次数)] 内的随机时长，避免多个线程同时重试
+- 每个主机同时进行的请求数不超过 max_per_host；设置 rate 后每个主机每秒的请求数（含重试）不超过 rate，
+  所有使用同一客户端的调用方（批量分析、分析服务、图形界面）共享同一个令牌桶；
+  limit_rate 只在 with 块内收紧速率（如一个批次），块结束后恢复
+- 每个主机一个熔断器：连续失败 failure_threshold 次后熔断，reset_timeout 秒内的请求直接抛出
+  CircuitOpenError 而不再等待超时；之后放行一个试探请求，成功则恢复
+
+重试耗尽或熔断时抛出 UpstreamError，行情缓存和指数仓库据此改用本地已有的数据。
+"""
+import contextlib
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from lazy_import import lazy_module
+
+requests = lazy_module("requests")
+
+from rate_limit import RateLimiter
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 8.0
+DEFAULT_TIMEOUT = 15.0
+DEFAULT_MAX_PER_HOST = 8
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+
+class UpstreamError(Exception):
+    """数据源不可用：重试后仍然失败，或该主机处于熔断状态"""
+
+
+class CircuitOpenError(UpstreamError):
+    """主机处于熔断状态，请求没有发出"""
+
+
+class _RetryableStatus(Exception):
+    """HTTP 429 或 5xx，可以重试"""
+
+
+class CircuitBreaker:
+    """
+    连续失败计数熔断器，状态为 closed / open / half_open
+    open 状态持续 reset_timeout 秒后进入 half_open，只放行一个试探请求
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT, clock=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock or time.monotonic
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """当前是否可以发出请求"""
+        with self._lock:
+            if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self):
+        """一次请求结束，half_open 状态下允许下一个试探请求"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = self.clock()
+                self._probing = False
+
+
+class HttpClient:
+    """
+    带连接池、重试、按主机限流限速和熔断的 JSON GET 客户端，可被多个线程共用；rate 为None时不限速
+    effective_rate 为当前生效的速率：rate 与进行中的 limit_rate 块中最小的一个
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF,
+                 timeout=DEFAULT_TIMEOUT, max_per_host=DEFAULT_MAX_PER_HOST,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 clock=None, sleep=None, rng=None, rate=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock or time.monotonic
+        self.sleep = sleep or time.sleep
+        self.rng = rng or random.Random()
+        self.rate = rate
+        self._scoped_rates = []
+        self.effective_rate = rate
+        self.requests = 0
+        self.retried = 0
+        self._session = None
+        self._hosts = {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """共享的 requests.Session，第一次请求时创建；连接池大小与每个主机的并发上限一致"""
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.max_per_host, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def _host(self, host):
+        """返回主机的 (并发信号量, 熔断器)"""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = (
+                    threading.BoundedSemaphore(self.max_per_host),
+                    CircuitBreaker(self.failure_threshold, self.reset_timeout, self.clock),
+                )
+            return state
+
+    def set_rate(self, rate):
+        """设置每个主机每秒的请求数上限，None 为不限速"""
+        with self._lock:
+            self.rate = rate
+            self._update_rate()
+
+    @contextlib.contextmanager
+    def limit_rate(self, rate):
+        """
+        with 块内每个主机每秒的请求数不超过 rate，退出时恢复；rate 为None时不改变速率
+        多个块同时进行时（如重叠的批次）取最小的速率，一个块退出不影响其他块
+        """
+        if rate is None:
+            yield
+            return
+        with self._lock:
+            self._scoped_rates.append(rate)
+            self._update_rate()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._scoped_rates.remove(rate)
+                self._update_rate()
+
+    def _update_rate(self):
+        """调用方持有 _lock；生效的速率改变时各主机换用新的令牌桶"""
+        rates = [rate for rate in [self.rate] + self._scoped_rates if rate is not None]
+        rate = min(rates) if rates else None
+        if rate != self.effective_rate:
+            self.effective_rate = rate
+            self._limiters = {}
+
+    def _limiter(self, host):
+        with self._lock:
+            if self.effective_rate is None:
+                return None
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = RateLimiter(self.effective_rate, clock=self.clock, sleep=self.sleep)
+            return limiter
+
+    def breaker(self, url):
+        """url 所在主机的熔断器"""
+        return self._host(urlsplit(url).netloc)[1]
+
+    def _delay(self, attempt):
+        return self.rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get_json(self, url, params=None):
+        """GET 请求并解析JSON，可重试的错误按退避重试，最终失败时抛出 UpstreamError"""
+        return self._get(url, params, lambda response: response.json())
+
+    def get_text(self, url, params=None):
+        """GET 请求并返回文本，重试和熔断与 get_json 相同"""
+        return self._get(url, params, lambda response: response.text)
+
+    def _get(self, url, params, parse):
+        """parse 由响应得到结果，内容无法解析时抛出 ValueError（按可重试的错误处理）"""
+        host = urlsplit(url).netloc
+        semaphore, breaker = self._host(host)
+        session = self.session
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{host} 连续请求失败，暂停访问{self.reset_timeout:g}秒") from last_error
+            if attempt:
+                self.retried += 1
+            limiter = self._limiter(host)
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                with semaphore:
+                    self.requests += 1
+                    response = session.get(url, params=params, timeout=self.timeout)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise _RetryableStatus(f"HTTP {response.status_code}")
+                if response.status_code >= 400:
+                    # 请求本身有误，重试没有意义，也不说明主机不可用
+                    breaker.record_success()
+                    raise UpstreamError(f"{host} 返回 HTTP {response.status_code}")
+                data = parse(response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, _RetryableStatus, ValueError) as e:
+                last_error = e
+                breaker.record_failure()
+                if attempt < self.retries:
+                    self.sleep(self._delay(attempt))
+                continue
+            except requests.exceptions.RequestException as e:
+                # 其他请求错误（如响应体截断、解码失败）不重试，但同样计入熔断
+                breaker.record_failure()
+                raise UpstreamError(f"请求 {host} 失败: {e}") from e
+            finally:
+                # 试探请求以任何方式结束后都要让出名额，否则熔断器会一直停在 half_open
+                breaker.release()
+            breaker.record_success()
+            return data
+        raise UpstreamError(f"请求 {host} 失败（重试{self.retries}次）: {last_error}") from last_error
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """返回进程内共享的HTTP客户端"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
+
+
+def set_http_client(client):
+    """替换进程内共享的HTTP客户端，client 为 None 时下次使用时重新创建"""
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
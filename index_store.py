@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+大盘指数历史数据仓库
+
+进程内共享一份已排序、以日期为索引的指数历史，并在本地保存一份 .npz 副本。
+首次使用时从磁盘加载，之后每天最多向数据源增量拉取一次新增的交易日。
+"""
+import os
+import threading
+from datetime import date, timedelta
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+from http_fetch import UpstreamError
+from metrics import NULL_METRICS
+from price_cache import DEFAULT_CACHE_DIR, provider_cache_dir, to_date
+from providers import get_default_provider
+from result_cache import notify_data_update, notify_stale_data
+
+INDEX_COLUMNS = ["date", "open", "close", "high", "low", "volume", "amount"]
+
+
+def provider_index_fetcher(index_symbol, start_date=None, end_date=None):
+    """默认数据源：通过当前默认的 DataProvider 获取指数日线，日期格式为YYYYMMDD，缺省时获取全部历史"""
+    return get_default_provider().index_daily(index_symbol, start_date, end_date)
+
+
+def _empty_frame():
+    frame = pd.DataFrame({name: pd.Series(dtype="float64") for name in INDEX_COLUMNS})
+    frame["date"] = pd.Series(dtype="datetime64[ns]")
+    frame.index = pd.DatetimeIndex(frame["date"])
+    return frame
+
+
+def _normalize(frame):
+    """统一列、日期类型与排序，并以日期作为索引"""
+    frame = frame[INDEX_COLUMNS].copy()
+    frame["date"] = pd.to_datetime(frame["date"]).astype("datetime64[ns]")
+    frame = frame.drop_duplicates(subset="date", keep="last").sort_values("date", ascending=True)
+    frame.index = pd.DatetimeIndex(frame["date"].to_numpy())
+    return frame
+
+
+class IndexStore:
+    """
+    带增量更新的指数历史仓库
+
+    fetcher 签名为 fetcher(index_symbol, start_date, end_date)，日期为YYYYMMDD或None，
+    返回与 ak.stock_zh_index_daily_em 相同列的 DataFrame。
+    """
+
+    def __init__(self, cache_dir=None, fetcher=None, today=None):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.fetcher = fetcher or provider_index_fetcher
+        self.today = today or date.today
+        self._frames = {}
+        self._arrays = {}
+        self._synced = {}
+        self._lock = threading.Lock()
+
+    def _path(self, index_symbol):
+        return os.path.join(self.cache_dir, f"index_{index_symbol}.npz")
+
+    def _load_disk(self, index_symbol):
+        path = self._path(index_symbol)
+        if not os.path.exists(path):
+            return _empty_frame()
+        with np.load(path, allow_pickle=False) as data:
+            frame = pd.DataFrame({name: data[name] for name in INDEX_COLUMNS}, columns=INDEX_COLUMNS)
+        frame["date"] = frame["date"].astype("datetime64[ns]")
+        frame.index = pd.DatetimeIndex(frame["date"].to_numpy())
+        return frame
+
+    def _load_disk_arrays(self, index_symbol):
+        """只用numpy读取本地文件中的日期和收盘价"""
+        path = self._path(index_symbol)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return data["date"].astype("datetime64[D]"), data["close"].astype(np.float64)
+
+    def _save_disk(self, index_symbol, frame):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        arrays = {name: frame[name].to_numpy() for name in INDEX_COLUMNS}
+        arrays["date"] = arrays["date"].astype("datetime64[D]")
+        path = self._path(index_symbol)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def _sync(self, index_symbol, frame, metrics=NULL_METRICS):
+        """从最后一个已收盘的交易日之后开始增量拉取"""
+        today = pd.Timestamp(self.today())
+        final = frame[frame["date"] < today]
+        if final.empty:
+            fetched = self.fetcher(index_symbol, None, None)
+        else:
+            start = final["date"].iloc[-1] + timedelta(days=1)
+            fetched = self.fetcher(index_symbol, start.strftime("%Y%m%d"), None)
+        if fetched is None or fetched.empty:
+            return final if not final.empty else frame
+        if metrics.enabled:
+            metrics.count("bytes_fetched", fetched.memory_usage(deep=True).sum())
+        notify_data_update(index_symbol)
+        fetched = _normalize(fetched)
+        combined = _normalize(pd.concat([final, fetched], ignore_index=True))
+        # 当天的行情在收盘前可能不完整，只落盘到昨天为止
+        persisted = combined[combined["date"] < today]
+        if len(persisted) > len(final):
+            self._save_disk(index_symbol, persisted)
+        return combined
+
+    def history(self, index_symbol, until=None, metrics=NULL_METRICS):
+        """
+        返回指数的全部历史（已排序、以日期为索引）
+        until 之前的数据已在本地时不会访问数据源；数据源不可用（UpstreamError）时返回本地已有的历史
+        """
+        with self._lock:
+            frame = self._frames.get(index_symbol)
+            if frame is None:
+                frame = self._load_disk(index_symbol)
+            today = self.today()
+            need_until = min(to_date(until), today) if until is not None else today
+            has_data = not frame.empty and frame["date"].iloc[-1].date() >= need_until
+            if not has_data and self._synced.get(index_symbol) != today:
+                metrics.count("index_store_miss")
+                try:
+                    frame = self._sync(index_symbol, frame, metrics)
+                    self._synced[index_symbol] = today
+                except UpstreamError:
+                    # 数据源不可用时用本地已有的历史顶替，不记为已同步，下次访问时再试
+                    if frame.empty:
+                        raise
+                    metrics.count("index_store_stale")
+                    notify_stale_data(index_symbol)
+            else:
+                metrics.count("index_store_hit")
+            if self._frames.get(index_symbol) is not frame:
+                self._arrays.pop(index_symbol, None)
+            self._frames[index_symbol] = frame
+            return frame
+
+    def get_range(self, index_symbol, start_date, end_date, metrics=NULL_METRICS):
+        """按日期二分查找，返回 [start_date, end_date] 区间内的指数数据"""
+        frame = self.history(index_symbol, until=end_date, metrics=metrics)
+        dates = frame.index.values
+        lo = np.searchsorted(dates, np.datetime64(to_date(start_date), "ns"), side="left")
+        hi = np.searchsorted(dates, np.datetime64(to_date(end_date), "ns"), side="right")
+        return frame.iloc[lo:hi]
+
+    def get_range_arrays(self, index_symbol, start_date, end_date, metrics=NULL_METRICS):
+        """
+        与 get_range 相同，但返回 (日期数组 datetime64[D], 收盘价数组)
+        本地文件已覆盖 end_date 时只用numpy读取，不导入pandas
+        """
+        start = np.datetime64(to_date(start_date), "D")
+        end = np.datetime64(to_date(end_date), "D")
+        need_until = np.datetime64(min(to_date(end_date), self.today()), "D")
+        with self._lock:
+            arrays = self._arrays.get(index_symbol)
+            if arrays is None and index_symbol not in self._frames:
+                arrays = self._load_disk_arrays(index_symbol)
+                if arrays is not None:
+                    self._arrays[index_symbol] = arrays
+            if arrays is not None and len(arrays[0]) and arrays[0][-1] >= need_until:
+                metrics.count("index_store_hit")
+                return self._slice(arrays, start, end)
+
+        frame = self.history(index_symbol, until=end_date, metrics=metrics)
+        with self._lock:
+            arrays = self._arrays.get(index_symbol)
+            if arrays is None:
+                arrays = (frame["date"].to_numpy().astype("datetime64[D]"), frame["close"].to_numpy(dtype=np.float64))
+                self._arrays[index_symbol] = arrays
+        return self._slice(arrays, start, end)
+
+    @staticmethod
+    def _slice(arrays, start, end):
+        dates, closes = arrays
+        lo = np.searchsorted(dates, start, side="left")
+        hi = np.searchsorted(dates, end, side="right")
+        return dates[lo:hi], closes[lo:hi]
+
+    def invalidate(self, index_symbol=None):
+        """清除内存中的数据，下次访问时重新加载"""
+        with self._lock:
+            if index_symbol is None:
+                self._frames.clear()
+                self._arrays.clear()
+                self._synced.clear()
+            else:
+                self._frames.pop(index_symbol, None)
+                self._arrays.pop(index_symbol, None)
+                self._synced.pop(index_symbol, None)
+
+
+_default_store = None
+_default_store_provider = None
+_default_store_lock = threading.Lock()
+
+
+def get_index_store():
+    """返回进程内共享的默认指数仓库，默认数据源切换后会重新加载"""
+    global _default_store, _default_store_provider
+    with _default_store_lock:
+        provider = get_default_provider()
+        if _default_store is None or (_default_store_provider is not None and _default_store_provider is not provider):
+            _default_store = IndexStore(cache_dir=provider_cache_dir(provider))
+            _default_store_provider = provider
+        return _default_store
+
+
+def set_index_store(store):
+    """替换进程内共享的指数仓库，切换默认数据源后也不再替换；store 为 None 时下次使用时重新创建"""
+    global _default_store, _default_store_provider
+    with _default_store_lock:
+        _default_store = store
+        _default_store_provider = None
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+盘中实时偏离值监控
+
+以收盘后状态（eod_state）中上一交易日的收盘价为锚点，把分钟线或逐笔行情的最新价
+当作今天的"收盘价"，增量计算自选股各滚动窗口的实时累计偏离值和平均日收益率偏离；
+综合偏离度一越过 generate_advice 的阈值就发出提醒。收盘后的最终结果与
+EodStateStore.apply_day 一致。
+
+每个代码的锚点（窗口基准价、昨收、窗口内已有的日收益率之和）在开盘前算好放入数组，
+每批行情只写入最新价，再用一次NumPy运算重算全部股票，几千只股票每批在毫秒级完成。
+
+行情来源：
+- ReplayFeed: 回放录制的 JSONL/CSV 文件（每行 time, symbol, price），用于测试和复盘
+- SpotFeed: 每隔 interval 秒通过数据源请求一次全市场实时行情（经过 http_fetch 的重试和熔断）
+- record_feed: 包装任意行情来源，把收到的每批行情写入 JSONL 文件，之后可回放
+
+python intraday_monitor.py --codes watchlist.txt
+python intraday_monitor.py --codes watchlist.txt --replay 2025-03-14.jsonl --date 2025-03-14
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+from analysis_core import generate_advice, get_index_for_stock
+from eod_state import DEFAULT_WINDOWS, EodStateStore, fetch_spot_closes
+from providers import get_default_provider
+from rolling_scanner import LEVEL_NAMES, LEVEL_NONE, classify
+
+DEFAULT_INTERVAL = 1.0
+
+
+@dataclass
+class IntradayAlert:
+    """一次越过阈值的提醒"""
+
+    time: object
+    stock_code: str
+    index_symbol: str
+    window: int
+    level: str
+    stock_return: float
+    index_return: float
+    deviation: float
+    avg_deviation: float
+    advice: tuple
+
+    def format_line(self):
+        return (f"{self.time}  {self.stock_code}  {self.window}日  {self.level}  "
+                f"偏离值 {self.deviation * 100:+.2f}%  平均日偏离 {self.avg_deviation * 100:+.2f}%  {self.advice[0]}")
+
+
+def _anchors(state, windows):
+    """
+    由上一交易日收盘后的 SeriesState 得到 (昨收, 各窗口基准价, 各窗口去掉最早一天后的收益率之和)
+    与 SeriesState.apply 再应用一天的口径相同；数据不足的窗口基准价为NaN
+    """
+    prev_close = state.closes[-1] if state is not None and state.closes else np.nan
+    anchors = np.full(len(windows), np.nan)
+    base_sums = np.zeros(len(windows))
+    if state is None:
+        return prev_close, anchors, base_sums
+    for position, window in enumerate(windows):
+        if len(state.closes) < window:
+            continue
+        anchors[position] = state.closes[-window]
+        dropped = state.returns[-window] if len(state.returns) >= window else 0.0
+        base_sums[position] = state.sums[window] - dropped
+    return prev_close, anchors, base_sums
+
+
+class IntradayMonitor:
+    """
+    自选股的盘中偏离值，stock_states / index_states 为上一交易日收盘后的 SeriesState
+    on_alert(IntradayAlert) 在某只股票某个窗口的等级升高时调用
+    """
+
+    def __init__(self, stock_codes, stock_states, index_states, windows=DEFAULT_WINDOWS, on_alert=None):
+        self.windows = tuple(sorted(windows))
+        self.on_alert = on_alert or (lambda alert: None)
+        self.stock_codes = list(dict.fromkeys(stock_codes))
+        self.index_symbols = sorted({get_index_for_stock(code)[0] for code in self.stock_codes})
+        symbols = self.stock_codes + self.index_symbols
+        self.positions = {symbol: position for position, symbol in enumerate(symbols)}
+        self.benchmarks = np.array([len(self.stock_codes) + self.index_symbols.index(get_index_for_stock(code)[0])
+                                    for code in self.stock_codes], dtype=np.intp)
+
+        states = [stock_states.get(code) for code in self.stock_codes]
+        states += [index_states.get(symbol) for symbol in self.index_symbols]
+        prev_close, anchors, base_sums = zip(*(_anchors(state, self.windows) for state in states)) if states else ((), (), ())
+        self.prev_close = np.array(prev_close, dtype=np.float64)
+        self.anchors = np.array(anchors, dtype=np.float64).reshape(len(symbols), len(self.windows)).T.copy()
+        self.base_sums = np.array(base_sums, dtype=np.float64).reshape(len(symbols), len(self.windows)).T.copy()
+        self.divisors = np.array(self.windows, dtype=np.float64)[:, None]
+        self.last_price = self.prev_close.copy()
+        self.levels = np.full((len(self.windows), len(self.stock_codes)), LEVEL_NONE, dtype=np.int8)
+        self.updates = 0
+        self.last_update_seconds = 0.0
+        self._result = None
+
+    @classmethod
+    def from_state_store(cls, stock_codes, previous_date, store=None, windows=DEFAULT_WINDOWS, on_alert=None):
+        """用处理到 previous_date（上一交易日）的收盘后状态建立监控，缺失的状态从本地行情缓存重建"""
+        store = store or EodStateStore(windows=windows)
+        if not store.stocks:
+            store.load()
+        store.ensure(stock_codes, previous_date)
+        return cls(stock_codes, store.stocks, store.indices, store.windows, on_alert)
+
+    def update(self, prices, timestamp=None):
+        """
+        写入一批最新价 {代码: 价格} 并重算，返回本批触发的提醒列表
+        不在监控范围内的代码和无效价格被忽略
+        """
+        started = time.perf_counter()
+        for symbol, price in prices.items():
+            position = self.positions.get(symbol)
+            if position is not None and price is not None and price > 0:
+                self.last_price[position] = price
+        result = self._compute()
+        alerts = self._alerts(result, timestamp)
+        self.updates += 1
+        self.last_update_seconds = time.perf_counter() - started
+        for alert in alerts:
+            self.on_alert(alert)
+        return alerts
+
+    def _compute(self):
+        """全部股票、全部窗口的实时结果，值均为 (窗口, 股票) 矩阵"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            daily_return = self.last_price / self.prev_close - 1
+            cumulative = self.last_price / self.anchors - 1
+        average = (self.base_sums + daily_return) / self.divisors
+        stocks = slice(0, len(self.stock_codes))
+        deviation = cumulative[:, stocks] - cumulative[:, self.benchmarks]
+        avg_deviation = average[:, stocks] - average[:, self.benchmarks]
+        levels = classify(np.nan_to_num(deviation), np.nan_to_num(avg_deviation))
+        levels[np.isnan(deviation) | np.isnan(avg_deviation)] = LEVEL_NONE
+        self._result = {
+            "stock_return": cumulative[:, stocks],
+            "index_return": cumulative[:, self.benchmarks],
+            "deviation": deviation,
+            "avg_deviation": avg_deviation,
+            "level": levels,
+        }
+        return self._result
+
+    def _alerts(self, result, timestamp):
+        levels = result["level"]
+        window_ids, stock_ids = np.nonzero(levels > self.levels)
+        self.levels = levels
+        alerts = []
+        for window_id, stock_id in zip(window_ids, stock_ids):
+            deviation = float(result["deviation"][window_id, stock_id])
+            avg_deviation = float(result["avg_deviation"][window_id, stock_id])
+            alerts.append(IntradayAlert(
+                time=timestamp,
+                stock_code=self.stock_codes[stock_id],
+                index_symbol=self.index_symbols[self.benchmarks[stock_id] - len(self.stock_codes)],
+                window=self.windows[window_id],
+                level=str(LEVEL_NAMES[levels[window_id, stock_id]]),
+                stock_return=float(result["stock_return"][window_id, stock_id]),
+                index_return=float(result["index_return"][window_id, stock_id]),
+                deviation=deviation,
+                avg_deviation=avg_deviation,
+                advice=generate_advice(deviation, avg_deviation),
+            ))
+        return alerts
+
+    def snapshot(self, stock_code):
+        """返回一只股票当前各窗口的结果，格式同 EodStateStore.snapshot"""
+        result = self._result or self._compute()
+        stock_id = self.stock_codes.index(stock_code)
+        windows = {}
+        for window_id, window in enumerate(self.windows):
+            deviation = result["deviation"][window_id, stock_id]
+            avg_deviation = result["avg_deviation"][window_id, stock_id]
+            if np.isnan(deviation) or np.isnan(avg_deviation):
+                continue
+            windows[window] = {
+                "stock_return": float(result["stock_return"][window_id, stock_id]),
+                "index_return": float(result["index_return"][window_id, stock_id]),
+                "deviation": float(deviation),
+                "avg_deviation": float(avg_deviation),
+                "advice": generate_advice(deviation, avg_deviation),
+            }
+        return windows
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _read_events(path):
+    """逐行读取 (时间, 代码, 价格)，JSONL 或带表头的 CSV；价格列可以叫 price 或 close"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            price = row.get("price", row.get("close"))
+            yield row["time"], str(row["symbol"]), float(price)
+
+
+class ReplayFeed:
+    """
+    回放录制的行情文件，按时间把相邻的行合并为一批，产生 (时间, {代码: 价格})
+    speed 为None时不等待；为1时按录制的时间间隔实时回放，为10时快10倍
+    """
+
+    def __init__(self, path, speed=None):
+        self.path = path
+        self.speed = speed
+
+    def __iter__(self):
+        batch_time, batch = None, {}
+        previous = None
+        for event_time, symbol, price in _read_events(self.path):
+            if batch and event_time != batch_time:
+                previous = self._wait(previous, batch_time)
+                yield _parse_time(batch_time), batch
+                batch = {}
+            batch_time = event_time
+            batch[symbol] = price
+        if batch:
+            self._wait(previous, batch_time)
+            yield _parse_time(batch_time), batch
+
+    def _wait(self, previous, event_time):
+        current = _parse_time(event_time)
+        if self.speed and isinstance(previous, datetime) and isinstance(current, datetime):
+            delay = (current - previous).total_seconds() / self.speed
+            if delay > 0:
+                time.sleep(delay)
+        return current
+
+
+def fetch_spot_prices(index_symbols, provider=None):
+    """通过数据源获取全市场股票的最新价，再一次请求 index_symbols 中各指数的最新价"""
+    provider = provider or get_default_provider()
+    prices = fetch_spot_closes(provider)
+    spot = provider.index_spot(index_symbols).dropna(subset=["最新价"])
+    prices.update(zip(spot["代码"], spot["最新价"].astype(float)))
+    return prices
+
+
+class SpotFeed:
+    """
+    每隔 interval 秒获取一次实时行情，产生 (时间, {代码: 价格})，获取失败时跳过这一轮
+    fetch 缺省时通过默认数据源获取全市场股票和 index_symbols 中各指数的最新价
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, fetch=None, until=None, index_symbols=()):
+        self.interval = interval
+        self.fetch = fetch or (lambda: fetch_spot_prices(index_symbols))
+        self.until = until
+
+    def __iter__(self):
+        while self.until is None or datetime.now() < self.until:
+            started = time.monotonic()
+            try:
+                prices = self.fetch()
+            except Exception as e:
+                print(f"获取实时行情失败: {str(e)}", file=sys.stderr)
+            else:
+                yield datetime.now().replace(microsecond=0), prices
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+def record_feed(feed, path, symbols=None):
+    """把 feed 的每批行情（只保留 symbols 中的代码）追加写入 JSONL 文件，同时原样产生"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    symbols = set(symbols) if symbols is not None else None
+    with open(path, "a", encoding="utf-8") as f:
+        for timestamp, prices in feed:
+            stamp = timestamp.isoformat() if isinstance(timestamp, datetime) else str(timestamp)
+            for symbol, price in prices.items():
+                if symbols is None or symbol in symbols:
+                    f.write(json.dumps({"time": stamp, "symbol": symbol, "price": price}, ensure_ascii=False) + "\n")
+            f.flush()
+            yield timestamp, prices
+
+
+def run_monitor(monitor, feed):
+    """依次把 feed 的每批行情交给 monitor，返回全部提醒"""
+    alerts = []
+    for timestamp, prices in feed:
+        alerts.extend(monitor.update(prices, timestamp))
+    return alerts
+
+
+def main(argv=None):
+    from stock_analyzer_cli import read_watchlist
+    from trading_calendar import last_trading_days
+
+    parser = argparse.ArgumentParser(description="盘中实时偏离值监控")
+    parser.add_argument("--codes", required=True, metavar="FILE", help="股票代码列表文件，格式同批量模式；为 - 时从标准输入读取")
+    parser.add_argument("--date", help="监控的交易日（YYYY-MM-DD），默认为今天；锚点取其上一交易日的收盘价")
+    parser.add_argument("--windows", type=int, nargs="+", default=list(DEFAULT_WINDOWS),
+                        help=f"滚动窗口（交易日数），默认 {' '.join(map(str, DEFAULT_WINDOWS))}")
+    parser.add_argument("--replay", metavar="FILE", help="回放录制的行情文件（JSONL 或 CSV）而不是获取实时行情")
+    parser.add_argument("--speed", type=float, help="回放速度倍数，默认不等待")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help=f"实时行情的获取间隔（秒），默认{DEFAULT_INTERVAL}")
+    parser.add_argument("--record", metavar="FILE", help="把收到的行情追加写入 JSONL 文件，之后可用 --replay 回放")
+    args = parser.parse_args(argv)
+
+    if args.codes == "-":
+        stock_codes = read_watchlist(sys.stdin)
+    else:
+        with open(args.codes, encoding="utf-8") as f:
+            stock_codes = read_watchlist(f)
+    trade_date = args.date or date.today().strftime("%Y-%m-%d")
+    previous_date, _ = last_trading_days(1, trade_date)
+
+    monitor = IntradayMonitor.from_state_store(stock_codes, previous_date, EodStateStore(windows=args.windows),
+                                               on_alert=lambda alert: print(alert.format_line(), flush=True))
+    if args.replay:
+        feed = ReplayFeed(args.replay, args.speed)
+    else:
+        feed = SpotFeed(args.interval, index_symbols=monitor.index_symbols)
+    if args.record:
+        feed = record_feed(feed, args.record, set(monitor.positions))
+    print(f"开始监控 {len(monitor.stock_codes)} 只股票（锚点为 {previous_date} 收盘价）", file=sys.stderr)
+    try:
+        run_monitor(monitor, feed)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+延迟导入
+
+pandas、numpy 等依赖导入较慢，命令行的 --help、输入校验等不需要它们。
+模块顶部用 pd = lazy_module("pandas") 代替 import pandas as pd，第一次访问属性时才真正导入。
+"""
+import importlib
+
+
+class LazyModule:
+    """第一次访问属性时才导入的模块代理"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "已导入" if self.__dict__["_module"] is not None else "未导入"
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+def lazy_module(name):
+    """返回模块 name 的延迟导入代理"""
+    return LazyModule(name)
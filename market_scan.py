@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多进程全市场偏离值扫描
+
+股票按列分块交给进程池，每个进程只计算自己的列，结果按原来的列顺序合并。
+价格矩阵不经过pickle传给子进程：
+- 内存中的矩阵先复制一次到 multiprocessing.shared_memory，子进程按名称映射同一块内存
+- MarketStore 目录由子进程自己以只读内存映射打开，共享操作系统的页缓存
+只有指数矩阵（列数很少）和每块的结果在进程间传递。
+
+python market_scan.py --store ~/.stock_tools/market --start 2025-01-02 --end 2025-03-31
+python market_scan.py --store ~/.stock_tools/market --rolling 3 5 10 --processes 32 --output flagged.parquet
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+from analysis_core import get_index_for_stock
+from deviation_engine import cross_sectional_deviation
+from market_store import MarketStore
+from result_writer import FORMATS, open_writer
+from rolling_scanner import DEFAULT_WINDOWS, LEVEL_MEDIUM, classify, level_names, scan_rolling_windows
+
+# 每个进程分到的块数，块越多负载越均衡，合并的开销也越大
+CHUNKS_PER_PROCESS = 4
+
+
+class SharedMatrix:
+    """复制到共享内存中的矩阵，spec 可以传给子进程，子进程按名称映射同一块内存"""
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self._shm.buf)
+        self.array[:] = array
+        self.spec = ("shm", self._shm.name, array.shape, array.dtype.str)
+
+    def close(self):
+        """释放共享内存，之后 array 不可再使用"""
+        self.array = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# 子进程中已打开的矩阵，同一进程处理多个块时只映射一次
+_opened = {}
+
+
+def _open(spec):
+    matrix = _opened.get(spec)
+    if matrix is None:
+        if spec[0] == "shm":
+            _, name, shape, dtype = spec
+            shm = shared_memory.SharedMemory(name=name)
+            matrix = _opened[spec] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+        else:
+            store = MarketStore(spec[1])
+            matrix = _opened[spec] = (store, store.closes)
+    return matrix[1]
+
+
+def _take(prices, rows, columns):
+    """取 rows 行、columns 列；列连续时为视图，只读取需要的部分"""
+    if len(columns) and (np.diff(columns) == 1).all():
+        return prices[rows, columns[0]:columns[-1] + 1]
+    return prices[rows][:, columns]
+
+
+def _deviation_chunk(prices, rows, columns, benchmark_columns, index_prices):
+    return cross_sectional_deviation(_take(prices, rows, columns), index_prices, benchmark_columns)
+
+
+def _rolling_chunk(prices, rows, columns, benchmark_columns, index_prices, windows, dates, codes, min_level):
+    return scan_rolling_windows(_take(prices, rows, columns), index_prices, benchmark_columns,
+                                windows=windows, dates=dates, codes=codes, min_level=min_level)
+
+
+def _run_chunk(spec, task, rows, columns, *args):
+    """子进程入口：打开共享的价格矩阵并计算一块"""
+    return task(_open(spec), rows, columns, *args)
+
+
+def _chunks(columns, processes, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(columns) // (processes * CHUNKS_PER_PROCESS)))
+    return [columns[lo:lo + chunk_size] for lo in range(0, len(columns), chunk_size)]
+
+
+def _map_chunks(prices, spec, task, rows, columns, benchmark_columns, extra, processes, chunk_size):
+    """
+    按列分块执行 task，返回与分块顺序一致的结果列表
+    extra(块内位置) 返回该块除 benchmark_columns 之外的附加参数
+    processes 为1时在当前进程中直接计算
+    """
+    processes = processes or os.cpu_count() or 1
+    positions = _chunks(np.arange(len(columns)), processes, chunk_size)
+    jobs = [(rows, columns[part], benchmark_columns[part]) + extra(part) for part in positions]
+    if processes == 1 or len(jobs) <= 1:
+        return [task(prices, *job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(processes, len(jobs))) as pool:
+        futures = [pool.submit(_run_chunk, spec, task, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def _source(prices):
+    """返回 (矩阵, spec, 需要释放的共享内存)"""
+    if isinstance(prices, MarketStore):
+        return prices.closes, ("store", prices.path), None
+    shared = SharedMatrix(prices)
+    return shared.array, shared.spec, shared
+
+
+def parallel_deviation(prices, index_prices, benchmark_columns, rows=None, columns=None,
+                       processes=None, chunk_size=None):
+    """
+    多进程计算横截面偏离值，结果与 cross_sectional_deviation 完全相同
+    prices: 收盘价矩阵或 MarketStore；rows: 行切片，默认全部；columns: 参与计算的列号，默认全部
+    index_prices、benchmark_columns 的含义同 cross_sectional_deviation（index_prices 的行须与 rows 对应）
+    """
+    matrix, spec, shared = (prices, None, None) if processes == 1 else _source(prices)
+    try:
+        matrix = matrix.closes if isinstance(matrix, MarketStore) else matrix
+        rows = slice(None) if rows is None else rows
+        columns = np.arange(matrix.shape[1]) if columns is None else np.asarray(columns, dtype=np.intp)
+        index_prices = np.asarray(index_prices, dtype=np.float64)
+        parts = _map_chunks(matrix, spec, _deviation_chunk, rows, columns,
+                            np.asarray(benchmark_columns, dtype=np.intp), lambda part: (index_prices,),
+                            processes, chunk_size)
+    finally:
+        if shared is not None:
+            shared.close()
+    if not parts:
+        return cross_sectional_deviation(np.empty((index_prices.shape[0], 0)), index_prices, [])
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def parallel_rolling_scan(prices, index_prices, benchmark_columns, windows=DEFAULT_WINDOWS, dates=None, codes=None,
+                          min_level=LEVEL_MEDIUM, rows=None, columns=None, processes=None, chunk_size=None):
+    """多进程扫描滚动窗口，结果与 scan_rolling_windows 完全相同"""
+    matrix, spec, shared = (prices, None, None) if processes == 1 else _source(prices)
+    try:
+        matrix = matrix.closes if isinstance(matrix, MarketStore) else matrix
+        rows = slice(None) if rows is None else rows
+        columns = np.arange(matrix.shape[1]) if columns is None else np.asarray(columns, dtype=np.intp)
+        index_prices = np.asarray(index_prices, dtype=np.float64)
+        row_count = index_prices.shape[0]
+        dates = np.asarray(dates) if dates is not None else np.arange(row_count)
+        codes = np.asarray(codes) if codes is not None else np.arange(len(columns))
+        parts = _map_chunks(matrix, spec, _rolling_chunk, rows, columns,
+                            np.asarray(benchmark_columns, dtype=np.intp),
+                            lambda part: (index_prices, tuple(windows), dates, codes[part], min_level),
+                            processes, chunk_size)
+    finally:
+        if shared is not None:
+            shared.close()
+    if not parts:
+        return scan_rolling_windows(np.empty((row_count, 0)), index_prices, [], windows, dates, codes[:0], min_level)
+    return (pd.concat(parts, ignore_index=True).sort_values(["date", "code", "window"], kind="stable")
+            .reset_index(drop=True))
+
+
+def _store_layout(store):
+    """返回 (股票列号, 股票代码, 指数列号, 每只股票对应的指数序号, 指数代码)，缺少对应指数的股票被跳过"""
+    stock_columns, stock_codes, benchmarks = [], [], []
+    index_symbols = []
+    for column, code in enumerate(store.codes):
+        code = str(code)
+        if len(code) != 6 or not code.isdigit():
+            continue
+        symbol = get_index_for_stock(code)[0]
+        if symbol not in store:
+            continue
+        if symbol not in index_symbols:
+            index_symbols.append(symbol)
+        stock_columns.append(column)
+        stock_codes.append(code)
+        benchmarks.append(index_symbols.index(symbol))
+    index_columns = store.column_indexes(index_symbols)
+    return (np.array(stock_columns, dtype=np.intp), np.array(stock_codes, dtype=str),
+            index_columns, np.array(benchmarks, dtype=np.intp), index_symbols)
+
+
+def scan_store(store, start_date=None, end_date=None, processes=None, chunk_size=None):
+    """
+    对 MarketStore 中全部股票计算区间偏离值，返回按存储列顺序排列的 DataFrame
+    列为 code, benchmark, stock_cumulative_return, index_cumulative_return, deviation,
+    stock_avg_return, index_avg_return, avg_deviation, level；数据不足的股票不出现在结果中
+    """
+    store = store if isinstance(store, MarketStore) else MarketStore(store)
+    rows = store.rows(start_date, end_date)
+    stock_columns, stock_codes, index_columns, benchmarks, index_symbols = _store_layout(store)
+    index_prices = np.asarray(store.closes[rows][:, index_columns], dtype=np.float64)
+    result = parallel_deviation(store, index_prices, benchmarks, rows, stock_columns, processes, chunk_size)
+    valid = result.pop("valid")
+    frame = pd.DataFrame({"code": stock_codes, "benchmark": np.array(index_symbols, dtype=str)[benchmarks]})
+    for name, values in result.items():
+        frame[name] = values
+    frame["level"] = level_names(classify(frame["deviation"].to_numpy(), frame["avg_deviation"].to_numpy()))
+    return frame[valid].reset_index(drop=True)
+
+
+def scan_store_rolling(store, windows=DEFAULT_WINDOWS, start_date=None, end_date=None, min_level=LEVEL_MEDIUM,
+                       processes=None, chunk_size=None):
+    """对 MarketStore 中全部股票扫描滚动窗口，返回达到 min_level 的窗口（同 scan_rolling_windows）"""
+    store = store if isinstance(store, MarketStore) else MarketStore(store)
+    rows = store.rows(start_date, end_date)
+    stock_columns, stock_codes, index_columns, benchmarks, _ = _store_layout(store)
+    index_prices = np.asarray(store.closes[rows][:, index_columns], dtype=np.float64)
+    return parallel_rolling_scan(store, index_prices, benchmarks, windows, store.dates[rows], stock_codes,
+                                 min_level, rows, stock_columns, processes, chunk_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多进程全市场偏离值扫描")
+    parser.add_argument("--store", required=True, help="market_store.py 生成的存储目录")
+    parser.add_argument("--start", help="起始日期（YYYY-MM-DD），默认为存储的第一天")
+    parser.add_argument("--end", help="结束日期（YYYY-MM-DD），默认为存储的最后一天")
+    parser.add_argument("--rolling", type=int, nargs="*", metavar="N",
+                        help=f"扫描滚动N日窗口（不给N时为 {' '.join(map(str, DEFAULT_WINDOWS))}），默认计算整个区间的偏离值")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="进程数，默认为CPU核数")
+    parser.add_argument("--output", help="结果文件（.csv / .jsonl / .parquet），默认以CSV打印到标准输出")
+    parser.add_argument("--format", choices=FORMATS, help="--output 的格式，默认根据扩展名判断")
+    args = parser.parse_args(argv)
+
+    if args.rolling is None:
+        result = scan_store(args.store, args.start, args.end, args.processes)
+    else:
+        result = scan_store_rolling(args.store, tuple(args.rolling or DEFAULT_WINDOWS), args.start, args.end,
+                                    processes=args.processes)
+    with open_writer(args.output or "-", args.format, columns=list(result.columns)) as writer:
+        writer.write_frame(result)
+    if args.output:
+        print(f"已写入 {args.output}: {writer.rows}行", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
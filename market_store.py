@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+全市场日收盘价的内存映射存储
+
+目录中保存一个 交易日 × 代码 的收盘价矩阵（float64 或 float32 的 .npy 文件，停牌或无数据为NaN），
+以及行对应的交易日 dates.npy、列对应的代码 codes.npy。代码可以是股票也可以是大盘指数，
+同一个矩阵即可直接交给 deviation_engine.cross_sectional_deviation。
+
+打开时用只读内存映射，按日期区间取全部列是零拷贝的视图；多个分析进程打开同一个目录时
+共享操作系统的页缓存，不会各自加载一份。
+
+python market_store.py build --codes watchlist.txt --start 2005-01-01 --output ~/.stock_tools/market
+"""
+import argparse
+import json
+import os
+import sys
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+from analysis_core import get_index_for_stock
+from index_store import get_index_store
+from price_cache import get_price_cache, to_date
+
+STORE_VERSION = 1
+META_FILE = "meta.json"
+CLOSES_FILE = "closes.npy"
+DATES_FILE = "dates.npy"
+CODES_FILE = "codes.npy"
+
+
+class MarketStore:
+    """只读打开的收盘价矩阵，closes[行, 列] 对应 dates[行] 与 codes[列]"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"不支持的存储版本: {meta.get('version')}")
+        self.closes = np.load(os.path.join(path, CLOSES_FILE), mmap_mode="r")
+        self.dates = np.load(os.path.join(path, DATES_FILE))
+        self.codes = np.load(os.path.join(path, CODES_FILE))
+        if self.closes.shape != (len(self.dates), len(self.codes)):
+            raise ValueError(f"存储文件不完整: {path}")
+        self.columns = {str(code): column for column, code in enumerate(self.codes)}
+
+    def __contains__(self, code):
+        return code in self.columns
+
+    def rows(self, start_date=None, end_date=None):
+        """返回 [start_date, end_date] 对应的行切片，日期为 YYYY-MM-DD、YYYYMMDD 或 date"""
+        lo = 0 if start_date is None else int(np.searchsorted(self.dates, _to_day(start_date), side="left"))
+        hi = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, _to_day(end_date), side="right"))
+        return slice(lo, hi)
+
+    def column_indexes(self, codes):
+        """返回代码对应的列号数组，不存在的代码抛出 KeyError"""
+        return np.array([self.columns[code] for code in codes], dtype=np.intp)
+
+    def window(self, start_date=None, end_date=None):
+        """返回 (交易日, 全部列的收盘价)，收盘价是内存映射上的零拷贝视图"""
+        rows = self.rows(start_date, end_date)
+        return self.dates[rows], self.closes[rows]
+
+    def get(self, codes, start_date=None, end_date=None):
+        """返回 (交易日, 所选代码的收盘价矩阵)，只读取所选列在区间内的数据"""
+        dates, closes = self.window(start_date, end_date)
+        columns = self.column_indexes(codes)
+        if len(columns) and (np.diff(columns) == 1).all():
+            return dates, closes[:, columns[0]:columns[-1] + 1]
+        return dates, closes[:, columns]
+
+    def series(self, code, start_date=None, end_date=None):
+        """返回单个代码在区间内有数据的 (交易日, 收盘价)"""
+        dates, closes = self.window(start_date, end_date)
+        values = np.asarray(closes[:, self.columns[code]])
+        valid = ~np.isnan(values)
+        return dates[valid], values[valid].astype(np.float64)
+
+
+def _to_day(value):
+    return np.datetime64(to_date(value), "D")
+
+
+def build_store(path, dates, codes, load_series, dtype="float64"):
+    """
+    按列写入收盘价矩阵，每次只在内存中保留一个代码的数据
+    dates: 已排序的交易日，codes: 代码列表，
+    load_series(代码) 返回 (日期数组, 收盘价数组)，不在 dates 中的日期被忽略
+    所有文件先写入临时文件再替换，最后写 meta.json
+    """
+    os.makedirs(path, exist_ok=True)
+    dates = np.asarray(dates).astype("datetime64[D]")
+    codes = list(dict.fromkeys(codes))
+    suffix = f".{os.getpid()}.tmp"
+
+    closes_path = os.path.join(path, CLOSES_FILE)
+    closes = np.lib.format.open_memmap(closes_path + suffix, mode="w+", dtype=dtype, shape=(len(dates), len(codes)))
+    closes[:] = np.nan
+    for column, code in enumerate(codes):
+        series_dates, series_closes = load_series(code)
+        if len(series_dates) == 0:
+            continue
+        series_dates = np.asarray(series_dates).astype("datetime64[D]")
+        rows = np.searchsorted(dates, series_dates)
+        found = (rows < len(dates)) & (dates[np.minimum(rows, len(dates) - 1)] == series_dates)
+        closes[rows[found], column] = np.asarray(series_closes, dtype=np.float64)[found]
+    closes.flush()
+    del closes
+
+    for name, values in ((DATES_FILE, dates), (CODES_FILE, np.array(codes, dtype=str))):
+        with open(os.path.join(path, name) + suffix, "wb") as f:
+            np.save(f, values)
+    meta = {"version": STORE_VERSION, "dtype": str(np.dtype(dtype)), "rows": len(dates), "columns": len(codes),
+            "start": str(dates[0]) if len(dates) else None, "end": str(dates[-1]) if len(dates) else None}
+    with open(os.path.join(path, META_FILE) + suffix, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    for name in (CLOSES_FILE, DATES_FILE, CODES_FILE, META_FILE):
+        os.replace(os.path.join(path, name) + suffix, os.path.join(path, name))
+    return MarketStore(path)
+
+
+def build_from_cache(path, stock_codes, start_date, end_date, calendar_symbol="sh000001", dtype="float64",
+                     price_cache=None, index_store=None):
+    """
+    用本地行情缓存和指数仓库生成存储：行为 calendar_symbol 在区间内的交易日，
+    列为全部股票以及它们对应的大盘指数
+    """
+    price_cache = price_cache or get_price_cache()
+    index_store = index_store or get_index_store()
+    dates, _ = index_store.get_range_arrays(calendar_symbol, start_date, end_date)
+    index_symbols = sorted({get_index_for_stock(code)[0] for code in stock_codes})
+    start, end = start_date.replace("-", ""), end_date.replace("-", "")
+
+    def load_series(code):
+        if code in index_symbols:
+            return index_store.get_range_arrays(code, start_date, end_date)
+        return price_cache.get_arrays(code, start, end)
+
+    return build_store(path, dates, list(stock_codes) + index_symbols, load_series, dtype=dtype)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成全市场收盘价的内存映射存储")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="从本地行情缓存生成存储（缺失的数据会从数据源获取）")
+    build.add_argument("--codes", required=True, metavar="FILE", help="股票代码列表文件，格式同批量模式；为 - 时从标准输入读取")
+    build.add_argument("--start", required=True, help="起始日期（YYYY-MM-DD）")
+    build.add_argument("--end", help="结束日期（YYYY-MM-DD），默认为今天")
+    build.add_argument("--output", required=True, help="存储目录")
+    build.add_argument("--float32", action="store_true", help="以float32保存，体积减半")
+    info = subparsers.add_parser("info", help="显示存储的行数、列数和日期范围")
+    info.add_argument("path", help="存储目录")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        store = MarketStore(args.path)
+        print(f"{len(store.dates)}个交易日 × {len(store.codes)}个代码，{store.closes.dtype}，"
+              f"{store.dates[0] if len(store.dates) else '-'} 至 {store.dates[-1] if len(store.dates) else '-'}")
+        return 0
+
+    from datetime import datetime
+
+    from stock_analyzer_cli import read_watchlist
+
+    if args.codes == "-":
+        stock_codes = read_watchlist(sys.stdin)
+    else:
+        with open(args.codes, encoding="utf-8") as f:
+            stock_codes = read_watchlist(f)
+    end_date = args.end or datetime.now().strftime("%Y-%m-%d")
+    store = build_from_cache(args.output, stock_codes, args.start, end_date,
+                             dtype="float32" if args.float32 else "float64")
+    print(f"已写入 {args.output}: {len(store.dates)}个交易日 × {len(store.codes)}个代码")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分析流程的分阶段计时与指标
+
+每次分析使用一个 Metrics 记录各阶段耗时、行数和计数器（缓存命中/未命中、拉取字节数），
+分析结束时作为一条记录交给可插拔的输出：日志、JSONL文件或内存收集器。
+未启用时使用 NULL_METRICS，所有调用都是空操作，几乎没有额外开销。
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+DEFAULT_PERCENTILES = (50, 95, 99)
+
+
+class NullMetrics:
+    """未启用指标时使用的空实现"""
+
+    enabled = False
+
+    def begin(self):
+        pass
+
+    def mark(self, stage, rows=None):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def finish(self, **fields):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class Metrics:
+    """
+    单次分析的指标记录器，非线程安全，每次分析各用一个
+    mark(stage) 记录从上一次 mark（或 begin）到现在的耗时
+    """
+
+    enabled = True
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.begin()
+
+    def begin(self):
+        self.stages = {}
+        self.rows = {}
+        self.counters = {}
+        self._started = self._last = time.perf_counter()
+
+    def mark(self, stage, rows=None):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        self._last = now
+        if rows is not None:
+            self.rows[stage] = int(rows)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self, **fields):
+        record = dict(fields)
+        record["total"] = time.perf_counter() - self._started
+        record["stages"] = self.stages
+        record["rows"] = self.rows
+        record["counters"] = {name: int(value) for name, value in self.counters.items()}
+        self.sink.emit(record)
+        return record
+
+
+def make_metrics(sink):
+    """sink 为None时返回 NULL_METRICS"""
+    return NULL_METRICS if sink is None else Metrics(sink)
+
+
+def default_logger():
+    """
+    返回指标日志器 stock_tools.metrics
+    程序没有为它配置处理器时附加一个标准错误输出，否则低于WARNING的记录会被丢弃
+    """
+    logger = logging.getLogger("stock_tools.metrics")
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class LogSink:
+    """把每条记录以一行JSON写入日志，默认写到标准错误输出"""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or default_logger()
+        self.level = level
+
+    def emit(self, record):
+        self.logger.log(self.level, json.dumps(record, ensure_ascii=False))
+
+
+class JsonlSink:
+    """把每条记录追加到JSONL文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def emit(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class MemorySink:
+    """在内存中收集记录，可按阶段统计分位数；max_records 不为None时只保留最近的这么多条"""
+
+    def __init__(self, max_records=None):
+        self.records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES):
+        """返回 {阶段: {"count": 次数, "p50": 秒, ...}}，total 为整次分析的耗时"""
+        with self._lock:
+            records = list(self.records)
+        durations = {"total": [record["total"] for record in records]}
+        for record in records:
+            for stage, seconds in record["stages"].items():
+                durations.setdefault(stage, []).append(seconds)
+        summary = {}
+        for stage, values in durations.items():
+            if not values:
+                continue
+            points = np.percentile(values, percentiles)
+            summary[stage] = {"count": len(values)}
+            summary[stage].update({f"p{p}": float(v) for p, v in zip(percentiles, points)})
+        return summary
+
+    def counters(self):
+        """汇总所有记录的计数器"""
+        with self._lock:
+            records = list(self.records)
+        totals = {}
+        for record in records:
+            for name, value in record["counters"].items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+
+class MultiSink:
+    """同时写入多个输出"""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def emit(self, record):
+        for sink in self.sinks:
+            sink.emit(record)
+
+
+def sink_from_spec(spec):
+    """按 log / memory / jsonl:<路径> 创建输出"""
+    kind, _, argument = spec.partition(":")
+    if kind == "log":
+        return LogSink()
+    if kind == "memory":
+        return MemorySink()
+    if kind == "jsonl" and argument:
+        return JsonlSink(argument)
+    raise ValueError(f"未知的指标输出: {spec}")
+
+
+def format_summary(summary, percentiles=DEFAULT_PERCENTILES):
+    """把分位数统计格式化为多行文本（毫秒）"""
+    lines = []
+    for stage, item in summary.items():
+        values = " ".join(f"p{p}={item[f'p{p}'] * 1000:.2f}ms" for p in percentiles)
+        lines.append(f"{stage}\t次数={item['count']}\t{values}")
+    return "\n".join(lines)
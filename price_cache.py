@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地日线行情缓存
+
+每个股票代码对应一个列式的 .npz 文件，除行情列外还记录已经拉取过的日期区间。
+再次查询时只向数据源请求缺失的首尾区间，重复分析同一区间只需读取本地文件。
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+from metrics import NULL_METRICS
+from http_fetch import UpstreamError
+from providers import AkshareProvider, get_default_provider
+from result_cache import notify_data_update, notify_stale_data
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "STOCK_TOOLS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".stock_tools", "cache"),
+)
+
+DATE_COLUMN = "日期"
+CLOSE_COLUMN = "收盘"
+COVERAGE_KEY = "__coverage__"
+COLUMNS_KEY = "__columns__"
+
+
+def provider_fetcher(stock_code, start_date, end_date):
+    """默认数据源：通过当前默认的 DataProvider 获取不复权日线，日期格式为YYYYMMDD"""
+    return get_default_provider().stock_hist(stock_code, start_date, end_date)
+
+
+def provider_cache_dir(provider):
+    """不同数据源的数据分目录缓存，避免模拟或回放数据混入真实行情"""
+    if provider.name == AkshareProvider.name:
+        return DEFAULT_CACHE_DIR
+    return os.path.join(DEFAULT_CACHE_DIR, provider.name)
+
+
+def to_date(value):
+    """将 YYYYMMDD / YYYY-MM-DD 字符串或日期对象转换为 date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip().replace("-", "")
+    return datetime.strptime(text, "%Y%m%d").date()
+
+
+def missing_segments(start, end, coverage):
+    """
+    计算 [start, end] 中未被 coverage 覆盖的日期区间
+    coverage 为按起始日期排序、互不重叠的 (起始, 结束) 闭区间列表
+    """
+    segments = []
+    cursor = start
+    for covered_start, covered_end in coverage:
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            segments.append((cursor, covered_start - timedelta(days=1)))
+        cursor = max(cursor, covered_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        segments.append((cursor, end))
+    return segments
+
+
+def merge_coverage(coverage, new_start, new_end):
+    """把新区间并入已覆盖区间，相邻或重叠的区间会被合并"""
+    intervals = sorted(coverage + [(new_start, new_end)])
+    merged = []
+    for interval_start, interval_end in intervals:
+        if merged and interval_start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], interval_end))
+        else:
+            merged.append((interval_start, interval_end))
+    return merged
+
+
+class PriceCache:
+    """
+    带增量补齐的本地日线缓存
+
+    fetcher 为可注入的数据源，签名为 fetcher(stock_code, start_date, end_date)，
+    日期格式为YYYYMMDD，返回与 ak.stock_zh_a_hist 相同列的 DataFrame。
+    memory_size 大于0时，最近使用的这么多只股票的日期、收盘价常驻内存，get_arrays 不再读文件。
+    """
+
+    def __init__(self, cache_dir=None, fetcher=None, today=None, memory_size=0):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.fetcher = fetcher or provider_fetcher
+        # 当天的行情在收盘前可能不完整，只缓存到昨天为止
+        self.today = today or date.today
+        self.memory_size = memory_size
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, stock_code):
+        return os.path.join(self.cache_dir, f"{stock_code}.npz")
+
+    def _lock_for(self, stock_code):
+        with self._locks_guard:
+            lock = self._locks.get(stock_code)
+            if lock is None:
+                lock = self._locks[stock_code] = threading.Lock()
+            return lock
+
+    def load(self, stock_code):
+        """读取本地缓存，返回 (行情DataFrame, 覆盖区间列表)；无缓存时返回 (None, [])"""
+        path = self._path(stock_code)
+        if not os.path.exists(path):
+            return None, []
+        with np.load(path, allow_pickle=False) as data:
+            columns = [str(name) for name in data[COLUMNS_KEY]]
+            frame = pd.DataFrame({name: data[name] for name in columns}, columns=columns)
+            coverage = [(to_date(int(s)), to_date(int(e))) for s, e in data[COVERAGE_KEY]]
+        return frame, coverage
+
+    def _load_arrays(self, stock_code):
+        """只读取日期、收盘价和覆盖区间，不依赖pandas；无缓存时返回 (None, None, [])"""
+        if self.memory_size > 0:
+            with self._locks_guard:
+                entry = self._memory.get(stock_code)
+                if entry is not None:
+                    self._memory.move_to_end(stock_code)
+                    return entry
+        path = self._path(stock_code)
+        if not os.path.exists(path):
+            return None, None, []
+        with np.load(path, allow_pickle=False) as data:
+            dates = data[DATE_COLUMN]
+            closes = data[CLOSE_COLUMN]
+            coverage = [(to_date(int(s)), to_date(int(e))) for s, e in data[COVERAGE_KEY]]
+        if self.memory_size > 0:
+            with self._locks_guard:
+                self._memory[stock_code] = (dates, closes, coverage)
+                while len(self._memory) > self.memory_size:
+                    self._memory.popitem(last=False)
+        return dates, closes, coverage
+
+    def save(self, stock_code, frame, coverage):
+        """以列式格式原子地写入缓存文件"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        arrays = {}
+        for name in frame.columns:
+            values = frame[name].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[name] = values
+        arrays[COLUMNS_KEY] = np.array(list(frame.columns), dtype=str)
+        arrays[COVERAGE_KEY] = np.array(
+            [[int(s.strftime("%Y%m%d")), int(e.strftime("%Y%m%d"))] for s, e in coverage],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        path = self._path(stock_code)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        with self._locks_guard:
+            self._memory.pop(stock_code, None)
+
+    def get(self, stock_code, start_date, end_date, metrics=NULL_METRICS):
+        """
+        获取 [start_date, end_date] 区间的日线数据
+        只有缓存未覆盖的区间会交给 fetcher 拉取
+        """
+        start = to_date(start_date)
+        end = to_date(end_date)
+        with self._lock_for(stock_code):
+            frame, coverage = self.load(stock_code)
+            segments = missing_segments(start, end, coverage)
+            if not segments:
+                self.hits += 1
+                metrics.count("price_cache_hit")
+            else:
+                self.misses += 1
+                metrics.count("price_cache_miss")
+                frame, coverage = self._fill(stock_code, frame, coverage, segments, metrics)
+        if frame is None or frame.empty:
+            return pd.DataFrame()
+        dates = frame[DATE_COLUMN].to_numpy()
+        mask = (dates >= start.strftime("%Y-%m-%d")) & (dates <= end.strftime("%Y-%m-%d"))
+        return frame[mask].reset_index(drop=True)
+
+    def get_arrays(self, stock_code, start_date, end_date, metrics=NULL_METRICS):
+        """
+        与 get 相同，但返回 (日期数组 datetime64[D], 收盘价数组)
+        缓存完全覆盖时只用numpy读取本地文件，不导入pandas
+        """
+        start = to_date(start_date)
+        end = to_date(end_date)
+        with self._lock_for(stock_code):
+            dates, closes, coverage = self._load_arrays(stock_code)
+            if dates is not None and not missing_segments(start, end, coverage):
+                self.hits += 1
+                metrics.count("price_cache_hit")
+                lo = np.searchsorted(dates, start.strftime("%Y-%m-%d"), side="left")
+                hi = np.searchsorted(dates, end.strftime("%Y-%m-%d"), side="right")
+                return dates[lo:hi].astype("datetime64[D]"), closes[lo:hi].astype(np.float64)
+        frame = self.get(stock_code, start_date, end_date, metrics=metrics)
+        if frame.empty:
+            return np.array([], dtype="datetime64[D]"), np.array([], dtype=np.float64)
+        dates = np.array(frame[DATE_COLUMN].astype(str).str[:10].to_numpy(), dtype="datetime64[D]")
+        return dates, frame[CLOSE_COLUMN].to_numpy(dtype=np.float64)
+
+    def _fill(self, stock_code, frame, coverage, segments, metrics=NULL_METRICS):
+        """拉取缺失区间并写回缓存；数据源不可用（UpstreamError）且本地有数据时返回本地数据"""
+        last_final_day = self.today() - timedelta(days=1)
+        fetched = [] if frame is None else [frame]
+        for segment_start, segment_end in segments:
+            try:
+                part = self.fetcher(stock_code, segment_start.strftime("%Y%m%d"), segment_end.strftime("%Y%m%d"))
+            except UpstreamError:
+                # 数据源不可用时用本地已有的数据顶替，未拉到的区间不计入覆盖区间，下次请求时再补齐
+                if all(part.empty for part in fetched):
+                    raise
+                metrics.count("price_cache_stale")
+                notify_stale_data(stock_code)
+                break
+            if part is not None and not part.empty:
+                if metrics.enabled:
+                    metrics.count("bytes_fetched", part.memory_usage(deep=True).sum())
+                notify_data_update(stock_code)
+                part = part.copy()
+                part[DATE_COLUMN] = pd.to_datetime(part[DATE_COLUMN]).dt.strftime("%Y-%m-%d")
+                fetched.append(part)
+            if segment_start <= last_final_day:
+                coverage = merge_coverage(coverage, segment_start, min(segment_end, last_final_day))
+
+        if not fetched:
+            return None, coverage
+        combined = pd.concat(fetched, ignore_index=True)
+        combined = combined.drop_duplicates(subset=DATE_COLUMN, keep="last")
+        combined = combined.sort_values(DATE_COLUMN, ascending=True).reset_index(drop=True)
+
+        # 当天及以后的数据可能不完整，只返回不落盘
+        final_mask = combined[DATE_COLUMN].to_numpy() <= last_final_day.strftime("%Y-%m-%d")
+        if coverage:
+            self.save(stock_code, combined[final_mask].reset_index(drop=True), coverage)
+        return combined, coverage
+
+
+_default_cache = None
+_default_cache_provider = None
+_default_cache_lock = threading.Lock()
+
+
+def get_price_cache():
+    """返回进程内共享的默认缓存实例，默认数据源切换后会换用对应的缓存目录"""
+    global _default_cache, _default_cache_provider
+    with _default_cache_lock:
+        provider = get_default_provider()
+        if _default_cache is None or (_default_cache_provider is not None and _default_cache_provider is not provider):
+            _default_cache = PriceCache(cache_dir=provider_cache_dir(provider))
+            _default_cache_provider = provider
+        return _default_cache
+
+
+def set_price_cache(cache):
+    """替换进程内共享的缓存实例，切换默认数据源后也不再替换；cache 为 None 时下次使用时重新创建"""
+    global _default_cache, _default_cache_provider
+    with _default_cache_lock:
+        _default_cache = cache
+        _default_cache_provider = None
@@ -0,0 +1,486 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+行情数据源
+
+所有行情请求都通过 DataProvider 接口完成，分析代码不直接调用 akshare：
+- AkshareProvider: 访问akshare所用的东方财富接口，经过 http_fetch 的连接池、重试和熔断
+- RecordingProvider: 包装其他数据源，把每次返回的数据保存到本地目录
+- ReplayProvider: 从录制目录回放数据，完全离线
+- SyntheticProvider: 生成任意规模的随机游走行情，用于离线测试和性能测试
+
+默认数据源可通过环境变量 STOCK_TOOLS_PROVIDER 选择：
+akshare（默认）、synthetic、replay:<目录>、record:<目录>。
+"""
+import contextlib
+import json
+import os
+import threading
+import zlib
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+STOCK_COLUMNS = ["日期", "股票代码", "开盘", "收盘", "最高", "最低", "成交量", "成交额", "振幅", "涨跌幅", "涨跌额", "换手率"]
+INDEX_COLUMNS = ["date", "open", "close", "high", "low", "volume", "amount"]
+SPOT_COLUMNS = ["代码", "最新价"]
+
+
+class DataProvider:
+    """
+    数据源接口，日期参数均为YYYYMMDD字符串
+    stock_hist 返回与 ak.stock_zh_a_hist 相同列的不复权日线，
+    index_daily 返回与 ak.stock_zh_index_daily_em 相同列的指数日线，日期缺省时返回全部历史，
+    hfq_factor 返回与 ak.stock_zh_a_daily(adjust="hfq-factor") 相同列（date、hfq_factor）的后复权因子，
+    stock_spot 返回全市场股票的实时行情（代码、最新价，停牌为NaN），
+    index_spot 返回指定指数的实时行情，代码列与传入的指数代码（如 sh000001）相同
+    """
+
+    name = "base"
+
+    def stock_hist(self, stock_code, start_date, end_date):
+        raise NotImplementedError
+
+    def index_daily(self, index_symbol, start_date=None, end_date=None):
+        raise NotImplementedError
+
+    def hfq_factor(self, stock_code):
+        raise NotImplementedError
+
+    def stock_spot(self):
+        raise NotImplementedError
+
+    def index_spot(self, index_symbols):
+        raise NotImplementedError
+
+    def set_rate(self, rate):
+        """限制访问上游的每秒请求数，None 为不限速；本地数据源不需要限速"""
+
+    @contextlib.contextmanager
+    def limit_rate(self, rate):
+        """with 块内访问上游的每秒请求数不超过 rate，退出时恢复"""
+        yield
+
+
+EASTMONEY_KLINE_URL = "https://push2his.eastmoney.com/api/qt/stock/kline/get"
+# ak.stock_zh_a_spot_em 所用的全市场行情列表（分页）和按 secid 查询的行情接口
+EASTMONEY_SPOT_URL = "https://82.push2.eastmoney.com/api/qt/clist/get"
+EASTMONEY_QUOTE_URL = "https://push2.eastmoney.com/api/qt/ulist.np/get"
+# 沪深京A股：深市主板、创业板、沪市主板、科创板、北交所
+A_SHARE_FS = "m:0 t:6,m:0 t:80,m:1 t:2,m:1 t:23,m:0 t:81 s:2048"
+SPOT_PAGE_SIZE = 1000
+# ak.stock_zh_a_daily(adjust="hfq-factor") 所用的新浪后复权因子文件
+SINA_HFQ_URL = "https://finance.sina.com.cn/realstock/company/{symbol}/hfq.js"
+# 指数代码前缀对应的东方财富市场编号
+INDEX_MARKETS = {"sz": "0", "sh": "1", "csi": "2", "bj": "0"}
+# 复权方式对应的 fqt 参数
+ADJUST_FQT = {"": "0", "qfq": "1", "hfq": "2"}
+
+
+def stock_secid(stock_code):
+    """沪市股票（6开头）为 1.代码，其余为 0.代码"""
+    return f"{1 if stock_code.startswith('6') else 0}.{stock_code}"
+
+
+def sina_symbol(stock_code):
+    """新浪接口的股票代码：沪市 sh、北交所 bj、其余 sz"""
+    if stock_code.startswith("6"):
+        return f"sh{stock_code}"
+    if stock_code.startswith(("8", "4", "92")):
+        return f"bj{stock_code}"
+    return f"sz{stock_code}"
+
+
+def index_secid(index_symbol):
+    for prefix in sorted(INDEX_MARKETS, key=len, reverse=True):
+        if index_symbol.startswith(prefix):
+            return f"{INDEX_MARKETS[prefix]}.{index_symbol[len(prefix):]}"
+    raise ValueError(f"无法识别的指数代码: {index_symbol}")
+
+
+def _spot_frame(codes, prices):
+    """东方财富无行情的价格为 "-"，转为NaN"""
+    return pd.DataFrame({"代码": codes, "最新价": pd.to_numeric(pd.Series(prices, dtype=object), errors="coerce")},
+                        columns=SPOT_COLUMNS)
+
+
+class AkshareProvider(DataProvider):
+    """
+    访问 akshare 的 stock_zh_a_hist / stock_zh_index_daily_em / stock_zh_a_spot_em 所用的东方财富接口
+    和 stock_zh_a_daily(adjust="hfq-factor") 所用的新浪复权因子文件，返回相同的列
+    请求经过 http_fetch：共用连接池，失败时退避重试，上游不可用时熔断并抛出 UpstreamError
+    各接口的 url 和 client 可替换，用于指向本地的测试服务器
+    """
+
+    name = "akshare"
+
+    def __init__(self, kline_url=EASTMONEY_KLINE_URL, client=None, hfq_url=SINA_HFQ_URL,
+                 spot_url=EASTMONEY_SPOT_URL, quote_url=EASTMONEY_QUOTE_URL):
+        self.kline_url = kline_url
+        self.hfq_url = hfq_url
+        self.spot_url = spot_url
+        self.quote_url = quote_url
+        self.client = client
+
+    def _client(self):
+        from http_fetch import get_http_client
+
+        return self.client or get_http_client()
+
+    def set_rate(self, rate):
+        self._client().set_rate(rate)
+
+    def limit_rate(self, rate):
+        return self._client().limit_rate(rate)
+
+    def _klines(self, params):
+        data = self._client().get_json(self.kline_url, params=params)
+        klines = (data.get("data") or {}).get("klines") if isinstance(data, dict) else None
+        return [line.split(",") for line in klines or []]
+
+    def stock_hist(self, stock_code, start_date, end_date, adjust=""):
+        rows = self._klines({
+            "fields1": "f1,f2,f3,f4,f5,f6",
+            "fields2": "f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61",
+            "ut": "7eea3edcaed734bea9cbfc24409ed989",
+            "klt": "101",
+            "fqt": ADJUST_FQT[adjust],
+            "secid": stock_secid(stock_code),
+            "beg": start_date,
+            "end": end_date,
+        })
+        if not rows:
+            return pd.DataFrame()
+        names = [name for name in STOCK_COLUMNS if name != "股票代码"]
+        frame = pd.DataFrame([row[:len(names)] for row in rows], columns=names)
+        frame["股票代码"] = stock_code
+        frame["日期"] = pd.to_datetime(frame["日期"], errors="coerce").dt.date
+        for name in names[1:]:
+            frame[name] = pd.to_numeric(frame[name], errors="coerce")
+        return frame[STOCK_COLUMNS]
+
+    def index_daily(self, index_symbol, start_date=None, end_date=None):
+        rows = self._klines({
+            "secid": index_secid(index_symbol),
+            "fields1": "f1,f2,f3,f4,f5",
+            "fields2": "f51,f52,f53,f54,f55,f56,f57,f58",
+            "klt": "101",
+            "fqt": "0",
+            "beg": start_date or "19900101",
+            "end": end_date or "20500101",
+        })
+        if not rows:
+            return pd.DataFrame()
+        frame = pd.DataFrame([row[:len(INDEX_COLUMNS)] for row in rows], columns=INDEX_COLUMNS)
+        for name in INDEX_COLUMNS[1:]:
+            frame[name] = pd.to_numeric(frame[name], errors="coerce")
+        return frame
+
+    def hfq_factor(self, stock_code):
+        from http_fetch import UpstreamError
+
+        text = self._client().get_text(self.hfq_url.format(symbol=sina_symbol(stock_code)))
+        # 文件内容为 var hfq = {"total": N, "data": [{"d": 日期, "f": 因子}, ...]};
+        try:
+            items = json.loads(text.split("=", 1)[1].split("\n")[0].strip().rstrip(";"))["data"]
+        except (IndexError, KeyError, TypeError, ValueError) as e:
+            raise UpstreamError(f"无法解析 {stock_code} 的复权因子") from e
+        if not items:
+            return pd.DataFrame(columns=["date", "hfq_factor"])
+        frame = pd.DataFrame(items).rename(columns={"d": "date", "f": "hfq_factor"})
+        frame["date"] = pd.to_datetime(frame["date"], errors="coerce").dt.date
+        frame["hfq_factor"] = pd.to_numeric(frame["hfq_factor"], errors="coerce")
+        return frame[["date", "hfq_factor"]]
+
+    def _diff(self, url, params):
+        data = self._client().get_json(url, params=params)
+        data = (data.get("data") if isinstance(data, dict) else None) or {}
+        return data.get("diff") or [], int(data.get("total") or 0)
+
+    def stock_spot(self):
+        items, page = [], 1
+        while True:
+            diff, total = self._diff(self.spot_url, {
+                "pn": str(page),
+                "pz": str(SPOT_PAGE_SIZE),
+                "po": "1",
+                "np": "1",
+                "ut": "bd1d9ddb04089700cf9c27f6f7426281",
+                "fltt": "2",
+                "invt": "2",
+                "fid": "f12",
+                "fs": A_SHARE_FS,
+                "fields": "f12,f2",
+            })
+            items.extend(diff)
+            if not diff or len(items) >= total:
+                break
+            page += 1
+        return _spot_frame([item.get("f12") for item in items], [item.get("f2") for item in items])
+
+    def index_spot(self, index_symbols):
+        index_symbols = list(index_symbols)
+        diff, _ = self._diff(self.quote_url, {
+            "fltt": "2",
+            "invt": "2",
+            "fields": "f12,f13,f2",
+            "secids": ",".join(index_secid(symbol) for symbol in index_symbols),
+        })
+        prices = {f"{item.get('f13')}.{item.get('f12')}": item.get("f2") for item in diff}
+        return _spot_frame(index_symbols, [prices.get(index_secid(symbol)) for symbol in index_symbols])
+
+
+def _record_path(record_dir, method, symbol, start_date, end_date):
+    return os.path.join(record_dir, method, f"{symbol}__{start_date or 'all'}__{end_date or 'all'}.pkl")
+
+
+class RecordingProvider(DataProvider):
+    """包装其他数据源，把每次返回的数据按 方法/代码__起始__结束.pkl 保存到 record_dir"""
+
+    def __init__(self, inner, record_dir):
+        self.inner = inner
+        self.record_dir = record_dir
+        self.name = inner.name
+
+    def _save(self, frame, method, symbol, start_date, end_date):
+        path = _record_path(self.record_dir, method, symbol, start_date, end_date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        frame.to_pickle(path)
+
+    def stock_hist(self, stock_code, start_date, end_date):
+        frame = self.inner.stock_hist(stock_code, start_date, end_date)
+        self._save(frame, "stock_hist", stock_code, start_date, end_date)
+        return frame
+
+    def index_daily(self, index_symbol, start_date=None, end_date=None):
+        frame = self.inner.index_daily(index_symbol, start_date, end_date)
+        self._save(frame, "index_daily", index_symbol, start_date, end_date)
+        return frame
+
+    def set_rate(self, rate):
+        self.inner.set_rate(rate)
+
+    def limit_rate(self, rate):
+        return self.inner.limit_rate(rate)
+
+    def hfq_factor(self, stock_code):
+        frame = self.inner.hfq_factor(stock_code)
+        self._save(frame, "hfq_factor", stock_code, None, None)
+        return frame
+
+    def stock_spot(self):
+        # 实时行情随时间变化，不录制；盘中行情用 intraday_monitor 的 --record 录制
+        return self.inner.stock_spot()
+
+    def index_spot(self, index_symbols):
+        return self.inner.index_spot(index_symbols)
+
+
+class ReplayMissError(LookupError):
+    """录制目录中没有能覆盖该请求的数据"""
+
+
+class ReplayProvider(DataProvider):
+    """
+    从 RecordingProvider 的录制目录回放数据
+    请求区间被某次录制完全覆盖时，从该录制中截取对应日期返回
+    """
+
+    name = "replay"
+
+    def __init__(self, record_dir):
+        self.record_dir = record_dir
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _recordings(self, method, symbol):
+        directory = os.path.join(self.record_dir, method)
+        if not os.path.isdir(directory):
+            return []
+        recordings = []
+        for filename in os.listdir(directory):
+            name, ext = os.path.splitext(filename)
+            parts = name.split("__")
+            if ext != ".pkl" or len(parts) != 3 or parts[0] != symbol:
+                continue
+            start = "00000000" if parts[1] == "all" else parts[1]
+            end = "99999999" if parts[2] == "all" else parts[2]
+            recordings.append((start, end, os.path.join(directory, filename)))
+        return sorted(recordings)
+
+    def _read(self, path):
+        with self._lock:
+            frame = self._frames.get(path)
+            if frame is None:
+                frame = self._frames[path] = pd.read_pickle(path)
+            return frame
+
+    def _replay(self, method, symbol, start_date, end_date, date_column):
+        start = start_date or "00000000"
+        end = end_date or "99999999"
+        for recorded_start, recorded_end, path in self._recordings(method, symbol):
+            if recorded_start <= start and end <= recorded_end:
+                frame = self._read(path)
+                if frame.empty:
+                    return frame.copy()
+                dates = pd.to_datetime(frame[date_column]).dt.strftime("%Y%m%d")
+                return frame[(dates >= start) & (dates <= end)].reset_index(drop=True)
+        raise ReplayMissError(f"没有录制 {method} {symbol} {start_date}-{end_date} 的数据")
+
+    def stock_hist(self, stock_code, start_date, end_date):
+        return self._replay("stock_hist", stock_code, start_date, end_date, "日期")
+
+    def index_daily(self, index_symbol, start_date=None, end_date=None):
+        return self._replay("index_daily", index_symbol, start_date, end_date, "date")
+
+    def hfq_factor(self, stock_code):
+        return self._replay("hfq_factor", stock_code, None, None, "date")
+
+
+class SyntheticProvider(DataProvider):
+    """
+    生成确定性的随机游走行情
+    全部股票和指数共享同一个市场因子：指数收益率 = 市场因子 + 少量噪声，
+    股票收益率 = beta × 市场因子 + 个股噪声，涨跌幅限制在±10%，并按 suspension_rate 随机停牌。
+    同一 seed 下任意代码、任意区间的数据都可复现，且不同区间请求得到的数据互相一致。
+    """
+
+    name = "synthetic"
+
+    def __init__(self, n_stocks=100, start="2005-01-04", end=None, seed=0,
+                 market_vol=0.012, stock_vol=0.02, suspension_rate=0.01):
+        self.n_stocks = n_stocks
+        self.seed = seed
+        self.market_vol = market_vol
+        self.stock_vol = stock_vol
+        self.suspension_rate = suspension_rate
+        self.calendar = pd.bdate_range(start, end or pd.Timestamp.today().normalize())
+        self._calendar_keys = self.calendar.strftime("%Y%m%d").to_numpy()
+        self._market = np.random.default_rng([seed, 0, 0]).normal(0.0003, market_vol, len(self.calendar))
+
+    def stock_codes(self):
+        """生成覆盖沪市主板、深市主板、中小板、创业板和科创板的股票代码"""
+        prefixes = ["600", "601", "000", "002", "300", "688"]
+        return [f"{prefixes[i % len(prefixes)]}{i // len(prefixes):03d}" for i in range(self.n_stocks)]
+
+    def _rng(self, symbol, stream):
+        """每个代码的每类随机量使用独立的随机流，日历变长时已有日期的数据保持不变"""
+        return np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), stream])
+
+    def _range(self, start_date, end_date):
+        lo = 0 if start_date is None else np.searchsorted(self._calendar_keys, start_date, side="left")
+        hi = len(self.calendar) if end_date is None else np.searchsorted(self._calendar_keys, end_date, side="right")
+        return lo, hi
+
+    def stock_hist(self, stock_code, start_date, end_date):
+        days = len(self.calendar)
+        beta, base_price = self._rng(stock_code, 0).uniform([0.6, 5], [1.4, 50])
+        returns = np.clip(beta * self._market + self._rng(stock_code, 1).normal(0, self.stock_vol, days), -0.1, 0.1)
+        closes = np.round(base_price * np.cumprod(1 + returns), 2)
+        prev_closes = np.concatenate([[closes[0]], closes[:-1]])
+        opens = np.round(prev_closes * (1 + self._rng(stock_code, 2).normal(0, 0.005, days)), 2)
+        spreads = self._rng(stock_code, 3).uniform(0, 0.02, (2, days))
+        highs = np.maximum(opens, closes) * (1 + spreads[0])
+        lows = np.minimum(opens, closes) * (1 - spreads[1])
+        volume = self._rng(stock_code, 4).integers(10000, 1000000, days)
+        turnover = self._rng(stock_code, 5).uniform(0.1, 5, days)
+        trading = self._rng(stock_code, 6).random(days) >= self.suspension_rate
+
+        lo, hi = self._range(start_date, end_date)
+        keep = np.flatnonzero(trading[lo:hi]) + lo
+        return pd.DataFrame({
+            "日期": self.calendar[keep].date,
+            "股票代码": stock_code,
+            "开盘": opens[keep],
+            "收盘": closes[keep],
+            "最高": np.round(highs[keep], 2),
+            "最低": np.round(lows[keep], 2),
+            "成交量": volume[keep],
+            "成交额": np.round(volume[keep] * closes[keep] * 100, 2),
+            "振幅": np.round((highs[keep] - lows[keep]) / prev_closes[keep] * 100, 2),
+            "涨跌幅": np.round((closes[keep] / prev_closes[keep] - 1) * 100, 2),
+            "涨跌额": np.round(closes[keep] - prev_closes[keep], 2),
+            "换手率": np.round(turnover[keep], 2),
+        }, columns=STOCK_COLUMNS)
+
+    def hfq_factor(self, stock_code):
+        """每年5～7月有一个除权除息日，后复权因子上调0.5%～5%；日历变长时已有的因子保持不变"""
+        dates, factors, factor = [self.calendar[0]], [1.0], 1.0
+        for year in np.unique(self.calendar.year):
+            rng = np.random.default_rng([self.seed, zlib.crc32(stock_code.encode()), 7, int(year)])
+            month, day = rng.integers(5, 8), rng.integers(1, 29)
+            ratio = rng.uniform(1.005, 1.05)
+            ex_date = pd.Timestamp(int(year), int(month), int(day))
+            if self.calendar[0] < ex_date <= self.calendar[-1]:
+                factor *= ratio
+                dates.append(ex_date)
+                factors.append(factor)
+        return pd.DataFrame({"date": [day.strftime("%Y-%m-%d") for day in dates], "hfq_factor": factors})
+
+    def stock_spot(self):
+        """日历最后一天的收盘价作为最新价，当天停牌的股票为NaN"""
+        last_day = self._calendar_keys[-1]
+        prices = []
+        for stock_code in self.stock_codes():
+            frame = self.stock_hist(stock_code, last_day, last_day)
+            prices.append(frame["收盘"].iloc[0] if not frame.empty else None)
+        return _spot_frame(self.stock_codes(), prices)
+
+    def index_spot(self, index_symbols):
+        index_symbols = list(index_symbols)
+        last_day = self._calendar_keys[-1]
+        prices = [self.index_daily(symbol, last_day, last_day)["close"].iloc[0] for symbol in index_symbols]
+        return _spot_frame(index_symbols, prices)
+
+    def index_daily(self, index_symbol, start_date=None, end_date=None):
+        days = len(self.calendar)
+        base_level = self._rng(index_symbol, 0).uniform(1000, 4000)
+        closes = base_level * np.cumprod(1 + self._market + self._rng(index_symbol, 1).normal(0, 0.002, days))
+        opens = closes * (1 + self._rng(index_symbol, 2).normal(0, 0.002, days))
+        volume = self._rng(index_symbol, 3).integers(10 ** 8, 10 ** 9, days)
+        lo, hi = self._range(start_date, end_date)
+        return pd.DataFrame({
+            "date": self.calendar[lo:hi].strftime("%Y-%m-%d"),
+            "open": opens[lo:hi],
+            "close": closes[lo:hi],
+            "high": np.maximum(opens, closes)[lo:hi] * 1.003,
+            "low": np.minimum(opens, closes)[lo:hi] * 0.997,
+            "volume": volume[lo:hi],
+            "amount": volume[lo:hi] * 1000.0,
+        }, columns=INDEX_COLUMNS)
+
+
+def provider_from_spec(spec):
+    """按 akshare / synthetic / replay:<目录> / record:<目录> 创建数据源"""
+    kind, _, argument = (spec or "akshare").partition(":")
+    if kind == "akshare":
+        return AkshareProvider()
+    if kind == "synthetic":
+        return SyntheticProvider(n_stocks=int(argument) if argument else 100)
+    if kind == "replay":
+        return ReplayProvider(argument)
+    if kind == "record":
+        return RecordingProvider(AkshareProvider(), argument)
+    raise ValueError(f"未知的数据源: {spec}")
+
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+
+def get_default_provider():
+    """返回进程内共享的默认数据源"""
+    global _default_provider
+    with _default_provider_lock:
+        if _default_provider is None:
+            _default_provider = provider_from_spec(os.environ.get("STOCK_TOOLS_PROVIDER"))
+        return _default_provider
+
+
+def set_default_provider(provider):
+    """替换默认数据源，之后默认行情缓存和指数仓库的请求都会使用它"""
+    global _default_provider
+    with _default_provider_lock:
+        _default_provider = provider
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按数据源限速的令牌桶
+
+http_fetch.HttpClient 按主机各用一个令牌桶，所有线程的请求（含重试）共享，控制每秒请求数，避免被上游限流。
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """线程安全的令牌桶，rate 为每秒请求数，burst 为允许的突发请求数"""
+
+    def __init__(self, rate, burst=None, clock=None, sleep=None):
+        if rate <= 0:
+            raise ValueError("rate 必须大于0")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.clock = clock or time.monotonic
+        self.sleep = sleep or time.sleep
+        self._tokens = self.burst
+        self._updated = self.clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分析结果缓存
+
+按 (股票代码, 起始日期, 结束日期, 复权方式, 基准指数) 缓存 AnalysisResult，容量有限，按最近使用淘汰。
+- 结束日期早于今天的区间，行情已经收盘确定，结果永不过期
+- 包含今天的区间，在股票或基准指数的行情更新后失效，且最长只保留 live_ttl 秒；
+  跨天后一律失效（昨天算出的"今天"结果可能基于盘中数据）
+
+行情缓存和指数仓库每次从数据源拿到新数据时调用 notify_data_update(代码)，
+数据源不可用、改用本地旧数据时调用 notify_stale_data(代码)。
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_LIVE_TTL = 60.0
+
+_generations = {}
+_stale = set()
+_generations_lock = threading.Lock()
+
+
+def notify_data_update(symbol):
+    """symbol（股票代码或指数代码）的行情有更新，依赖它的当日结果随之失效"""
+    with _generations_lock:
+        _generations[symbol] = _generations.get(symbol, 0) + 1
+        _stale.discard(symbol)
+
+
+def notify_stale_data(symbol):
+    """
+    数据源不可用，symbol 只能用本地已有的数据顶替：在拿到新数据之前，
+    依赖它的结果即使是历史区间也按包含今天的区间处理，最长保留 live_ttl 秒
+    """
+    with _generations_lock:
+        _stale.add(symbol)
+
+
+def is_stale(symbol):
+    with _generations_lock:
+        return symbol in _stale
+
+
+def data_generation(symbol):
+    with _generations_lock:
+        return _generations.get(symbol, 0)
+
+
+def result_key(stock_code, start_date, end_date, adjust, benchmark):
+    return (stock_code, start_date, end_date, adjust, benchmark)
+
+
+class ResultCache:
+    """线程安全的分析结果缓存，hits/misses/evictions/expirations 用于评估容量"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, live_ttl=DEFAULT_LIVE_TTL, clock=None, today=None):
+        self.max_entries = max_entries
+        self.live_ttl = live_ttl
+        self.clock = clock or time.monotonic
+        self.today = today or date.today
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _stamp(self, key):
+        """包含今天的结果所依赖的行情版本"""
+        stock_code, _, _, _, benchmark = key
+        return self.today(), data_generation(stock_code), data_generation(benchmark), self.clock()
+
+    def get(self, key):
+        """返回缓存的结果，不存在或已失效时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and not self._is_fresh(key, entry[1]):
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _is_fresh(self, key, stamp):
+        computed_on, stock_generation, benchmark_generation, computed_at = stamp
+        _, now_stock, now_benchmark, now = self._stamp(key)
+        return (computed_on == self.today() and stock_generation == now_stock
+                and benchmark_generation == now_benchmark and now - computed_at <= self.live_ttl)
+
+    def put(self, key, result):
+        """保存结果；key 的结束日期早于今天且所用行情都不是旧数据顶替时永不过期"""
+        stock_code, _, end_date, _, benchmark = key
+        live = end_date >= self.today().strftime("%Y-%m-%d") or is_stale(stock_code) or is_stale(benchmark)
+        with self._lock:
+            self._entries[key] = (result, self._stamp(key) if live else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """返回进程内共享的结果缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
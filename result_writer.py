@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分析结果的流式结构化输出：CSV、JSONL 或 Parquet
+
+每只股票一行，列名为英文，数值保持原始精度，建议用等级和规则序号表示，
+下游可以直接加载而不需要解析中文文字。结果到达后先放入最多 chunk_size 行的缓冲区，
+满一块就写出并清空（Parquet 每块一个 row group），内存占用与股票数、窗口数无关。
+
+    with open_writer("results.parquet") as writer:
+        for result in results:
+            writer.write(result_row(result))
+
+Parquet 需要安装 pyarrow，只在使用时导入。列类型事先确定（RESULT_COLUMNS 见 COLUMN_TYPES，
+write_frame 写入的其他列取 DataFrame 的类型），不随第一块的内容变化。
+"""
+import csv
+import json
+import math
+import os
+import sys
+
+from advice_rules import LEVELS, get_advice_rules
+from trigger_projection import DEFAULT_DAYS
+
+FORMATS = ("csv", "jsonl", "parquet")
+DEFAULT_CHUNK_SIZE = 1000
+
+RESULT_COLUMNS = [
+    "code", "ok", "error", "index_symbol", "start_date", "end_date", "adjust",
+    "stock_cumulative_return", "index_cumulative_return", "deviation",
+    "stock_avg_return", "index_avg_return", "avg_deviation", "level", "rule_id",
+] + [f"trigger_{day}d_{name}" for day in DEFAULT_DAYS for name in ("lower", "upper", "always")] + [
+    "index_move", "trigger_threshold", "analyzed_at",
+]
+
+# 列类型：string / bool / int / float
+COLUMN_TYPES = dict.fromkeys(RESULT_COLUMNS, "float")
+COLUMN_TYPES.update(dict.fromkeys(["code", "error", "index_symbol", "start_date", "end_date", "adjust", "level",
+                                   "analyzed_at"], "string"))
+COLUMN_TYPES.update({"ok": "bool", "rule_id": "int"})
+COLUMN_TYPES.update({f"trigger_{day}d_always": "bool" for day in DEFAULT_DAYS})
+
+
+def _number(value):
+    return None if value is None or math.isnan(value) else float(value)
+
+
+def result_row(result):
+    """把 analysis_core.AnalysisResult 转为 RESULT_COLUMNS 对应的字典"""
+    rules = get_advice_rules()
+    rule_id = rules.rule_id(result.deviation, result.avg_deviation)
+    row = {
+        "code": result.stock_code,
+        "ok": True,
+        "error": None,
+        "index_symbol": result.index_symbol,
+        "start_date": result.start_date,
+        "end_date": result.end_date,
+        "adjust": result.adjust,
+        "stock_cumulative_return": _number(result.stock_cumulative_return),
+        "index_cumulative_return": _number(result.index_cumulative_return),
+        "deviation": _number(result.deviation),
+        "stock_avg_return": _number(result.stock_avg_return),
+        "index_avg_return": _number(result.index_avg_return),
+        "avg_deviation": _number(result.avg_deviation),
+        "level": LEVELS[rules.level_codes[rule_id]],
+        "rule_id": rule_id,
+        "index_move": _number(result.index_move),
+        "trigger_threshold": _number(result.trigger_threshold),
+        "analyzed_at": result.analyzed_at.isoformat(timespec="seconds"),
+    }
+    for item in result.trigger_prices:
+        row[f"trigger_{item.day}d_lower"] = _number(item.lower)
+        row[f"trigger_{item.day}d_upper"] = _number(item.upper)
+        row[f"trigger_{item.day}d_always"] = bool(item.always)
+    return row
+
+
+def _column_type(series):
+    """DataFrame 一列对应的列类型，日期列按字符串写出"""
+    return {"b": "bool", "i": "int", "u": "int", "f": "float"}.get(series.dtype.kind, "string")
+
+
+def _column_values(series):
+    """DataFrame 一列转为 Python 值的列表，日期列转为 ISO 格式的字符串"""
+    if series.dtype.kind == "M":
+        whole_days = (series.dropna() == series.dropna().dt.normalize()).all()
+        text = series.dt.strftime("%Y-%m-%d" if whole_days else "%Y-%m-%dT%H:%M:%S")
+        return [None if value is None or value != value else value for value in text.tolist()]
+    return series.tolist()
+
+
+def error_row(stock_code, message):
+    """分析失败的股票：ok 为 False，error 为失败原因"""
+    return {"code": stock_code, "ok": False, "error": message}
+
+
+class ResultWriter:
+    """
+    按块写出字典行的基类，子类实现 _write_chunk；缺少的列写为空值，多余的键忽略
+    types 为 {列名: string/bool/int/float}，补充或覆盖 COLUMN_TYPES
+    """
+
+    def __init__(self, stream, columns=RESULT_COLUMNS, chunk_size=DEFAULT_CHUNK_SIZE, close_stream=False, types=None):
+        self.stream = stream
+        self.columns = list(columns)
+        self.types = {column: COLUMN_TYPES[column] for column in self.columns if column in COLUMN_TYPES}
+        self.types.update(types or {})
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self._buffer = []
+        self._close_stream = close_stream
+
+    def write(self, row):
+        self._buffer.append([row.get(column) for column in self.columns])
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def write_frame(self, frame):
+        """写入 DataFrame 的全部行，按 chunk_size 分块转换，NaN 写为空值"""
+        for column in self.columns:
+            if column in frame and column not in self.types:
+                self.types[column] = _column_type(frame[column])
+        for start in range(0, len(frame), self.chunk_size):
+            chunk = frame.iloc[start:start + self.chunk_size]
+            # tolist 把 numpy 标量转为 Python 类型，JSON 和 CSV 都能直接写出
+            columns = [_column_values(chunk[column]) if column in chunk else [None] * len(chunk)
+                       for column in self.columns]
+            for row in zip(*columns):
+                self._buffer.append([None if isinstance(value, float) and math.isnan(value) else value
+                                     for value in row])
+                if len(self._buffer) >= self.chunk_size:
+                    self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._write_chunk(self._buffer)
+            self.rows += len(self._buffer)
+            self._buffer = []
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+    def _write_chunk(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+        if self._close_stream:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvResultWriter(ResultWriter):
+    """UTF-8 CSV，第一行为列名，空值为空字符串"""
+
+    def __init__(self, stream, columns=RESULT_COLUMNS, chunk_size=DEFAULT_CHUNK_SIZE, close_stream=False, types=None):
+        super().__init__(stream, columns, chunk_size, close_stream, types)
+        self._csv = csv.writer(stream, lineterminator="\n")
+        self._csv.writerow(self.columns)
+
+    def _write_chunk(self, rows):
+        self._csv.writerows(rows)
+
+
+class JsonlResultWriter(ResultWriter):
+    """每行一个JSON对象，空值为 null"""
+
+    def _write_chunk(self, rows):
+        self.stream.write("".join(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + "\n"
+                                  for row in rows))
+
+
+class ParquetResultWriter(ResultWriter):
+    """
+    Parquet 文件，每块一个 row group；列类型按 types 声明，全部为空的块也不改变类型
+    没有声明类型的列由第一块推断，全为空时按字符串处理
+    """
+
+    def __init__(self, path, columns=RESULT_COLUMNS, chunk_size=DEFAULT_CHUNK_SIZE, types=None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("输出 Parquet 需要安装 pyarrow: pip install pyarrow") from e
+        super().__init__(None, columns, chunk_size, types=types)
+        self.path = path
+        self._writer = None
+
+    def _write_chunk(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrays = {column: [row[position] for row in rows] for position, column in enumerate(self.columns)}
+        if self._writer is None:
+            types = {"string": pa.string(), "bool": pa.bool_(), "int": pa.int64(), "float": pa.float64()}
+            fields = []
+            for column in self.columns:
+                if column in self.types:
+                    field_type = types[self.types[column]]
+                else:
+                    field_type = pa.array(arrays[column]).type
+                    if pa.types.is_null(field_type):
+                        field_type = pa.string()
+                fields.append(pa.field(column, field_type))
+            self._writer = pq.ParquetWriter(self.path, pa.schema(fields))
+        table = pa.table(arrays, schema=self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self._writer is None:
+            self._write_chunk([])
+        self._writer.close()
+
+
+def infer_format(path):
+    """根据扩展名判断输出格式，无法判断时为 csv"""
+    extension = os.path.splitext(path)[1].lower()
+    return {".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet", ".pq": "parquet"}.get(extension, "csv")
+
+
+def open_writer(path, format=None, columns=RESULT_COLUMNS, chunk_size=DEFAULT_CHUNK_SIZE, types=None):
+    """
+    打开结果输出，path 为 - 时写到标准输出
+    format 为 csv / jsonl / parquet，省略时根据扩展名判断；types 为列类型，见 ResultWriter
+    """
+    format = format or ("csv" if path == "-" else infer_format(path))
+    if format not in FORMATS:
+        raise ValueError(f"不支持的输出格式: {format}")
+    if format == "parquet":
+        if path == "-":
+            raise ValueError("Parquet 格式需要指定输出文件")
+        return ParquetResultWriter(path, columns, chunk_size, types)
+    writer_class = CsvResultWriter if format == "csv" else JsonlResultWriter
+    if path == "-":
+        return writer_class(sys.stdout, columns, chunk_size, types=types)
+    return writer_class(open(path, "w", encoding="utf-8", newline=""), columns, chunk_size, close_stream=True,
+                        types=types)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+滚动N个交易日偏离值扫描
+
+交易所的异常波动规则按连续若干个交易日的累计偏离值判断。这里对完整历史一次性计算
+对数收益率前缀和，任意窗口的累计涨幅为 exp(L[t] - L[t-n]) - 1，每个窗口只需O(1)。
+窗口长度为n时，窗口包含n个日收益率，基准为窗口开始前一个交易日的收盘价。
+停牌日沿用上一个收盘价（当天收益率为0）。
+"""
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+from deviation_engine import forward_fill
+from advice_rules import LEVELS, get_advice_rules
+
+DEFAULT_WINDOWS = (3, 5, 10, 30)
+
+LEVEL_NONE = 0
+LEVEL_MEDIUM = 1
+LEVEL_HIGH = 2
+LEVEL_NAMES = LEVELS
+
+
+class PrefixSums:
+    """
+    收盘价矩阵的前缀和，第0行为0，第t+1行为截至第t个交易日的累计值
+    log_returns: 对数收益率之和；returns: 简单收益率之和；counts: 有收益率的交易日数
+    """
+
+    def __init__(self, prices):
+        prices = np.asarray(prices, dtype=np.float64)
+        if prices.ndim == 1:
+            prices = prices[:, None]
+        self.filled = forward_fill(prices)
+        rows, columns = self.filled.shape
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = self.filled[1:] / self.filled[:-1]
+        has_return = ~np.isnan(ratio)
+        self.log_returns = np.zeros((rows + 1, columns))
+        self.returns = np.zeros((rows + 1, columns))
+        self.counts = np.zeros((rows + 1, columns), dtype=np.int64)
+        np.cumsum(np.where(has_return, np.log(ratio), 0.0), axis=0, out=self.log_returns[2:])
+        np.cumsum(np.where(has_return, ratio - 1, 0.0), axis=0, out=self.returns[2:])
+        np.cumsum(has_return, axis=0, out=self.counts[2:])
+
+    def window(self, window):
+        """
+        返回以每个交易日结尾、长度为 window 的窗口累计涨幅与平均日收益率，
+        形状与价格矩阵相同，不足一个窗口或缺少基准价的位置为NaN
+        """
+        rows, columns = self.filled.shape
+        cumulative = np.full((rows, columns), np.nan)
+        average = np.full((rows, columns), np.nan)
+        if window < 1 or window >= rows:
+            return cumulative, average
+        end = slice(window + 1, rows + 1)
+        start = slice(1, rows + 1 - window)
+        count = self.counts[end] - self.counts[start]
+        anchor_valid = ~np.isnan(self.filled[:rows - window])
+        cumulative[window:] = np.where(anchor_valid, np.expm1(self.log_returns[end] - self.log_returns[start]), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average[window:] = np.where(anchor_valid & (count > 0), (self.returns[end] - self.returns[start]) / count, np.nan)
+        return cumulative, average
+
+
+def level_names(levels):
+    """等级编号数组转为等级名称数组"""
+    return np.asarray(LEVEL_NAMES)[levels]
+
+
+def classify(cumulative_deviation, avg_deviation):
+    """按 generate_advice 的规则表给出等级：0 正常，1 中等，2 较大"""
+    return get_advice_rules().levels(cumulative_deviation, avg_deviation)
+
+
+def rolling_deviation(prices, index_prices, benchmark_columns, window, stock_sums=None, index_sums=None):
+    """
+    计算每个交易日结尾的 window 日滚动偏离值
+    返回字典，值均为 (交易日, 股票) 矩阵：stock_return, index_return, deviation, avg_deviation, level
+    """
+    if stock_sums is None:
+        stock_sums = PrefixSums(prices)
+    if index_sums is None:
+        index_sums = PrefixSums(index_prices)
+    benchmark_columns = np.asarray(benchmark_columns, dtype=np.intp)
+
+    stock_return, stock_avg = stock_sums.window(window)
+    index_return, index_avg = index_sums.window(window)
+    index_return = index_return[:, benchmark_columns]
+    index_avg = index_avg[:, benchmark_columns]
+
+    deviation = stock_return - index_return
+    avg_deviation = stock_avg - index_avg
+    levels = classify(np.nan_to_num(deviation), np.nan_to_num(avg_deviation))
+    levels[np.isnan(deviation)] = LEVEL_NONE
+    return {
+        "stock_return": stock_return,
+        "index_return": index_return,
+        "deviation": deviation,
+        "avg_deviation": avg_deviation,
+        "level": levels,
+    }
+
+
+def scan_rolling_windows(prices, index_prices, benchmark_columns, windows=DEFAULT_WINDOWS,
+                         dates=None, codes=None, min_level=LEVEL_MEDIUM):
+    """
+    对完整历史扫描所有滚动窗口，返回达到 min_level 的窗口列表（DataFrame）
+    列为 date, code, window, stock_return, index_return, deviation, avg_deviation, level
+    """
+    stock_sums = PrefixSums(prices)
+    index_sums = PrefixSums(index_prices)
+    rows, columns = stock_sums.filled.shape
+    dates = np.asarray(dates) if dates is not None else np.arange(rows)
+    codes = np.asarray(codes) if codes is not None else np.arange(columns)
+
+    flagged = []
+    for window in windows:
+        result = rolling_deviation(prices, index_prices, benchmark_columns, window, stock_sums, index_sums)
+        row_ids, column_ids = np.nonzero(result["level"] >= min_level)
+        flagged.append(pd.DataFrame({
+            "date": dates[row_ids],
+            "code": codes[column_ids],
+            "window": window,
+            "stock_return": result["stock_return"][row_ids, column_ids],
+            "index_return": result["index_return"][row_ids, column_ids],
+            "deviation": result["deviation"][row_ids, column_ids],
+            "avg_deviation": result["avg_deviation"][row_ids, column_ids],
+            "level": level_names(result["level"][row_ids, column_ids]),
+        }))
+    return pd.concat(flagged, ignore_index=True).sort_values(["date", "code", "window"], kind="stable").reset_index(drop=True)
@@ -1,217 +1,222 @@
-import akshare as ak
-import pandas as pd
-import numpy as np
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+# 分析核心只依赖标准库，pandas、numpy 和数据源在第一次分析时才导入，--help 与输入校验可以立即返回
+from analysis_core import (
+    DEFAULT_ADJUST,
+    DEFAULT_INDEX_MOVE,
+    AnalysisError,
+    analyze,
+    calculate_deviation,
+    generate_advice,
+    get_index_for_stock,
+)
+from metrics import NULL_METRICS, MemorySink, MultiSink, format_summary, make_metrics, sink_from_spec
+from trading_calendar import last_trading_days
 
-def calculate_deviation(stock_returns, index_returns):
-    """
-    计算股票相对于大盘的偏离值
-    偏离值 = 股票收益率 - 大盘收益率
-    """
-    if len(stock_returns) == 0 or len(index_returns) == 0:
-        return 0.0
-        
-    stock_avg = np.mean(stock_returns)
-    index_avg = np.mean(index_returns)
-    
-    return stock_avg - index_avg
-
-def generate_advice(cumulative_deviation, avg_deviation):
-    """
-    根据偏离值生成异动监管建议
-    """
-    # 根据偏离值的大小和方向给出不同的建议
-    abs_cumulative_deviation = abs(cumulative_deviation)
-    abs_avg_deviation = abs(avg_deviation)
-    
-    # 综合评估偏离程度
-    avg_deviation = (abs_cumulative_deviation + abs_avg_deviation) / 2
-    
-    # 生成建议
-    if avg_deviation > 0.05:  # 偏离度较大
-        if cumulative_deviation > 0:
-            # 持续强势
-            advice_1d = "股票表现强势，偏离大盘较多，注意监管风险，建议关注资金流向"
-            advice_2d = "强势股需关注后续资金持续性，警惕高位调整风险"
-            advice_3d = "若偏离度持续扩大，可能触发异动监管，建议谨慎操作"
-        else:
-            # 持续弱势
-            advice_1d = "股票表现弱势，持续跑输大盘，关注基本面变化"
-            advice_2d = "弱势股需关注是否有资金抄底，或存在利空消息"
-            advice_3d = "若持续弱势，可能影响投资者信心，建议等待企稳信号"
-    elif avg_deviation > 0.02:  # 中等偏离
-        advice_1d = "股票有一定偏离，属于正常波动范围，继续观察"
-        advice_2d = "偏离度中等，建议关注后续走势是否收敛"
-        advice_3d = "偏离度适中，暂无明显监管风险，持续观察"
-    else:  # 偏离较小
-        advice_1d = "股票走势与大盘基本同步，偏离度较小，风险较低"
-        advice_2d = "与大盘同步运行，符合市场预期，风险可控"
-        advice_3d = "走势稳定，偏离度小，暂无监管风险"
-    
-    return advice_1d, advice_2d, advice_3d
-
-def analyze_stock(stock_code, start_date, end_date):
+def analyze_stock(stock_code, start_date, end_date, log=print, metrics=None, index_move=DEFAULT_INDEX_MOVE,
+                  adjust=DEFAULT_ADJUST):
     """
     分析股票的偏离值和生成监管建议
+    log 用于输出进度和结果，批量模式下可传入其他函数以关闭逐行打印
+    metrics 为 metrics.Metrics 时记录各阶段耗时、行数和缓存命中情况
+    index_move 为预测触发价格时假设的大盘每日涨跌幅
+    adjust 为复权方式：""（不复权）、"qfq"（前复权）或 "hfq"（后复权）
+    返回 (股票累计涨幅, 大盘累计涨幅, 偏离值, 第1天建议, 第2天建议, 第3天建议)，失败时返回None
     """
-    print(f"正在获取股票 {stock_code} 的数据...")
-    
-    # 根据股票代码格式确定对应的大盘指数
-    if stock_code.startswith("6"):
-        # 上证股票
-        index_symbol = "sh000001"
-        index_name = "上证指数"
-    elif stock_code.startswith("300") or stock_code.startswith("301"):
-        # 创业板股票
-        index_symbol = "sz399006"
-        index_name = "创业板指"
-    elif stock_code.startswith("00"):
-        # 深证股票
-        index_symbol = "sz399001"
-        index_name = "深证成指"
-    else:
-        # 默认使用上证指数
-        index_symbol = "sh000001"
-        index_name = "上证指数"
-        
-    # 将日期格式转换为YYYYMMDD
-    start_date_formatted = start_date.replace("-", "")
-    end_date_formatted = end_date.replace("-", "")
-    
-    # 获取股票历史数据
-    try:
-        stock_hist = ak.stock_zh_a_hist(symbol=stock_code, period="daily", adjust="", start_date=start_date_formatted, end_date=end_date_formatted)
-        
-        if stock_hist.empty:
-            print("无法获取股票数据，请检查股票代码和日期范围是否正确")
-            return
-    except Exception as e:
-        print(f"获取股票数据时出现错误: {str(e)}")
-        return
+    result = analyze_result(stock_code, start_date, end_date, log, metrics, index_move, adjust)
+    return None if result is None else result.as_tuple()
 
-    print(f"正在获取{index_name}数据...")
-    
+def analyze_result(stock_code, start_date, end_date, log=print, metrics=None, index_move=DEFAULT_INDEX_MOVE,
+                   adjust=DEFAULT_ADJUST):
+    """与 analyze_stock 相同，但返回完整的 AnalysisResult，失败时返回None"""
+    metrics = metrics or NULL_METRICS
+    metrics.begin()
+    result = None
     try:
-        # 获取大盘数据
-        index_data = ak.stock_zh_index_daily_em(symbol=index_symbol)
-        
-        if index_data.empty:
-            print("无法获取大盘数据")
-            return
-    except Exception as e:
-        print(f"获取大盘数据时出现错误: {str(e)}")
-        return
-
-    # 数据预处理
-    stock_hist['日期'] = pd.to_datetime(stock_hist['日期'])
-    index_data['date'] = pd.to_datetime(index_data['date'])
-    
-    # 按日期排序
-    stock_hist = stock_hist.sort_values('日期', ascending=True)
-    index_data = index_data.sort_values('date', ascending=True)
-    
-    # 计算累计涨幅
-    stock_start_price = stock_hist.iloc[0]['收盘']
-    stock_end_price = stock_hist.iloc[-1]['收盘']
-    stock_cumulative_return = (stock_end_price - stock_start_price) / stock_start_price
-    
-    # 找到对应的大盘数据
-    start_date_dt = pd.to_datetime(start_date)
-    end_date_dt = pd.to_datetime(end_date)
-    
-    # 筛选指数数据在指定日期范围内
-    index_filtered = index_data[(index_data['date'] >= start_date_dt) & (index_data['date'] <= end_date_dt)]
-    
-    if len(index_filtered) < 2:
-        print("指数数据不足，无法进行分析")
-        return
-    
-    index_start_price = index_filtered.iloc[0]['close']
-    index_end_price = index_filtered.iloc[-1]['close']
-    index_cumulative_return = (index_end_price - index_start_price) / index_start_price
-
-    print("正在计算偏离值...")
-    
-    # 计算收益率
-    stock_hist['收益率'] = stock_hist['收盘'].pct_change()
-    index_filtered['收益率'] = index_filtered['close'].pct_change()
-    
-    # 重命名日期列以便合并
-    stock_hist_renamed = stock_hist.rename(columns={'日期': 'date'})
-    
-    # 合并数据
-    merged_data = pd.merge(stock_hist_renamed[['date', '收益率']], 
-                         index_filtered[['date', '收益率']], 
-                         on='date', 
-                         suffixes=('_stock', '_index'))
-    
-    # 删除缺失值
-    merged_data = merged_data.dropna()
-    
-    if len(merged_data) < 1:
-        print("数据不足，无法进行分析")
-        return
-        
-    # 计算平均收益率
-    stock_avg_return = merged_data['收益率_stock'].mean()
-    index_avg_return = merged_data['收益率_index'].mean()
-    
-    # 计算偏离值
-    deviation = stock_cumulative_return - index_cumulative_return
-    
-    print("正在生成异动监管建议...")
-    
-    advice_1d, advice_2d, advice_3d = generate_advice(deviation, stock_avg_return - index_avg_return)
-    
-    # 显示结果
-    result = f"""
-股票代码: {stock_code}
-分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-时间范围: {start_date} 至 {end_date}
-
-涨跌幅分析:
-- 股票区间累计涨幅: {stock_cumulative_return:.4f} ({stock_cumulative_return*100:.2f}%)
-- {index_name}区间累计涨幅: {index_cumulative_return:.4f} ({index_cumulative_return*100:.2f}%)
-- 累计涨幅偏离值: {deviation:.4f} ({deviation*100:.2f}%)
-
-异动监管建议:
-- 第1天: {advice_1d}
-- 第2天: {advice_2d}
-- 第3天: {advice_3d}
-
-分析完成！
-    """
-    
-    print(result)
-    return stock_cumulative_return, index_cumulative_return, deviation, advice_1d, advice_2d, advice_3d
+        result = analyze(stock_code, start_date, end_date, metrics=metrics,
+                         progress=lambda message, fraction: message and log(message), index_move=index_move,
+                         adjust=adjust)
+    except AnalysisError as e:
+        log(str(e))
+        return None
+    finally:
+        metrics.finish(code=stock_code, start_date=start_date, end_date=end_date, ok=result is not None)
+    log(result.format_report())
+    return result
 
-if __name__ == "__main__":
+def interactive_main(metrics_sink=None, index_move=DEFAULT_INDEX_MOVE, adjust=DEFAULT_ADJUST):
+    """交互式分析单只股票"""
     print("A股股票异动监管建议工具（命令行版）")
     stock_code = input("请输入A股股票代码（如：000001）: ")
     
     # 获取时间范围
     print("请选择时间范围:")
-    print("1. 近10天")
-    print("2. 近30天")
+    print("1. 近10个交易日")
+    print("2. 近30个交易日")
     print("3. 自定义时间范围")
+    print("4. 最近N个交易日")
     
-    choice = input("请输入选择（1/2/3）: ")
+    choice = input("请输入选择（1/2/3/4）: ")
     
     if choice == "1":
-        end_date = datetime.now().strftime('%Y-%m-%d')
-        start_date = (datetime.now() - timedelta(days=10)).strftime('%Y-%m-%d')
+        start_date, end_date = last_trading_days(10)
     elif choice == "2":
-        end_date = datetime.now().strftime('%Y-%m-%d')
-        start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        start_date, end_date = last_trading_days(30)
     elif choice == "3":
         start_date = input("请输入起始日期（格式：YYYY-MM-DD）: ")
         end_date = input("请输入结束日期（格式：YYYY-MM-DD）: ")
+    elif choice == "4":
+        days = input("请输入交易日数: ").strip()
+        if not days.isdigit() or int(days) < 1:
+            print("请输入正整数")
+            return
+        start_date, end_date = last_trading_days(int(days))
     else:
-        print("无效选择，使用默认近30天")
-        end_date = datetime.now().strftime('%Y-%m-%d')
-        start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        print("无效选择，使用默认近30个交易日")
+        start_date, end_date = last_trading_days(30)
     
-    if stock_code.strip() and start_date.strip() and end_date.strip():
-        analyze_stock(stock_code.strip(), start_date.strip(), end_date.strip())
+    analyze_stock(stock_code, start_date, end_date, metrics=make_metrics(metrics_sink), index_move=index_move,
+                  adjust=adjust)
+    if isinstance(metrics_sink, MemorySink) and metrics_sink.records:
+        print(format_summary(metrics_sink.summary()))
+
+def read_watchlist(stream):
+    """
+    读取自选股列表，每行可包含一个或多个以逗号/空白分隔的代码，#之后为注释
+    返回去重后保持原顺序的代码列表
+    """
+    codes = []
+    seen = set()
+    for line in stream:
+        line = line.split("#", 1)[0]
+        for code in line.replace(",", " ").split():
+            if code not in seen:
+                seen.add(code)
+                codes.append(code)
+    return codes
+
+def iter_batch(stock_codes, start_date, end_date, workers=8, rate=5.0, metrics_sink=None, full_results=False,
+               adjust=DEFAULT_ADJUST):
+    """
+    使用有界线程池批量分析，每只股票完成后立即产出 (股票代码, 结果, 最后一条消息)
+    结果为 analyze_stock 的6元组，full_results 为真时为 AnalysisResult，失败时为None
+    rate 为访问上游的每秒请求数，批次进行期间由数据源的HTTP客户端按主机统一限速（与同时进行的其他批次共享），
+    批次结束后恢复原来的速率；每个大盘指数在批次开始前只获取一次
+    metrics_sink 不为None时每只股票的分阶段指标都会写入该输出
+    """
+    from index_store import get_index_store
+    from providers import get_default_provider
+
+    index_store = get_index_store()
+
+    def run(stock_code):
+        messages = []
+        result = analyze_result(stock_code, start_date, end_date, log=messages.append, metrics=make_metrics(metrics_sink),
+                                adjust=adjust)
+        if result is not None and not full_results:
+            result = result.as_tuple()
+        return stock_code, result, messages[-1] if messages else ""
+
+    with get_default_provider().limit_rate(rate):
+        for index_symbol in sorted({get_index_for_stock(code)[0] for code in stock_codes}):
+            try:
+                index_store.history(index_symbol, until=end_date)
+            except Exception as e:
+                print(f"获取大盘数据 {index_symbol} 时出现错误: {str(e)}", file=sys.stderr)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run, code) for code in stock_codes]
+            for future in as_completed(futures):
+                yield future.result()
+
+def analyze_batch(stock_codes, start_date, end_date, workers=8, rate=5.0, output=None, metrics_sink=None, writer=None,
+                  adjust=DEFAULT_ADJUST):
+    """
+    批量分析并以制表符分隔的行流式输出结果，返回成功分析的股票数量
+    writer 为 result_writer 的输出时改为逐行写入结构化结果（英文列名，数值不做格式化）
+    指定 metrics_sink 时，批次结束后在标准错误输出各阶段的 p50/p95/p99 耗时
+    """
+    from result_writer import error_row, result_row
+
+    output = output or sys.stdout
+    collector = None
+    if metrics_sink is not None:
+        collector = metrics_sink if isinstance(metrics_sink, MemorySink) else MemorySink()
+        if collector is not metrics_sink:
+            metrics_sink = MultiSink(metrics_sink, collector)
+    if writer is None:
+        output.write("股票代码\t股票累计涨幅\t大盘累计涨幅\t偏离值\t第1天建议\n")
+    succeeded = 0
+    for stock_code, result, message in iter_batch(stock_codes, start_date, end_date, workers, rate, metrics_sink,
+                                                  full_results=True, adjust=adjust):
+        if writer is not None:
+            writer.write(error_row(stock_code, message) if result is None else result_row(result))
+            succeeded += result is not None
+            continue
+        if result is None:
+            output.write(f"{stock_code}\t\t\t\t{message}\n")
+        else:
+            output.write(f"{stock_code}\t{result.stock_cumulative_return:.4f}\t{result.index_cumulative_return:.4f}\t{result.deviation:.4f}\t{result.advice[0]}\n")
+            succeeded += 1
+        output.flush()
+    if collector is not None:
+        print(format_summary(collector.summary()), file=sys.stderr)
+        print("\t".join(f"{name}={value}" for name, value in sorted(collector.counters().items())), file=sys.stderr)
+    return succeeded
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="A股股票异动监管建议工具（命令行版）")
+    parser.add_argument("--batch", metavar="FILE", help="自选股列表文件，每行一个代码；为 - 时从标准输入读取")
+    parser.add_argument("--start", help="起始日期（YYYY-MM-DD）")
+    parser.add_argument("--end", help="结束日期（YYYY-MM-DD），默认为今天")
+    parser.add_argument("--days", type=int, default=30, help="未指定起始日期时分析最近N个自然日，默认30")
+    parser.add_argument("--trading-days", type=int, metavar="N", help="未指定起始日期时分析截至结束日期的最近N个交易日")
+    parser.add_argument("--workers", type=int, default=8, help="并发线程数，默认8")
+    parser.add_argument("--rate", type=float, default=5.0, help="每个数据源每秒最多请求数，默认5")
+    parser.add_argument("--metrics", metavar="SPEC", help="输出分阶段指标：log、memory 或 jsonl:<路径>")
+    parser.add_argument("--index-move", type=float, default=DEFAULT_INDEX_MOVE * 100, metavar="PCT",
+                        help="预测触发价格时假设的大盘每日涨跌幅（%%），默认0")
+    parser.add_argument("--adjust", choices=("qfq", "hfq"), default=DEFAULT_ADJUST,
+                        help="复权方式：qfq 前复权、hfq 后复权，默认不复权；复权因子单独缓存，切换时不重新获取行情")
+    parser.add_argument("--output", metavar="PATH", help="批量模式把结构化结果写入文件，为 - 时写到标准输出")
+    parser.add_argument("--format", choices=("csv", "jsonl", "parquet"), help="--output 的格式，默认根据扩展名判断")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics_sink = sink_from_spec(args.metrics) if args.metrics else None
+    if not args.batch:
+        interactive_main(metrics_sink, args.index_move / 100, args.adjust)
+        return
+
+    end_date = args.end or datetime.now().strftime('%Y-%m-%d')
+    if args.start:
+        start_date = args.start
+    elif args.trading_days:
+        start_date, end_date = last_trading_days(args.trading_days, end_date)
     else:
-        print("请输入有效的股票代码和日期范围")
\ No newline at end of file
+        start_date = (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=args.days)).strftime('%Y-%m-%d')
+    if args.batch == "-":
+        stock_codes = read_watchlist(sys.stdin)
+    else:
+        with open(args.batch, encoding="utf-8") as f:
+            stock_codes = read_watchlist(f)
+    if not stock_codes:
+        print("自选股列表为空", file=sys.stderr)
+        return
+    if not args.output:
+        analyze_batch(stock_codes, start_date, end_date, workers=args.workers, rate=args.rate, metrics_sink=metrics_sink,
+                      adjust=args.adjust)
+        return
+    from result_writer import open_writer
+
+    with open_writer(args.output, args.format) as writer:
+        succeeded = analyze_batch(stock_codes, start_date, end_date, workers=args.workers, rate=args.rate,
+                                  metrics_sink=metrics_sink, writer=writer, adjust=args.adjust)
+    if args.output != "-":
+        print(f"已写入 {args.output}: {writer.rows}行，成功{succeeded}只", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试复权因子缓存：前复权、后复权由不复权行情和缓存的因子算出，切换复权方式不重新获取行情，
+因子每天最多更新一次，数据源不可用时使用本地已有的因子
+"""
+import asyncio
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import adjust_factors
+import analysis_core
+import index_store
+import price_cache
+from adjust_factors import AdjustFactorCache
+from analysis_async import analyze_async
+from analysis_core import AnalysisError, analyze
+from http_fetch import UpstreamError
+from metrics import MemorySink, make_metrics
+from result_cache import ResultCache
+from test_index_store import FakeIndexFetcher
+from test_price_cache import FakeFetcher
+
+
+class FakeFactorFetcher:
+    """2025-01-15 除权，后复权因子从 1.0 变为 1.25；fail 为真时模拟数据源不可用"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, stock_code):
+        self.calls.append(stock_code)
+        if self.fail:
+            raise UpstreamError("数据源不可用")
+        return pd.DataFrame({"date": ["2025-01-15", "1990-01-01"], "hfq_factor": [1.25, 1.0]})
+
+
+def test_switching_adjust_reuses_cached_prices(tmp_path, monkeypatch):
+    """测试依次按不复权、前复权、后复权分析同一区间时行情只获取一次，复权收盘价为不复权价乘以因子"""
+    fetcher = FakeFetcher()
+    factor_fetcher = FakeFactorFetcher()
+    today = lambda: date(2025, 2, 3)
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), fetcher, today=today))
+    monkeypatch.setattr(index_store, "_default_store",
+                        index_store.IndexStore(str(tmp_path), FakeIndexFetcher(date(2025, 1, 31)), today=today))
+    monkeypatch.setattr(adjust_factors, "_default_factors", AdjustFactorCache(str(tmp_path), factor_fetcher, today=today))
+    monkeypatch.setattr(price_cache, "_default_cache_provider", None)
+    monkeypatch.setattr(index_store, "_default_store_provider", None)
+    monkeypatch.setattr(adjust_factors, "_default_factors_provider", None)
+
+    cache = ResultCache(today=today)
+    raw = analyze("600000", "2025-01-06", "2025-01-24", cache=cache)
+    qfq = analyze("600000", "2025-01-06", "2025-01-24", cache=cache, adjust="qfq")
+    hfq = analyze("600000", "2025-01-06", "2025-01-24", cache=cache, adjust="hfq")
+    assert len(fetcher.calls) == 1 and factor_fetcher.calls == ["600000"]
+    assert (raw.adjust, qfq.adjust, hfq.adjust) == ("", "qfq", "hfq") and "前复权" in qfq.format_report()
+    assert analyze("600000", "2025-01-06", "2025-01-24", cache=cache, adjust="qfq") is qfq
+    async_hfq = asyncio.run(analyze_async("600000", "2025-01-06", "2025-01-24", adjust="hfq"))
+    assert async_hfq.adjust == "hfq" and async_hfq.deviation == hfq.deviation
+
+    # 除权日前的收盘价乘以 1.0 / 1.25，之后不变；前复权与后复权的收益率相同
+    dates, closes = price_cache.get_price_cache().get_arrays("600000", "20250106", "20250124")
+    scale = np.where(dates >= np.datetime64("2025-01-15"), 1.25, 1.0)
+    np.testing.assert_allclose(adjust_factors.get_adjust_factors().adjust("600000", dates, closes, "hfq"), closes * scale)
+    expected = closes[-1] * 1.25 / closes[0] - 1
+    assert qfq.stock_cumulative_return == pytest.approx(expected)
+    assert hfq.stock_cumulative_return == pytest.approx(expected)
+    assert raw.stock_cumulative_return == pytest.approx(closes[-1] / closes[0] - 1)
+    assert qfq.deviation == pytest.approx(expected - raw.index_cumulative_return)
+
+    # 触发价格换算回实际价格：前复权时最后一天的系数为1，后复权时除以 1.25
+    for qfq_item, hfq_item in zip(qfq.trigger_prices, hfq.trigger_prices):
+        assert qfq_item.lower == pytest.approx(hfq_item.lower, nan_ok=True)
+        assert qfq_item.upper == pytest.approx(hfq_item.upper, nan_ok=True)
+    with pytest.raises(AnalysisError, match="复权方式"):
+        analyze("600000", "2025-01-06", "2025-01-24", adjust="raw")
+    assert analysis_core.validate_adjust(None) == ""
+    print("✓ 切换复权方式复用行情缓存测试通过")
+
+
+def test_factors_refresh_daily_and_fall_back(tmp_path):
+    """测试因子文件当天只获取一次，换进程后从磁盘读取；次日重新获取，数据源不可用时使用本地因子"""
+    fetcher = FakeFactorFetcher()
+    day = [date(2025, 2, 3)]
+    factors = AdjustFactorCache(str(tmp_path), fetcher, today=lambda: day[0])
+    dates = np.array(["2025-01-14", "2025-01-15", "2025-02-03"], dtype="datetime64[D]")
+    np.testing.assert_allclose(factors.scale("600000", dates, "hfq"), [1.0, 1.25, 1.25])
+    np.testing.assert_allclose(factors.scale("600000", dates, "qfq"), [0.8, 1.0, 1.0])
+    np.testing.assert_allclose(factors.scale("600000", dates, ""), [1.0, 1.0, 1.0])
+    assert len(fetcher.calls) == 1
+
+    reloaded = AdjustFactorCache(str(tmp_path), fetcher, today=lambda: day[0])
+    reloaded.factors("600000")
+    # 只分析历史区间时，之后更新过的因子就足够
+    day[0] = date(2025, 3, 3)
+    reloaded.factors("600000", until="2025-01-24")
+    assert len(fetcher.calls) == 1
+
+    sink = MemorySink()
+    metrics = make_metrics(sink)
+    metrics.begin()
+    fetcher.fail = True
+    factor_dates, values = reloaded.factors("600000", metrics=metrics)
+    metrics.finish()
+    assert list(values) == [1.0, 1.25] and len(fetcher.calls) == 2
+    assert sink.counters()["adjust_factor_stale"] == 1
+    with pytest.raises(UpstreamError):
+        reloaded.factors("000001")
+    with pytest.raises(ValueError):
+        reloaded.scale("600000", dates, "none")
+    print("✓ 复权因子按日更新与本地回退测试通过")
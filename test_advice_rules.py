@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试建议规则表：内置规则与原先的 if/elif 逐条一致，数组版与单只股票版一致，规则文件可调整阈值
+"""
+import json
+
+import numpy as np
+import pytest
+
+from advice_rules import DEFAULT_RULES, RULES_VERSION, AdviceRules, load_rules
+from analysis_core import generate_advice
+from rolling_scanner import classify
+
+
+def legacy_advice(cumulative_deviation, avg_deviation):
+    """原先 generate_advice 的判断逻辑，只返回分支编号"""
+    combined = (abs(cumulative_deviation) + abs(avg_deviation)) / 2
+    if combined > 0.05:
+        return 0 if cumulative_deviation > 0 else 1
+    elif combined > 0.02:
+        return 2
+    return 3
+
+
+def sample_deviations():
+    rng = np.random.default_rng(7)
+    cumulative = np.concatenate([rng.normal(0, 0.06, 2000), [0.0, -0.0, 0.05, 0.1, -0.1, 0.02, np.nan, 0.07, np.nan]])
+    average = np.concatenate([rng.normal(0, 0.01, 2000), [0.0, 0.0, 0.05, 0.0, 0.0, 0.02, 0.01, np.nan, np.nan]])
+    return cumulative, average
+
+
+def test_default_rules_match_legacy_advice():
+    """测试内置规则对单只股票和全市场数组都与原先的判断完全一致"""
+    rules = AdviceRules(DEFAULT_RULES)
+    cumulative, average = sample_deviations()
+    expected = [legacy_advice(c, a) for c, a in zip(cumulative, average)]
+    assert [rules.rule_id(c, a) for c, a in zip(cumulative, average)] == expected
+    assert list(rules.rule_ids(cumulative, average)) == expected
+    assert [generate_advice(c, a) for c, a in zip(cumulative, average)] == [rules.advice[i] for i in expected]
+
+    texts = rules.advice_texts(cumulative, average)
+    assert texts.shape == (len(cumulative), 3)
+    assert tuple(texts[0]) == generate_advice(cumulative[0], average[0])
+    assert list(classify(cumulative, average)) == [{0: 2, 1: 2, 2: 1, 3: 0}[i] for i in expected]
+    print("✓ 内置规则一致性测试通过")
+
+
+def test_rules_file_changes_thresholds(tmp_path):
+    """测试从规则文件读取调整后的阈值，格式错误时给出说明"""
+    data = AdviceRules(DEFAULT_RULES).to_json()
+    for rule in data["rules"]:
+        if rule["level"] == "high":
+            rule["above"] = 0.08
+    path = tmp_path / "advice_rules.json"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    rules = load_rules(str(path))
+    assert rules.rule_id(0.1, 0.0) == 2
+    assert rules.rule_id(0.2, 0.0) == 0
+    assert list(rules.levels([0.1, 0.2, -0.2], [0.0, 0.0, 0.0])) == [1, 2, 2]
+
+    data["rules"][-1]["above"] = 0.01
+    path.write_text(json.dumps(data), encoding="utf-8")
+    with pytest.raises(ValueError, match="最后一条规则"):
+        load_rules(str(path))
+    path.write_text(json.dumps({"version": RULES_VERSION, "rules": [{"level": "none", "advice": ["只有一条"]}]}),
+                    encoding="utf-8")
+    with pytest.raises(ValueError, match="advice"):
+        load_rules(str(path))
+    print("✓ 规则文件测试通过")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试 asyncio 分析接口：并行获取、请求合并以及与同步接口一致
+"""
+import asyncio
+import threading
+import time
+
+import index_store
+import price_cache
+from analysis_async import AsyncAnalyzer, analyze_async, analyze_many_async
+from analysis_core import AnalysisError, analyze
+from test_deviation_engine import random_walk_fetcher, random_walk_index_fetcher
+
+FETCH_DELAY = 0.3
+
+
+def slow(fetcher):
+    def fetch(*args):
+        time.sleep(FETCH_DELAY)
+        return fetcher(*args)
+    return fetch
+
+
+def test_fetches_overlap(tmp_path, monkeypatch):
+    """测试股票和指数同时获取，耗时接近较慢的一次而不是两者之和，结果与同步接口一致"""
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), slow(random_walk_fetcher)))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), slow(random_walk_index_fetcher)))
+    started = time.perf_counter()
+    result = asyncio.run(analyze_async("600000", "2025-01-02", "2025-02-14"))
+    assert time.perf_counter() - started < FETCH_DELAY * 1.8
+    expected = analyze("600000", "2025-01-02", "2025-02-14")
+    assert result.as_tuple() == expected.as_tuple()
+    print("✓ 并行获取测试通过")
+
+
+def test_identical_requests_are_coalesced():
+    """测试进行中的相同请求只执行一次"""
+    calls = []
+    release = threading.Event()
+
+    def fetch(symbol):
+        calls.append(symbol)
+        release.wait(5)
+        return symbol.upper()
+
+    async def main():
+        analyzer = AsyncAnalyzer(concurrency=2)
+        tasks = [asyncio.ensure_future(analyzer.run(("index", "sh000001"), fetch, "sh000001")) for _ in range(5)]
+        tasks.append(asyncio.ensure_future(analyzer.run(("index", "sz399001"), fetch, "sz399001")))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks), analyzer.coalesced
+
+    results, coalesced = asyncio.run(main())
+    assert results == ["SH000001"] * 5 + ["SZ399001"]
+    assert sorted(calls) == ["sh000001", "sz399001"]
+    assert coalesced == 4
+    print("✓ 请求合并测试通过")
+
+
+def test_analyze_many_reports_failures(tmp_path, monkeypatch):
+    """测试批量异步分析按代码返回结果，失败的股票返回 AnalysisError"""
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), random_walk_fetcher))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), random_walk_index_fetcher))
+    codes = ["000001", "600000", "300750", "60000"]
+    results = asyncio.run(analyze_many_async(codes, "2025-01-02", "2025-02-14", concurrency=3))
+    assert list(results) == codes
+    assert isinstance(results["60000"], AnalysisError)
+    for code in codes[:3]:
+        assert results[code].as_tuple() == analyze(code, "2025-01-02", "2025-02-14").as_tuple()
+    print("✓ 批量异步分析测试通过")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试分析核心：与原 pandas 流程逐位一致、输入校验以及命令行的延迟导入
+"""
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import index_store
+import price_cache
+from analysis_core import AnalysisError, analyze, generate_advice, get_index_for_stock, validate_request
+from test_deviation_engine import random_walk_fetcher, random_walk_index_fetcher
+
+
+def legacy_analyze(stock_code, start_date, end_date):
+    """原先基于 pandas 的计算步骤，作为对照"""
+    stock_hist = random_walk_fetcher(stock_code, start_date, end_date)
+    stock_hist["日期"] = pd.to_datetime(stock_hist["日期"])
+    stock_hist = stock_hist.sort_values("日期", ascending=True)
+    index_data = random_walk_index_fetcher(get_index_for_stock(stock_code)[0])
+    index_data["date"] = pd.to_datetime(index_data["date"])
+    index_filtered = index_data[(index_data["date"] >= start_date) & (index_data["date"] <= end_date)].copy()
+
+    stock_cumulative_return = (stock_hist.iloc[-1]["收盘"] - stock_hist.iloc[0]["收盘"]) / stock_hist.iloc[0]["收盘"]
+    index_cumulative_return = (index_filtered.iloc[-1]["close"] - index_filtered.iloc[0]["close"]) / index_filtered.iloc[0]["close"]
+    stock_hist["收益率"] = stock_hist["收盘"].pct_change()
+    index_filtered["收益率"] = index_filtered["close"].pct_change()
+    merged_data = pd.merge(stock_hist.rename(columns={"日期": "date"})[["date", "收益率"]],
+                           index_filtered[["date", "收益率"]], on="date", suffixes=("_stock", "_index")).dropna()
+    stock_avg_return = merged_data["收益率_stock"].mean()
+    index_avg_return = merged_data["收益率_index"].mean()
+    return stock_cumulative_return, index_cumulative_return, stock_avg_return, index_avg_return
+
+
+def test_matches_legacy_pandas_flow(tmp_path, monkeypatch):
+    """测试numpy实现与原 pandas 流程的结果逐位一致，且缓存命中时结果不变"""
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), random_walk_fetcher))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), random_walk_index_fetcher))
+    start_date, end_date = "2025-01-02", "2025-02-14"
+    for code in ["000001", "600000", "600519", "300750"]:
+        expected = legacy_analyze(code, start_date, end_date)
+        for _ in range(2):
+            result = analyze(code, start_date, end_date)
+            assert (result.stock_cumulative_return, result.index_cumulative_return,
+                    result.stock_avg_return, result.index_avg_return) == expected
+            assert result.advice == generate_advice(result.deviation, result.avg_deviation)
+            assert result.as_tuple()[3:] == result.advice
+
+    steps = []
+    analyze("600000", start_date, end_date, progress=lambda message, fraction: steps.append(fraction))
+    assert steps == [0.2, 0.4, 0.5, 0.6, 0.8]
+    print("✓ 分析核心一致性测试通过")
+
+
+def test_progress_and_validation():
+    """测试进度回调顺序与输入校验"""
+    for arguments in [("", "2025-01-02", "2025-01-10"), ("60000", "2025-01-02", "2025-01-10"),
+                      ("600000", "2025/01/02", "2025-01-10"), ("600000", "2025-01-10", "2025-01-02")]:
+        with pytest.raises(AnalysisError):
+            validate_request(*arguments)
+    assert validate_request(" 600000 ", "2025-01-02", "2025-01-10")[0] == "600000"
+
+    fractions = []
+    with pytest.raises(AnalysisError):
+        analyze("abc", "2025-01-02", "2025-01-10", progress=lambda message, fraction: fractions.append(fraction))
+    assert fractions == []
+    print("✓ 输入校验测试通过")
+
+
+def test_cli_help_does_not_import_heavy_modules():
+    """测试命令行启动、--help 和导入滚动扫描、收盘后状态和盘中监控模块不导入 pandas、numpy、akshare"""
+    code = ("import sys, stock_analyzer_cli, rolling_scanner, eod_state, intraday_monitor\n"
+            "print(','.join(m for m in ('pandas', 'numpy', 'akshare') if m in sys.modules))")
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == ""
+    completed = subprocess.run([sys.executable, "stock_analyzer_cli.py", "--help"], cwd=here, capture_output=True, text=True)
+    assert completed.returncode == 0 and "--batch" in completed.stdout
+    print("✓ 延迟导入测试通过")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试本地分析服务（使用离线的模拟数据源）
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import index_store
+import price_cache
+import providers
+from analysis_core import analyze
+from analysis_service import AnalysisService, SingleFlight, make_server
+from providers import SyntheticProvider
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_cache, "DEFAULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(providers, "_default_provider", SyntheticProvider(start="2024-01-01", end="2024-12-31"))
+    # 默认缓存和指数仓库记录了创建时的数据源，测试结束后一并还原
+    for module, names in ((price_cache, ("_default_cache", "_default_cache_provider")),
+                          (index_store, ("_default_store", "_default_store_provider"))):
+        for name in names:
+            monkeypatch.setattr(module, name, None)
+    server = make_server(port=0, service=AnalysisService(workers=4))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    server.service.close()
+
+
+def request(url, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_endpoints(server):
+    """测试单只、批量分析以及健康检查和指标接口"""
+    status, health = request(f"{server}/health")
+    assert status == 200 and health["provider"] == "synthetic"
+
+    status, result = request(f"{server}/analyze?code=600000&start=2024-03-01&end=2024-03-29")
+    assert status == 200
+    assert result["deviation"] == analyze("600000", "2024-03-01", "2024-03-29").deviation
+
+    status, batch = request(f"{server}/analyze", {"codes": ["600000", "300750", "abc"], "start": "2024-03-01", "end": "2024-03-29"})
+    assert status == 200
+    assert set(batch["results"]) == {"600000", "300750", "abc"}
+    assert "error" in batch["results"]["abc"] and "advice" in batch["results"]["300750"]
+
+    assert request(f"{server}/analyze?code=600000&start=2024-03-02&end=2024-03-03")[0] == 422
+    assert request(f"{server}/analyze?code=600000")[0] == 400
+    # 日期格式错误的 start、end（包括与 trading_days 一起使用的 end）返回400
+    assert request(f"{server}/analyze?code=600000&start=2024-3-x&end=2024-03-29")[0] == 400
+    assert request(f"{server}/analyze?code=600000&start=2024-03-01&end=20240329")[0] == 400
+    assert request(f"{server}/analyze?code=600000&trading_days=10&end=bad")[0] == 400
+    assert request(f"{server}/analyze?code=600000&start=2024-03-29&end=2024-03-01")[0] == 400
+    assert request(f"{server}/analyze", {"codes": ["600000"], "trading_days": 5, "end": "2024/03/29"})[0] == 400
+    assert request(f"{server}/unknown")[0] == 404
+
+    status, metrics = request(f"{server}/metrics")
+    assert status == 200 and metrics["requests"] == 5 and metrics["errors"] == 2
+    assert metrics["stages"]["total"]["count"] == 4
+    print("✓ 分析服务接口测试通过")
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    """测试同时到达的相同请求只计算一次"""
+    flights = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"deviation": 0.01}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do(("600000", "a", "b"), compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and flights.coalesced == 4
+    assert results == [{"deviation": 0.01}] * 5
+    print("✓ 请求合并测试通过")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试图形界面的后台分析线程：取代旧请求、合并相同请求与结果缓存
+"""
+import threading
+
+from analysis_core import AnalysisError
+from analysis_worker import AnalysisWorker
+
+
+class FakeAnalyze:
+    """记录调用参数；blocking 为True时在第一个进度回调处等待 release"""
+
+    def __init__(self, blocking=False):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.blocking = blocking
+
+    def __call__(self, stock_code, start_date, end_date, metrics=None, progress=None, adjust=""):
+        self.calls.append(stock_code if not adjust else f"{stock_code}:{adjust}")
+        self.started.set()
+        if self.blocking:
+            self.release.wait(5)
+        progress("正在计算偏离值...", 0.6)
+        if stock_code == "000000":
+            raise AnalysisError("无法获取股票数据，请检查股票代码和日期范围是否正确")
+        return f"result-{stock_code}"
+
+
+def make_worker(analyze):
+    events = []
+    done = threading.Event()
+
+    def on_result(request_id, result):
+        events.append(("result", request_id, result))
+        done.set()
+
+    def on_error(request_id, message):
+        events.append(("error", request_id, message))
+        done.set()
+
+    worker = AnalysisWorker(on_result=on_result, on_error=on_error, analyze=analyze,
+                            on_progress=lambda request_id, message, fraction: events.append(("progress", request_id, fraction)))
+    return worker, events, done
+
+
+def test_new_request_supersedes_running_one():
+    """测试新请求取代正在进行的请求，旧请求不再回调"""
+    analyze = FakeAnalyze(blocking=True)
+    worker, events, done = make_worker(analyze)
+    first = worker.submit("600000", "2025-01-02", "2025-01-24")
+    assert analyze.started.wait(5)
+    second = worker.submit("000001", "2025-01-02", "2025-01-24")
+    analyze.blocking = False
+    analyze.release.set()
+    assert done.wait(5)
+    worker.stop(timeout=5)
+
+    assert analyze.calls == ["600000", "000001"]
+    assert [event for event in events if event[0] == "result"] == [("result", second, "result-000001")]
+    assert all(event[1] != first for event in events)
+    assert worker.cancelled == 1
+    print("✓ 取代旧请求测试通过")
+
+
+def test_identical_requests_are_merged_and_cached():
+    """测试进行中的相同请求直接并入，完成后重复请求使用缓存"""
+    analyze = FakeAnalyze(blocking=True)
+    worker, events, done = make_worker(analyze)
+    first = worker.submit("600000", "2025-01-02", "2025-01-24")
+    assert analyze.started.wait(5)
+    assert worker.submit(" 600000", "2025-01-02", "2025-01-24") == first
+    analyze.release.set()
+    assert done.wait(5)
+
+    done.clear()
+    again = worker.submit("600000", "2025-01-02", "2025-01-24")
+    assert done.wait(5)
+    # 复权方式不同的请求分别计算和缓存
+    done.clear()
+    worker.submit("600000", "2025-01-02", "2025-01-24", adjust="qfq")
+    assert done.wait(5)
+    worker.stop(timeout=5)
+    assert analyze.calls == ["600000", "600000:qfq"]
+    assert worker.cache_hits == 1
+    assert events[-1][2] == "result-600000" and ("result", again, "result-600000") in events
+    print("✓ 合并与缓存测试通过")
+
+
+def test_errors_are_reported_and_not_cached():
+    """测试分析失败时回调错误消息，失败结果不缓存"""
+    analyze = FakeAnalyze()
+    worker, events, done = make_worker(analyze)
+    for _ in range(2):
+        done.clear()
+        request_id = worker.submit("000000", "2025-01-02", "2025-01-24")
+        assert done.wait(5)
+        assert events[-1] == ("error", request_id, "无法获取股票数据，请检查股票代码和日期范围是否正确")
+    worker.stop(timeout=5)
+    assert analyze.calls == ["000000", "000000"]
+    print("✓ 错误回调测试通过")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试命令行批量模式与限速器（使用离线的模拟数据源）
+"""
+import io
+from datetime import date
+
+import index_store
+import price_cache
+import stock_analyzer_cli
+from rate_limit import RateLimiter
+from test_index_store import FakeIndexFetcher
+from test_price_cache import FakeFetcher
+
+
+def test_read_watchlist():
+    """测试自选股列表解析"""
+    stream = io.StringIO("000001, 600000\n# 注释行\n300750  # 宁德时代\n000001\n")
+    assert stock_analyzer_cli.read_watchlist(stream) == ["000001", "600000", "300750"]
+    print("✓ 自选股列表解析测试通过")
+
+
+def test_rate_limiter_spaces_requests():
+    """测试令牌桶在令牌耗尽后按速率等待"""
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(2, burst=1, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        limiter.acquire()
+    assert sum(waits) == 1.0
+    print("✓ 限速器测试通过")
+
+
+def test_batch_streams_results_and_fetches_each_index_once(tmp_path, monkeypatch):
+    """测试批量分析逐行输出结果，且每个指数只获取一次"""
+    index_fetcher = FakeIndexFetcher(date(2025, 1, 31))
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), FakeFetcher()))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), index_fetcher))
+
+    codes = ["000001", "000002", "600000", "600519", "300750"]
+    output = io.StringIO()
+    succeeded = stock_analyzer_cli.analyze_batch(codes, "2025-01-02", "2025-01-24", workers=4, rate=1000, output=output)
+
+    lines = output.getvalue().splitlines()
+    assert succeeded == len(codes)
+    assert len(lines) == len(codes) + 1
+    assert sorted(line.split("\t")[0] for line in lines[1:]) == sorted(codes)
+    assert sorted(call[0] for call in index_fetcher.calls) == ["sh000001", "sz399001", "sz399006"]
+    print("✓ 批量分析测试通过")
+
+
+def test_overlapping_batches_leave_fetchers_alone(tmp_path, monkeypatch):
+    """测试同时进行的两个批次不替换共享缓存的数据源函数，一个批次结束不影响另一个"""
+    fetcher = FakeFetcher()
+    index_fetcher = FakeIndexFetcher(date(2025, 1, 31))
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), fetcher))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), index_fetcher))
+    monkeypatch.setattr(price_cache, "_default_cache_provider", None)
+    monkeypatch.setattr(index_store, "_default_store_provider", None)
+
+    first = stock_analyzer_cli.iter_batch(["000001", "600000", "300750"], "2025-01-02", "2025-01-24", workers=1, rate=1000)
+    assert next(first)[1] is not None
+    second = list(stock_analyzer_cli.iter_batch(["000002", "600519"], "2025-01-02", "2025-01-24", workers=2, rate=1000))
+    assert all(result is not None for _, result, _ in second)
+    assert price_cache.get_price_cache().fetcher is fetcher and index_store.get_index_store().fetcher is index_fetcher
+    assert all(result is not None for _, result, _ in first)
+    print("✓ 重叠批次测试通过")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试基准指数对照表和多基准偏离值：科创板、北交所的映射，多基准结果与逐个基准计算一致
+"""
+import json
+
+import numpy as np
+import pytest
+
+import index_store
+import price_cache
+import stock_analyzer_cli
+from benchmark_table import DEFAULT_TABLE, BenchmarkTable, analyze_benchmarks, load_table, multi_benchmark_layout
+from deviation_engine import cross_sectional_deviation, multi_benchmark_deviation
+from test_deviation_engine import random_walk_fetcher, random_walk_index_fetcher
+
+
+def test_board_mapping_and_table_file(tmp_path):
+    """测试内置对照表的板块映射，以及从对照表文件读取"""
+    table = BenchmarkTable(DEFAULT_TABLE)
+    assert table.board("688981") == ("sh000688", "科创50")
+    assert table.board("600519") == ("sh000001", "上证指数")
+    assert table.board("300750") == ("sz399006", "创业板指")
+    assert table.board("002594") == ("sz399001", "深证成指")
+    for code in ("830799", "430047", "920118"):
+        assert table.board(code) == ("bj899050", "北证50")
+    assert table.benchmarks("688981") == [
+        ("board", "sh000688", "科创50"), ("composite", "sh000001", "上证指数"), ("common", "sh000300", "沪深300"),
+    ]
+    # 北交所的板块指数和综合指数相同，只出现一次
+    assert [symbol for _, symbol, _ in table.benchmarks("830799")] == ["bj899050", "sh000300"]
+
+    data = json.loads(json.dumps(DEFAULT_TABLE))
+    data["boards"][0]["board"] = {"symbol": "sh000680", "name": "科创综指"}
+    path = tmp_path / "benchmarks.json"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    assert load_table(str(path)).board("688981") == ("sh000680", "科创综指")
+    data["boards"][0]["prefixes"] = []
+    path.write_text(json.dumps(data), encoding="utf-8")
+    with pytest.raises(ValueError, match="prefixes"):
+        load_table(str(path))
+    print("✓ 对照表测试通过")
+
+
+def test_multi_benchmark_matches_single(tmp_path, monkeypatch):
+    """测试多基准结果与逐个基准单独计算逐位一致，板块指数一行与 analyze_stock 一致"""
+    rng = np.random.default_rng(3)
+    prices = 10 * np.cumprod(1 + rng.normal(0, 0.02, (40, 300)), axis=0)
+    prices[rng.random(prices.shape) < 0.1] = np.nan
+    index_prices = 3000 * np.cumprod(1 + rng.normal(0, 0.01, (40, 5)), axis=0)
+    index_prices[rng.random(index_prices.shape) < 0.05] = np.nan
+    columns = rng.integers(0, 5, (3, 300))
+    result = multi_benchmark_deviation(prices, index_prices, columns)
+    for role in range(3):
+        single = cross_sectional_deviation(prices, index_prices, columns[role])
+        for name, values in single.items():
+            assert np.array_equal(result[name][role], values, equal_nan=True)
+
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), random_walk_fetcher))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), random_walk_index_fetcher))
+    start_date, end_date = "2025-01-02", "2025-02-14"
+    codes = ["688981", "600519", "300750", "002594", "830799"]
+    frame = analyze_benchmarks(codes, start_date, end_date)
+    table = BenchmarkTable(DEFAULT_TABLE)
+    expected_rows = [(code, role, symbol) for code in codes for role, symbol, _ in table.benchmarks(code)]
+    assert list(zip(frame["code"], frame["role"], frame["benchmark"])) == expected_rows
+    assert set(frame["benchmark"]) == {"sh000688", "sh000001", "sz399006", "sz399106", "sz399001", "bj899050",
+                                       "sh000300"}
+    assert frame["valid"].all()
+    board = frame[frame["role"] == "board"].set_index("code")
+    for code in codes:
+        stock_cumulative_return, index_cumulative_return, deviation, *_ = stock_analyzer_cli.analyze_stock(
+            code, start_date, end_date, log=lambda message: None)
+        assert board.loc[code, "benchmark"] == stock_analyzer_cli.get_index_for_stock(code)[0]
+        assert board.loc[code, "stock_cumulative_return"] == stock_cumulative_return
+        assert board.loc[code, "index_cumulative_return"] == index_cumulative_return
+        assert board.loc[code, "deviation"] == deviation
+    print("✓ 多基准一致性测试通过")
+
+
+def test_layout_keeps_every_common_benchmark(tmp_path, monkeypatch):
+    """测试对照表有多个共同基准时每个都参与计算，各股票的基准与 BenchmarkTable.benchmarks 一致"""
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), random_walk_fetcher))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), random_walk_index_fetcher))
+    data = json.loads(json.dumps(DEFAULT_TABLE))
+    data["common"].append({"symbol": "sh000905", "name": "中证500"})
+    table = BenchmarkTable(data)
+    # 科创板有4个基准，北交所的板块指数和综合指数相同只有3个
+    codes = ["688981", "830799"]
+
+    symbols, _, benchmark_columns, benchmark_roles = multi_benchmark_layout(codes, table=table)
+    assert benchmark_columns.shape == (4, 2)
+    for position, code in enumerate(codes):
+        items = table.benchmarks(code)
+        assert [symbols[column] for column in benchmark_columns[:len(items), position]] == [item[1] for item in items]
+        assert list(benchmark_roles[:len(items), position]) == [item[0] for item in items]
+        assert all(role is None for role in benchmark_roles[len(items):, position])
+
+    frame = analyze_benchmarks(codes, "2025-01-02", "2025-02-14", table=table)
+    assert list(zip(frame["code"], frame["benchmark"])) == [
+        ("688981", "sh000688"), ("688981", "sh000001"), ("688981", "sh000300"), ("688981", "sh000905"),
+        ("830799", "bj899050"), ("830799", "sh000300"), ("830799", "sh000905"),
+    ]
+    assert frame["valid"].all()
+    common = frame[frame["role"] == "common"]
+    assert common["index_cumulative_return"].nunique() == 2
+    print("✓ 多个共同基准测试通过")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试横截面偏离值引擎与逐只分析结果一致（使用离线的模拟数据源）
+"""
+import time
+import zlib
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import index_store
+import price_cache
+import stock_analyzer_cli
+from analysis_core import compute_result
+from deviation_engine import build_price_matrix, cross_sectional_deviation
+from metrics import NULL_METRICS
+from price_cache import to_date
+
+INDEX_COLUMNS = {"sh000001": 0, "sz399001": 1, "sz399006": 2, "bj899050": 3}
+
+
+def random_walk_fetcher(stock_code, start_date, end_date):
+    """按代码生成确定性的随机游走行情，部分交易日停牌"""
+    days = pd.bdate_range("2024-12-02", "2025-02-28")
+    rng = np.random.default_rng(zlib.crc32(stock_code.encode()))
+    closes = 10 * np.cumprod(1 + rng.normal(0, 0.03, len(days)))
+    keep = rng.random(len(days)) > 0.15
+    frame = pd.DataFrame({"日期": [d.date() for d in days], "股票代码": stock_code, "收盘": closes})[keep]
+    in_range = (frame["日期"] >= to_date(start_date)) & (frame["日期"] <= to_date(end_date))
+    return frame[in_range]
+
+
+def random_walk_index_fetcher(index_symbol, start_date=None, end_date=None):
+    days = pd.bdate_range("2024-12-02", "2025-02-28")
+    rng = np.random.default_rng(zlib.crc32(index_symbol.encode()))
+    closes = 3000 * np.cumprod(1 + rng.normal(0, 0.01, len(days)))
+    return pd.DataFrame({
+        "date": days.strftime("%Y-%m-%d"), "open": closes, "close": closes,
+        "high": closes, "low": closes, "volume": 1.0, "amount": 1.0,
+    })
+
+
+def test_matches_analyze_stock(tmp_path, monkeypatch):
+    """测试与 analyze_stock 的计算结果一致，包括停牌日"""
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), random_walk_fetcher))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), random_walk_index_fetcher))
+    start_date, end_date = "2025-01-02", "2025-02-14"
+    codes = ["000001", "000651", "600000", "600519", "300750", "301001", "830799"]
+
+    expected = {code: stock_analyzer_cli.analyze_stock(code, start_date, end_date, log=lambda message: None) for code in codes}
+    full = {code: stock_analyzer_cli.analyze_result(code, start_date, end_date, log=lambda message: None) for code in codes}
+
+    store = index_store.get_index_store()
+    index_frames = {symbol: store.get_range(symbol, start_date, end_date) for symbol in INDEX_COLUMNS}
+    dates = index_frames["sh000001"]["date"]
+    index_prices = np.column_stack([index_frames[symbol]["close"].to_numpy() for symbol in INDEX_COLUMNS])
+    stock_frames = {code: random_walk_fetcher(code, start_date, end_date) for code in codes}
+    prices, matrix_codes = build_price_matrix(stock_frames, dates)
+    benchmarks = [INDEX_COLUMNS[stock_analyzer_cli.get_index_for_stock(code)[0]] for code in matrix_codes]
+
+    result = cross_sectional_deviation(prices, index_prices, benchmarks)
+    assert result["valid"].all()
+    for column, code in enumerate(matrix_codes):
+        stock_cumulative_return, index_cumulative_return, deviation, advice_1d, advice_2d, advice_3d = expected[code]
+        assert result["stock_cumulative_return"][column] == stock_cumulative_return
+        assert result["index_cumulative_return"][column] == index_cumulative_return
+        assert result["deviation"][column] == deviation
+        assert result["stock_avg_return"][column] == full[code].stock_avg_return
+        assert result["index_avg_return"][column] == full[code].index_avg_return
+        assert result["avg_deviation"][column] == full[code].avg_deviation
+        advice = stock_analyzer_cli.generate_advice(result["deviation"][column], result["avg_deviation"][column])
+        assert advice == (advice_1d, advice_2d, advice_3d)
+    print("✓ 横截面引擎一致性测试通过")
+
+
+def test_avg_return_matches_merge():
+    """测试平均收益率与按日期 merge 后 dropna 的口径一致"""
+    prices = np.array([[10.0], [np.nan], [11.0], [12.1], [np.nan]])
+    index_prices = np.array([100.0, 101.0, 102.0, 101.0, 103.0])
+    result = cross_sectional_deviation(prices, index_prices, [0])
+    # 股票收益率在第3、4行：0.1, 0.1；对应大盘收益率 102/101-1, 101/102-1
+    assert np.isclose(result["stock_avg_return"][0], 0.1)
+    assert np.isclose(result["index_avg_return"][0], ((102 / 101 - 1) + (101 / 102 - 1)) / 2)
+    assert np.isclose(result["stock_cumulative_return"][0], 0.21)
+    assert np.isclose(result["index_cumulative_return"][0], 0.03)
+    print("✓ 平均收益率口径测试通过")
+
+
+def test_full_size_matches_compute_result():
+    """测试数百个交易日 × 300只股票时每一列都与逐只计算的 compute_result 逐位一致"""
+    rng = np.random.default_rng(1)
+    days = pd.bdate_range("2024-01-02", periods=250).to_numpy().astype("datetime64[D]")
+    prices = 10 * np.cumprod(1 + rng.normal(0, 0.02, (250, 300)), axis=0)
+    prices[rng.random(prices.shape) < 0.1] = np.nan
+    index_prices = 3000 * np.cumprod(1 + rng.normal(0, 0.01, (250, 3)), axis=0)
+    codes = [("600000", "000001", "300750")[column % 3] for column in range(300)]
+    benchmarks = [INDEX_COLUMNS[stock_analyzer_cli.get_index_for_stock(code)[0]] for code in codes]
+
+    result = cross_sectional_deviation(prices, index_prices, benchmarks)
+    for column, code in enumerate(codes):
+        valid = ~np.isnan(prices[:, column])
+        expected = compute_result(code, "2024-01-02", "2024-12-13", (days[valid], prices[valid, column]),
+                                  (days, index_prices[:, benchmarks[column]]), NULL_METRICS)
+        assert result["stock_avg_return"][column] == expected.stock_avg_return
+        assert result["index_avg_return"][column] == expected.index_avg_return
+        assert result["avg_deviation"][column] == expected.avg_deviation
+        assert result["deviation"][column] == expected.deviation
+    print("✓ 全尺寸逐位一致测试通过")
+
+
+def test_full_market_is_fast():
+    """测试5000只股票的计算耗时"""
+    rng = np.random.default_rng(0)
+    prices = 10 * np.cumprod(1 + rng.normal(0, 0.02, (30, 5000)), axis=0)
+    prices[rng.random(prices.shape) < 0.05] = np.nan
+    index_prices = 3000 * np.cumprod(1 + rng.normal(0, 0.01, (30, 3)), axis=0)
+    benchmarks = rng.integers(0, 3, 5000)
+    started = time.perf_counter()
+    result = cross_sectional_deviation(prices, index_prices, benchmarks)
+    elapsed = time.perf_counter() - started
+    assert result["deviation"].shape == (5000,)
+    assert elapsed < 1.0
+    print(f"✓ 全市场计算耗时 {elapsed * 1000:.1f} ms")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试收盘后增量状态的更新、持久化与重建（使用离线的模拟数据源）
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from eod_state import STATE_VERSION, EodStateStore, SeriesState
+from index_store import IndexStore
+from price_cache import PriceCache
+from rolling_scanner import rolling_deviation
+from test_deviation_engine import random_walk_fetcher, random_walk_index_fetcher
+
+CODES = ["000001", "600000", "300750"]
+
+
+def make_store(tmp_path):
+    price_cache = PriceCache(str(tmp_path), random_walk_fetcher)
+    index_store = IndexStore(str(tmp_path), random_walk_index_fetcher)
+    return EodStateStore(str(tmp_path / "state.json"), windows=(3, 5), price_cache=price_cache, index_store=index_store)
+
+
+def expected_deviation(code, index_symbol, end_date, window):
+    """用滚动扫描器在完整历史上计算同一窗口作为对照"""
+    index_history = random_walk_index_fetcher(index_symbol)
+    days = index_history["date"][index_history["date"] <= end_date]
+    stock = random_walk_fetcher(code, "20241202", "20250228")
+    closes = dict(zip(pd.to_datetime(stock["日期"]).dt.strftime("%Y-%m-%d"), stock["收盘"]))
+    prices = np.array([closes.get(day, np.nan) for day in days])
+    index_prices = index_history["close"].to_numpy()[:len(days)]
+    result = rolling_deviation(prices, index_prices, [0], window)
+    return result["deviation"][-1, 0], result["avg_deviation"][-1, 0]
+
+
+def test_apply_day_matches_full_recompute(tmp_path):
+    """测试逐日增量更新与全量重算一致"""
+    store = make_store(tmp_path)
+    store.ensure(CODES, "2025-02-13")
+    store.save()
+
+    store = make_store(tmp_path)
+    assert store.load()
+    stock_closes = {}
+    for code in CODES:
+        frame = random_walk_fetcher(code, "20250214", "20250214")
+        if not frame.empty:
+            stock_closes[code] = float(frame["收盘"].iloc[0])
+    index_closes = {
+        symbol: float(random_walk_index_fetcher(symbol).set_index("date").loc["2025-02-14", "close"])
+        for symbol in ("sh000001", "sz399001", "sz399006")
+    }
+    results = store.apply_day("2025-02-14", stock_closes, index_closes)
+    assert store.rebuilt == 0
+
+    benchmarks = {"000001": "sz399001", "600000": "sh000001", "300750": "sz399006"}
+    for code in CODES:
+        for window in (3, 5):
+            deviation, avg_deviation = expected_deviation(code, benchmarks[code], "2025-02-14", window)
+            assert np.isclose(results[code][window]["deviation"], deviation)
+            assert np.isclose(results[code][window]["avg_deviation"], avg_deviation)
+    print("✓ 增量更新测试通过")
+
+
+def test_wrong_version_or_corrupt_state_is_rebuilt(tmp_path):
+    """测试版本不符或文件损坏时丢弃旧状态"""
+    store = make_store(tmp_path)
+    store.ensure(CODES, "2025-02-13")
+    store.save()
+
+    with open(store.path, encoding="utf-8") as f:
+        data = json.load(f)
+    data["version"] = STATE_VERSION + 1
+    with open(store.path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    store = make_store(tmp_path)
+    assert not store.load()
+    assert store.stocks == {}
+
+    with open(store.path, "w", encoding="utf-8") as f:
+        f.write("{broken")
+    assert not store.load()
+    store.ensure(CODES, "2025-02-13")
+    assert store.rebuilt == len(CODES)
+    print("✓ 状态重建测试通过")
+
+
+def test_stale_stock_is_rebuilt(tmp_path):
+    """测试错过交易日的股票在应用新数据前被重建"""
+    store = make_store(tmp_path)
+    store.ensure(CODES, "2025-02-13")
+    store.rebuild_stock("600000", "2025-02-12")
+    store.rebuilt = 0
+    index_closes = {"sh000001": 3000.0, "sz399001": 3000.0, "sz399006": 3000.0}
+    store.apply_day("2025-02-14", {}, index_closes)
+    assert store.rebuilt == 1
+    assert all(state.last_date == "2025-02-14" for state in store.stocks.values())
+
+    # 重复应用同一交易日不会改变状态
+    closes = list(store.stocks["000001"].closes)
+    store.apply_day("2025-02-14", {"000001": 1.0}, index_closes)
+    assert store.stocks["000001"].closes == closes
+    print("✓ 过期状态测试通过")
+
+
+def test_stale_stock_uses_supplied_close(tmp_path, monkeypatch):
+    """测试过期股票只从缓存重建到上一交易日，当天使用传入的收盘价"""
+    store = make_store(tmp_path)
+    store.ensure(CODES, "2025-02-13")
+    store.rebuild_stock("600000", "2025-02-11")
+    requested = []
+    get = store.price_cache.get
+
+    def recording_get(stock_code, start_date, end_date, *args, **kwargs):
+        requested.append(end_date)
+        return get(stock_code, start_date, end_date, *args, **kwargs)
+
+    monkeypatch.setattr(store.price_cache, "get", recording_get)
+
+    index_closes = {"sh000001": 3000.0, "sz399001": 3000.0, "sz399006": 3000.0}
+    results = store.apply_day("2025-02-14", {"600000": 12.34}, index_closes)
+    assert requested == ["2025-02-13"]
+    state = store.stocks["600000"]
+    assert state.last_date == "2025-02-14" and state.closes[-1] == 12.34
+    assert set(results) == set(CODES)
+    print("✓ 过期股票使用传入收盘价测试通过")
+
+
+def test_stock_is_skipped_when_benchmark_does_not_advance(tmp_path):
+    """测试基准指数当天没有收盘价时，对应股票的状态不推进"""
+    store = make_store(tmp_path)
+    store.ensure(CODES, "2025-02-13")
+    before = store.stocks["300750"].to_dict()
+    results = store.apply_day("2025-02-14", {"300750": 1.0, "600000": 10.0},
+                              {"sh000001": 3000.0, "sz399001": 3000.0})
+    assert store.skipped == ["300750"] and "300750" not in results
+    assert store.stocks["300750"].to_dict() == before
+    assert store.stocks["600000"].last_date == "2025-02-14"
+    print("✓ 基准指数未推进测试通过")
+
+
+def test_non_finite_close_is_skipped():
+    """测试NaN、inf收盘价视为停牌，状态为空时不记录，之后的收益率仍为有限值"""
+    state = SeriesState((3,))
+    state.apply("2025-01-02", float("nan"))
+    assert state.closes == [] and state.last_date == "2025-01-02"
+    for trade_date, close in [("2025-01-03", 10.0), ("2025-01-06", 11.0), ("2025-01-07", float("inf")),
+                              ("2025-01-08", 12.1)]:
+        state.apply(trade_date, close)
+    assert state.closes == [10.0, 11.0, 11.0, 12.1]
+    assert np.isfinite(state.returns).all()
+    cumulative_return, avg_return = state.window_returns(3)
+    assert np.isclose(cumulative_return, 0.21)
+    assert np.isclose(avg_return, (0.1 + 0.0 + 0.1) / 3)
+    print("✓ 非有限收盘价测试通过")
@@ -2,12 +2,22 @@
 # -*- coding: utf-8 -*-
 """
 测试A股股票异动监管建议工具的功能
+
+pytest 运行时默认数据源固定为离线的模拟数据源；直接运行本脚本时使用默认数据源，
+设置环境变量 STOCK_TOOLS_PROVIDER=synthetic 可离线运行
 """
-import akshare as ak
+import providers
+from providers import SyntheticProvider, get_default_provider
 import pandas as pd
 import numpy as np
+import pytest
 from datetime import datetime, timedelta
 
+@pytest.fixture(autouse=True)
+def synthetic_provider(monkeypatch):
+    """固定使用模拟数据源，测试不依赖网络"""
+    monkeypatch.setattr(providers, "_default_provider", SyntheticProvider(start="2024-01-01"))
+
 def test_date_format_conversion():
     """测试日期格式转换功能"""
     print("测试日期格式转换...")
@@ -39,7 +49,7 @@ def test_stock_data_fetch():
     print(f"获取股票 {stock_code} 从 {start_date_formatted} 到 {end_date_formatted} 的数据...")
     
     try:
-        stock_hist = ak.stock_zh_a_hist(symbol=stock_code, period='daily', adjust='', start_date=start_date_formatted, end_date=end_date_formatted)
+        stock_hist = get_default_provider().stock_hist(stock_code, start_date_formatted, end_date_formatted)
         
         if not stock_hist.empty:
             print(f"✓ 成功获取股票数据，共{len(stock_hist)}条记录")
@@ -72,7 +82,7 @@ def test_index_data_fetch():
         index_name = '上证指数'
     
     try:
-        index_data = ak.stock_zh_index_daily_em(symbol=index_symbol)
+        index_data = get_default_provider().index_daily(index_symbol)
         
         if not index_data.empty:
             print(f"✓ 成功获取{index_name}数据，共{len(index_data)}条记录")
@@ -97,7 +107,7 @@ def test_calculate_returns():
     end_date_formatted = end_date.replace('-', '')
     
     # 获取股票历史数据
-    stock_hist = ak.stock_zh_a_hist(symbol=stock_code, period='daily', adjust='', start_date=start_date_formatted, end_date=end_date_formatted)
+    stock_hist = get_default_provider().stock_hist(stock_code, start_date_formatted, end_date_formatted)
     
     if stock_hist.empty:
         print("✗ 无法获取股票数据进行收益率计算测试")
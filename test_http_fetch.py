@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试行情HTTP访问层（使用本地的模拟东方财富接口）：连接复用、重试、按主机限流、熔断，
+以及上游不可用时行情缓存改用本地数据、批量分析不受偶发错误影响
+"""
+import json
+import threading
+import time
+import zlib
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import index_store
+import price_cache
+import providers
+import stock_analyzer_cli
+from adjust_factors import AdjustFactorCache
+from eod_state import fetch_spot_closes
+from http_fetch import CircuitOpenError, HttpClient, UpstreamError
+from intraday_monitor import fetch_spot_prices
+from metrics import MemorySink, make_metrics
+from result_cache import ResultCache, is_stale, result_key
+
+
+SPOT_CODES = [f"{prefix}{number:03d}" for prefix in ("000", "600", "300") for number in range(1, 9)]
+
+
+class StubKlineServer:
+    """
+    按 secid 生成确定性日线的模拟接口，路径以 hfq.js 结尾时返回新浪格式的复权因子文件，
+    clist/get 分页返回 SPOT_CODES 的实时行情，ulist.np/get 返回 secids 中各代码的实时行情
+    fail 为 (请求序号) -> HTTP 状态码、"truncate"（响应体被截断）或None 的函数，用来模拟上游错误；
+    until 为已有数据的最后一天
+    """
+
+    def __init__(self, fail=None, delay=0.0, until="20250228"):
+        self.fail = fail or (lambda number: None)
+        self.delay = delay
+        self.until = until
+        self.requests = []
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                query = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+                with stub._lock:
+                    number = len(stub.requests)
+                    stub.requests.append(query)
+                    stub.connections.add(self.client_address)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay)
+                    status = stub.fail(number)
+                    if status is not None:
+                        body = b"{}"
+                    elif self.path.endswith("hfq.js"):
+                        body = stub.hfq_text().encode()
+                    elif urlsplit(self.path).path.endswith(("clist/get", "ulist.np/get")):
+                        body = json.dumps({"data": stub.spot(urlsplit(self.path).path, query)}).encode()
+                    else:
+                        body = json.dumps({"data": {"klines": stub.klines(query)}}).encode()
+                    self.send_response(200 if status in (None, "truncate") else status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body) + (100 if status == "truncate" else 0)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    if status == "truncate":
+                        self.close_connection = True
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/qt/stock/kline/get"
+        self.hfq_url = f"http://127.0.0.1:{self.server.server_address[1]}/realstock/company/{{symbol}}/hfq.js"
+        self.spot_url = f"http://127.0.0.1:{self.server.server_address[1]}/api/qt/clist/get"
+        self.quote_url = f"http://127.0.0.1:{self.server.server_address[1]}/api/qt/ulist.np/get"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def klines(self, query):
+        days = pd.bdate_range("2025-01-02", "2025-02-28")
+        days = days[(days >= pd.Timestamp(query["beg"])) & (days <= pd.Timestamp(min(query["end"], self.until)))]
+        rng = np.random.default_rng(zlib.crc32(query["secid"].encode()))
+        closes = 10 * np.cumprod(1 + rng.normal(0, 0.02, len(days)))
+        return [f"{day:%Y-%m-%d},{close:.2f},{close:.2f},{close:.2f},{close:.2f},1000,10000.0,1.0,0.5,0.05,0.3"
+                for day, close in zip(days, closes)]
+
+    def hfq_text(self):
+        data = [{"d": "2025-01-15", "f": "1.2500"}, {"d": "1990-01-01", "f": "1.0000"}]
+        return f"var hfq = {json.dumps({'total': len(data), 'data': data})};\n/* 注释 */"
+
+    def spot(self, path, query):
+        """停牌股票的最新价为 "-"，与东方财富接口相同"""
+        if path.endswith("ulist.np/get"):
+            secids = [secid.split(".") for secid in query["secids"].split(",")]
+            items = [{"f12": code, "f13": int(market), "f2": 3000.5} for market, code in secids]
+            return {"total": len(items), "diff": items}
+        size, page = int(query["pz"]), int(query["pn"])
+        items = [{"f12": code, "f2": "-" if code == "000002" else 10.0 + number}
+                 for number, code in enumerate(SPOT_CODES)]
+        return {"total": len(items), "diff": items[(page - 1) * size:page * size]}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(StubKlineServer(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def fast_client(**kwargs):
+    return HttpClient(backoff=0.001, max_backoff=0.002, timeout=5, **kwargs)
+
+
+def test_provider_retries_and_reuses_connections(stub):
+    """测试前两次请求返回5xx时重试成功，连续请求复用同一个连接，返回列与akshare一致"""
+    server = stub(fail=lambda number: 503 if number < 2 else None)
+    client = fast_client()
+    provider = providers.AkshareProvider(kline_url=server.url, client=client)
+    frame = provider.stock_hist("600000", "20250106", "20250117")
+    assert list(frame.columns) == providers.STOCK_COLUMNS
+    assert len(frame) == 10 and (frame["股票代码"] == "600000").all()
+    assert server.requests[-1]["secid"] == "1.600000" and server.requests[-1]["fqt"] == "0"
+    assert client.retried == 2
+
+    for code in ("000001", "300750", "830799"):
+        provider.stock_hist(code, "20250106", "20250117")
+    index = provider.index_daily("sz399006", "20250106", "20250117")
+    assert list(index.columns) == providers.INDEX_COLUMNS and len(index) == 10
+    assert server.requests[-1]["secid"] == "0.399006"
+    assert providers.index_secid("csi930050") == "2.930050" and providers.index_secid("bj899050") == "0.899050"
+    assert len(server.connections) == 1
+    print("✓ 重试与连接复用测试通过")
+
+
+def test_per_host_cap_and_circuit_breaker(stub):
+    """测试同一主机的并发请求数不超过上限；连续失败后熔断，超时后试探恢复"""
+    server = stub(delay=0.02)
+    client = fast_client(max_per_host=3)
+    threads = [threading.Thread(target=client.get_json, args=(server.url, {"secid": "0.000001", "beg": "20250102",
+                                                                             "end": "20250110"}))
+               for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(server.requests) == 12 and server.max_in_flight <= 3
+
+    now = [0.0]
+    failing = [True]
+    server = stub(fail=lambda number: 500 if failing[0] else None)
+    client = fast_client(retries=2, failure_threshold=4, reset_timeout=30, clock=lambda: now[0])
+    params = {"secid": "1.600000", "beg": "20250102", "end": "20250110"}
+    with pytest.raises(UpstreamError):
+        client.get_json(server.url, params)
+    with pytest.raises(CircuitOpenError):
+        client.get_json(server.url, params)
+    assert len(server.requests) == 4 and client.breaker(server.url).state == "open"
+
+    # 熔断期间不发请求；超时后放行一个试探请求，成功则恢复
+    now[0] = 29
+    with pytest.raises(CircuitOpenError):
+        client.get_json(server.url, params)
+    failing[0] = False
+    now[0] = 31
+    assert client.get_json(server.url, params)["data"]["klines"]
+    assert client.breaker(server.url).state == "closed" and len(server.requests) == 5
+    print("✓ 按主机限流与熔断测试通过")
+
+
+def test_rate_limit_is_shared_per_host(stub):
+    """测试设置速率后同一主机的请求共用一个令牌桶，速率可随时调整或取消"""
+    server = stub()
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    client = HttpClient(clock=lambda: now[0], sleep=sleep)
+    provider = providers.AkshareProvider(kline_url=server.url, client=client)
+    provider.set_rate(2)
+    for code in ("600000", "000001", "300750", "600519"):
+        provider.stock_hist(code, "20250106", "20250110")
+    provider.index_daily("sh000001", "20250106", "20250110")
+    assert sum(waits) == pytest.approx(1.5)
+
+    provider.set_rate(None)
+    waits.clear()
+    for code in ("600000", "000001", "300750"):
+        provider.stock_hist(code, "20250106", "20250110")
+    assert waits == []
+    print("✓ 按主机限速测试通过")
+
+
+def test_batch_rate_limit_is_scoped(tmp_path, stub, monkeypatch):
+    """测试批次的速率只在批次进行期间生效，重叠的批次取较小的速率，结束后恢复原来的设置"""
+    server = stub()
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    client = HttpClient(clock=lambda: now[0], sleep=sleep)
+    with client.limit_rate(4):
+        with client.limit_rate(2):
+            assert client.effective_rate == 2
+        assert client.effective_rate == 4
+        client.set_rate(1)
+        assert client.effective_rate == 1
+        client.set_rate(None)
+    assert client.effective_rate is None
+
+    provider = providers.AkshareProvider(kline_url=server.url, client=client)
+    monkeypatch.setattr(price_cache, "DEFAULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(providers, "_default_provider", provider)
+    for module, names in ((price_cache, ("_default_cache", "_default_cache_provider")),
+                          (index_store, ("_default_store", "_default_store_provider"))):
+        for name in names:
+            monkeypatch.setattr(module, name, None)
+    results = list(stock_analyzer_cli.iter_batch(["600000", "000001", "300750"], "2025-01-06", "2025-01-24",
+                                                 workers=1, rate=2))
+    assert all(result is not None for _, result, _ in results)
+    assert sum(waits) > 0 and client.effective_rate is None
+
+    # 批次结束后（如图形界面之后的单只分析）不再限速
+    waits.clear()
+    for code in ("600519", "000002", "300751"):
+        provider.stock_hist(code, "20250106", "20250110")
+    assert waits == []
+    print("✓ 批次限速范围测试通过")
+
+
+def test_half_open_probe_with_broken_response(stub):
+    """测试试探请求遇到响应体截断等其他请求错误时抛出 UpstreamError 并重新熔断，之后仍能试探恢复"""
+    now = [0.0]
+    mode = ["fail"]
+    server = stub(fail=lambda number: {"fail": 500, "truncate": "truncate", "ok": None}[mode[0]])
+    client = fast_client(retries=0, failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+    params = {"secid": "1.600000", "beg": "20250102", "end": "20250110"}
+    with pytest.raises(UpstreamError):
+        client.get_json(server.url, params)
+    assert client.breaker(server.url).state == "open"
+
+    now[0] = 31
+    mode[0] = "truncate"
+    with pytest.raises(UpstreamError) as excinfo:
+        client.get_json(server.url, params)
+    assert not isinstance(excinfo.value, CircuitOpenError)
+    assert client.breaker(server.url).state == "open"
+
+    now[0] = 62
+    mode[0] = "ok"
+    assert client.get_json(server.url, params)["data"]["klines"]
+    assert client.breaker(server.url).state == "closed"
+    print("✓ 试探请求异常后的熔断恢复测试通过")
+
+
+def test_hfq_factor_uses_pooled_client(tmp_path, stub):
+    """测试复权因子经过同一个HTTP客户端获取，上游不可用时复权因子缓存使用本地因子"""
+    down = [False]
+    server = stub(fail=lambda number: 503 if down[0] else None)
+    client = fast_client(retries=1)
+    provider = providers.AkshareProvider(kline_url=server.url, client=client, hfq_url=server.hfq_url)
+    frame = provider.hfq_factor("600000")
+    assert list(frame.columns) == ["date", "hfq_factor"] and list(frame["hfq_factor"]) == [1.25, 1.0]
+    assert server.requests and len(server.connections) == 1
+
+    day = [date(2025, 2, 3)]
+    factors = AdjustFactorCache(str(tmp_path), provider.hfq_factor, today=lambda: day[0])
+    factors.factors("600000")
+    day[0] = date(2025, 2, 4)
+    down[0] = True
+    sink = MemorySink()
+    metrics = make_metrics(sink)
+    metrics.begin()
+    _, values = factors.factors("600000", metrics=metrics)
+    metrics.finish()
+    assert sorted(values) == [1.0, 1.25] and sink.counters()["adjust_factor_stale"] == 1
+    assert client.retried > 0
+    print("✓ 复权因子经过HTTP访问层测试通过")
+
+
+def test_spot_quotes_use_pooled_client(stub, monkeypatch):
+    """测试全市场实时行情分页获取并经过HTTP客户端重试，停牌股票不计入收盘价；指数行情按 secid 查询"""
+    monkeypatch.setattr(providers, "SPOT_PAGE_SIZE", 10)
+    server = stub(fail=lambda number: 503 if number == 1 else None)
+    client = fast_client(retries=1)
+    provider = providers.AkshareProvider(kline_url=server.url, client=client, spot_url=server.spot_url,
+                                         quote_url=server.quote_url)
+    closes = fetch_spot_closes(provider)
+    assert sorted(closes) == sorted(code for code in SPOT_CODES if code != "000002")
+    assert closes["000001"] == 10.0 and client.retried == 1
+    assert [query["pn"] for query in server.requests if "pn" in query] == ["1", "2", "2", "3"]
+
+    prices = fetch_spot_prices(["sh000001", "sz399006"], provider)
+    assert prices["sh000001"] == prices["sz399006"] == 3000.5 and prices["600001"] == 18.0
+    assert server.requests[-1]["secids"] == "1.000001,0.399006"
+    assert len(server.connections) == 1
+    print("✓ 实时行情经过HTTP访问层测试通过")
+
+
+def test_falls_back_to_cache_when_upstream_down(tmp_path, stub):
+    """测试上游不可用时行情缓存和指数仓库返回本地已有的数据，依赖它的结果只短暂缓存"""
+    down = [False]
+    server = stub(fail=lambda number: 503 if down[0] else None, until="20250117")
+    provider = providers.AkshareProvider(kline_url=server.url, client=fast_client(retries=1, failure_threshold=2))
+    day = [date(2025, 1, 18)]
+    today = lambda: day[0]
+    cache = price_cache.PriceCache(str(tmp_path), provider.stock_hist, today=today)
+    store = index_store.IndexStore(str(tmp_path), provider.index_daily, today=today)
+    assert len(cache.get("600000", "20250102", "20250117")) == 12
+    assert len(store.history("sh000001")) == 12
+
+    day[0] = date(2025, 3, 3)
+    down[0] = True
+    sink = MemorySink()
+    metrics = make_metrics(sink)
+    metrics.begin()
+    dates, closes = cache.get_arrays("600000", "20250102", "20250228", metrics=metrics)
+    assert len(dates) == 12 and is_stale("600000")
+    assert len(store.history("sh000001", until="2025-02-28", metrics=metrics)) == 12
+    metrics.finish()
+    counters = sink.counters()
+    assert counters["price_cache_stale"] == 1 and counters["index_store_stale"] == 1
+    with pytest.raises(UpstreamError):
+        cache.get("000001", "20250102", "20250117")
+
+    # 用旧数据算出的历史区间结果按当日结果处理，拿到新数据后失效
+    results = ResultCache(live_ttl=60, today=today)
+    key = result_key("600000", "2025-01-02", "2025-02-28", "", "sh000001")
+    results.put(key, "旧数据结果")
+    down[0] = False
+    server.until = "20250228"
+    provider.client.breaker(server.url).record_success()
+    assert len(cache.get("600000", "20250102", "20250228")) == 42 and not is_stale("600000")
+    assert results.get(key) is None
+    print("✓ 上游不可用时的本地数据回退测试通过")
+
+
+def test_batch_survives_transient_errors(tmp_path, stub, monkeypatch):
+    """测试上游每隔几次请求返回一次错误时，批量分析的每只股票仍然成功"""
+    server = stub(fail=lambda number: 502 if number % 3 == 1 else None)
+    provider = providers.AkshareProvider(kline_url=server.url, client=fast_client(failure_threshold=10))
+    monkeypatch.setattr(providers, "_default_provider", provider)
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path)))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path)))
+    monkeypatch.setattr(price_cache, "_default_cache_provider", None)
+    monkeypatch.setattr(index_store, "_default_store_provider", None)
+
+    codes = ["600000", "600519", "000001", "000651", "300750", "688981", "830799"]
+    results = list(stock_analyzer_cli.iter_batch(codes, "2025-01-02", "2025-02-14", workers=4, rate=1000))
+    assert sorted(code for code, result, _ in results if result is not None) == sorted(codes)
+    assert provider.client.retried > 0
+    print("✓ 批量分析容错测试通过")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试大盘指数仓库的加载、增量更新与区间切片（使用离线的模拟数据源）
+"""
+from datetime import date
+
+import pandas as pd
+
+from index_store import IndexStore
+from price_cache import to_date
+
+
+class FakeIndexFetcher:
+    """按工作日生成指数行情的模拟数据源"""
+
+    def __init__(self, last_day):
+        self.last_day = last_day
+        self.calls = []
+
+    def __call__(self, index_symbol, start_date=None, end_date=None):
+        self.calls.append((index_symbol, start_date, end_date))
+        start = to_date(start_date) if start_date else date(2024, 12, 2)
+        days = pd.bdate_range(start, self.last_day)
+        # 接口返回的日期为字符串，且不保证有序
+        return pd.DataFrame({
+            "date": [d.strftime("%Y-%m-%d") for d in days][::-1],
+            "open": 3000.0, "close": [3000.0 + i for i in range(len(days))][::-1],
+            "high": 3010.0, "low": 2990.0, "volume": 1.0, "amount": 1.0,
+        })
+
+
+def test_range_is_sorted_and_date_indexed(tmp_path):
+    """测试切片已排序并以日期为索引"""
+    fetcher = FakeIndexFetcher(date(2025, 1, 31))
+    store = IndexStore(cache_dir=str(tmp_path), fetcher=fetcher, today=lambda: date(2025, 2, 3))
+    sliced = store.get_range("sh000001", "2025-01-06", "2025-01-10")
+    assert list(sliced.index.strftime("%Y-%m-%d")) == ["2025-01-06", "2025-01-07", "2025-01-08", "2025-01-09", "2025-01-10"]
+    assert sliced["close"].is_monotonic_increasing
+    assert str(sliced["date"].dtype).startswith("datetime64")
+
+    # 同一进程内重复使用不再访问数据源
+    store.get_range("sh000001", "2024-12-02", "2025-01-31")
+    assert len(fetcher.calls) == 1
+    print("✓ 指数切片测试通过")
+
+
+def test_new_process_appends_only_new_days(tmp_path):
+    """测试新进程从磁盘加载，只拉取新增交易日"""
+    fetcher = FakeIndexFetcher(date(2025, 1, 31))
+    IndexStore(cache_dir=str(tmp_path), fetcher=fetcher, today=lambda: date(2025, 2, 3)).history("sz399001")
+
+    # 历史区间完全由本地数据提供
+    store = IndexStore(cache_dir=str(tmp_path), fetcher=fetcher, today=lambda: date(2025, 2, 5))
+    store.get_range("sz399001", "2025-01-02", "2025-01-20")
+    assert len(fetcher.calls) == 1
+
+    fetcher.last_day = date(2025, 2, 4)
+    sliced = store.get_range("sz399001", "2025-01-27", "2025-02-04")
+    assert fetcher.calls[-1] == ("sz399001", "20250201", None)
+    assert sliced.index[-1] == pd.Timestamp("2025-02-04")
+    print("✓ 指数增量更新测试通过")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试盘中实时偏离值：收盘价与收盘后增量状态一致，越过阈值时提醒一次，录制的行情可回放
+"""
+import json
+
+import numpy as np
+
+from eod_state import SeriesState
+from intraday_monitor import IntradayMonitor, ReplayFeed, record_feed, run_monitor
+from test_deviation_engine import random_walk_fetcher, random_walk_index_fetcher
+from test_eod_state import CODES, make_store
+
+
+def test_final_prices_match_post_close_update(tmp_path):
+    """测试以当日收盘价作为最新价时，结果与 EodStateStore.apply_day 相同"""
+    store = make_store(tmp_path)
+    store.ensure(CODES, "2025-02-13")
+    monitor = IntradayMonitor.from_state_store(CODES, "2025-02-13", store)
+
+    prices = {}
+    for code in CODES:
+        frame = random_walk_fetcher(code, "20250214", "20250214")
+        if not frame.empty:
+            prices[code] = float(frame["收盘"].iloc[0])
+    for symbol in ("sh000001", "sz399001", "sz399006"):
+        prices[symbol] = float(random_walk_index_fetcher(symbol).set_index("date").loc["2025-02-14", "close"])
+    # 分两批到达：先是部分股票，然后是其余的股票和指数
+    monitor.update(dict(list(prices.items())[:1]))
+    monitor.update(prices)
+
+    index_closes = {symbol: prices[symbol] for symbol in ("sh000001", "sz399001", "sz399006")}
+    expected = store.apply_day("2025-02-14", {code: prices[code] for code in CODES if code in prices}, index_closes)
+    for code in CODES:
+        snapshot = monitor.snapshot(code)
+        assert set(snapshot) == set(expected[code])
+        for window, item in expected[code].items():
+            for name in ("stock_return", "index_return", "deviation", "avg_deviation"):
+                assert np.isclose(snapshot[window][name], item[name], rtol=1e-12, atol=1e-15)
+            assert snapshot[window]["advice"] == item["advice"]
+    print("✓ 收盘一致性测试通过")
+
+
+def flat_state(close, days=6):
+    state = SeriesState((3,))
+    for day in range(days):
+        state.apply(f"2025-03-{day + 1:02d}", close)
+    return state
+
+
+def test_replay_alerts_on_crossing(tmp_path):
+    """测试回放录制的分钟线，等级升高时提醒一次，回落后再次越过时重新提醒"""
+    monitor = IntradayMonitor(["600000", "000001"], {"600000": flat_state(10.0), "000001": flat_state(20.0)},
+                              {"sh000001": flat_state(3000.0), "sz399001": flat_state(10000.0)}, windows=(3,))
+    events = [
+        ("2025-03-07T09:31:00", "600000", 10.1), ("2025-03-07T09:31:00", "sh000001", 3000.0),
+        ("2025-03-07T09:32:00", "600000", 10.5),
+        ("2025-03-07T09:33:00", "600000", 11.0), ("2025-03-07T09:33:00", "000001", 19.9),
+        ("2025-03-07T09:34:00", "600000", 10.0),
+        ("2025-03-07T09:35:00", "600000", 10.6),
+    ]
+    path = tmp_path / "minute_bars.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for event_time, symbol, price in events:
+            f.write(json.dumps({"time": event_time, "symbol": symbol, "price": price}) + "\n")
+
+    recorded = tmp_path / "copy.jsonl"
+    alerts = run_monitor(monitor, record_feed(ReplayFeed(str(path)), str(recorded)))
+    assert [(alert.time.strftime("%H:%M"), alert.stock_code, alert.level) for alert in alerts] == [
+        ("09:32", "600000", "medium"), ("09:33", "600000", "high"), ("09:35", "600000", "medium"),
+    ]
+    assert alerts[1].index_symbol == "sh000001"
+    assert np.isclose(alerts[1].deviation, 0.1) and alerts[1].advice[0].startswith("股票表现强势")
+    assert monitor.updates == 5
+
+    # 录制的文件可以原样回放
+    assert [batch for _, batch in ReplayFeed(str(recorded))] == [batch for _, batch in ReplayFeed(str(path))]
+    print("✓ 回放提醒测试通过")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试多进程全市场扫描：结果与单进程计算完全一致，且按原来的列顺序合并
+"""
+import numpy as np
+import pandas as pd
+
+from deviation_engine import cross_sectional_deviation
+from market_scan import SharedMatrix, parallel_deviation, parallel_rolling_scan, scan_store
+from market_store import build_store
+from rolling_scanner import scan_rolling_windows
+
+
+def random_market(rows=80, columns=37, seed=3):
+    rng = np.random.default_rng(seed)
+    prices = 10 * np.cumprod(1 + rng.normal(0, 0.03, (rows, columns)), axis=0)
+    prices[rng.random((rows, columns)) < 0.05] = np.nan
+    index_prices = 3000 * np.cumprod(1 + rng.normal(0, 0.01, (rows, 3)), axis=0)
+    benchmarks = rng.integers(0, 3, columns)
+    return prices, index_prices, benchmarks
+
+
+def test_parallel_matches_single_process():
+    """测试多进程分块计算与单进程的横截面偏离值和滚动扫描结果完全相同"""
+    prices, index_prices, benchmarks = random_market()
+    prices[:, 5] = np.nan  # 全程停牌
+    expected = cross_sectional_deviation(prices, index_prices, benchmarks)
+    result = parallel_deviation(prices, index_prices, benchmarks, processes=2, chunk_size=5)
+    assert set(result) == set(expected)
+    for name in expected:
+        np.testing.assert_array_equal(result[name], expected[name])
+
+    dates = np.arange("2025-01-01", "2025-03-22", dtype="datetime64[D]")
+    codes = np.array([f"{600000 + column}" for column in range(prices.shape[1])])
+    expected = scan_rolling_windows(prices, index_prices, benchmarks, dates=dates, codes=codes)
+    result = parallel_rolling_scan(prices, index_prices, benchmarks, dates=dates, codes=codes,
+                                   processes=2, chunk_size=7)
+    pd.testing.assert_frame_equal(result, expected)
+    print("✓ 多进程计算一致性测试通过")
+
+
+def test_shared_matrix_is_released():
+    """测试共享内存复制后内容一致，关闭后释放"""
+    prices, _, _ = random_market(rows=4, columns=3)
+    with SharedMatrix(prices) as shared:
+        np.testing.assert_array_equal(shared.array, prices)
+        spec = shared.spec
+    assert shared.array is None and spec[0] == "shm"
+    print("✓ 共享内存释放测试通过")
+
+
+def test_scan_store(tmp_path):
+    """测试直接扫描内存映射存储，股票与所在市场的大盘列自动对应"""
+    dates = np.arange("2025-01-01", "2025-03-22", dtype="datetime64[D]")
+    prices, index_prices, _ = random_market(rows=len(dates), columns=4)
+    series = {
+        "600000": prices[:, 0], "000001": prices[:, 1], "300750": prices[:, 2], "600519": prices[:, 3],
+        "sh000001": index_prices[:, 0], "sz399001": index_prices[:, 1], "sz399006": index_prices[:, 2],
+    }
+    build_store(str(tmp_path), dates, list(series), lambda code: (dates, series[code]))
+
+    result = scan_store(str(tmp_path), "2025-01-10", "2025-03-01", processes=2, chunk_size=1)
+    assert list(result["code"]) == ["600000", "000001", "300750", "600519"]
+    assert list(result["benchmark"]) == ["sh000001", "sz399001", "sz399006", "sh000001"]
+    rows = (dates >= np.datetime64("2025-01-10")) & (dates <= np.datetime64("2025-03-01"))
+    expected = cross_sectional_deviation(prices[rows][:, [0, 1, 2, 3]], index_prices[rows], [0, 1, 2, 0])
+    np.testing.assert_array_equal(result["deviation"].to_numpy(), expected["deviation"])
+    assert set(result["level"]) <= {"none", "medium", "high"}
+    print("✓ 存储扫描测试通过")
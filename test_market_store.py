@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试全市场收盘价的内存映射存储
+"""
+import numpy as np
+
+import index_store
+import price_cache
+from analysis_core import analyze, get_index_for_stock
+from deviation_engine import cross_sectional_deviation
+from market_store import MarketStore, build_from_cache, build_store
+from test_deviation_engine import random_walk_fetcher, random_walk_index_fetcher
+
+
+def test_build_and_slice(tmp_path):
+    """测试按列写入、按日期二分切片以及零拷贝视图"""
+    dates = np.arange("2025-01-01", "2025-01-11", dtype="datetime64[D]")
+    series = {
+        "600000": (dates[[0, 2, 3, 9]], np.array([10.0, 10.5, 11.0, 12.0])),
+        "000001": (np.array(["2024-12-31", "2025-01-05"], dtype="datetime64[D]"), np.array([9.0, 9.5])),
+        "300750": (dates[:0], np.array([])),
+    }
+    build_store(str(tmp_path), dates, list(series), lambda code: series[code], dtype="float32")
+    store = MarketStore(str(tmp_path))
+    assert store.closes.dtype == np.float32 and isinstance(store.closes, np.memmap)
+    assert store.closes.shape == (10, 3)
+
+    window_dates, window = store.window("2025-01-03", "20250110")
+    assert list(window_dates) == list(dates[2:])
+    assert np.shares_memory(window, store.closes)
+    _, selected = store.get(["600000", "000001"], "2025-01-03", "2025-01-10")
+    assert np.shares_memory(selected, store.closes)
+    assert np.isnan(store.closes[:, 2]).all()
+
+    series_dates, closes = store.series("000001")
+    assert list(series_dates) == [np.datetime64("2025-01-05")] and list(closes) == [9.5]
+    assert list(store.series("600000", "2025-01-04")[1]) == [11.0, 12.0]
+    print("✓ 内存映射存储测试通过")
+
+
+def test_engine_on_store_matches_analyze(tmp_path, monkeypatch):
+    """测试从行情缓存生成存储后，横截面引擎的结果与单只分析一致"""
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), random_walk_fetcher))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), random_walk_index_fetcher))
+    codes = ["000001", "600000", "300750"]
+    start_date, end_date = "2025-01-02", "2025-02-14"
+    build_from_cache(str(tmp_path / "market"), codes, start_date, end_date)
+
+    store = MarketStore(str(tmp_path / "market"))
+    _, prices = store.get(codes, start_date, end_date)
+    symbols = [get_index_for_stock(code)[0] for code in codes]
+    _, index_prices = store.get(sorted(set(symbols)), start_date, end_date)
+    result = cross_sectional_deviation(prices, index_prices, [sorted(set(symbols)).index(s) for s in symbols])
+    for column, code in enumerate(codes):
+        expected = analyze(code, start_date, end_date)
+        assert result["deviation"][column] == expected.deviation
+        assert result["stock_avg_return"][column] == expected.stock_avg_return
+    print("✓ 存储与单只分析一致性测试通过")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试分阶段指标的记录与分位数统计（使用离线的模拟数据源）
+"""
+import json
+import logging
+
+import price_cache
+import providers
+import stock_analyzer_cli
+from metrics import NULL_METRICS, JsonlSink, MemorySink, Metrics, sink_from_spec
+from providers import SyntheticProvider
+
+
+def test_analyze_stock_emits_stage_metrics(tmp_path, monkeypatch):
+    """测试分析流程记录各阶段耗时、行数和缓存命中"""
+    monkeypatch.setattr(price_cache, "DEFAULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(providers, "_default_provider", SyntheticProvider(start="2024-01-01", end="2024-12-31"))
+    sink = MemorySink()
+    for _ in range(2):
+        stock_analyzer_cli.analyze_stock("600000", "2024-03-01", "2024-03-29", log=lambda message: None, metrics=Metrics(sink))
+
+    first, second = sink.records
+    assert first["ok"] and first["code"] == "600000"
+    assert set(first["stages"]) == {"fetch_stock", "fetch_index", "preprocess", "filter", "merge", "advice"}
+    assert first["rows"]["fetch_stock"] > 0
+    assert first["counters"]["price_cache_miss"] == 1
+    assert first["counters"]["bytes_fetched"] > 0
+    assert second["counters"]["price_cache_hit"] == 1
+    assert "bytes_fetched" not in second["counters"]
+
+    summary = sink.summary()
+    assert summary["fetch_stock"]["count"] == 2
+    assert summary["total"]["p50"] <= summary["total"]["p99"]
+    print("✓ 分阶段指标测试通过")
+
+
+def test_failed_analysis_is_recorded(tmp_path, monkeypatch):
+    """测试分析失败时也会输出一条记录"""
+    monkeypatch.setattr(price_cache, "DEFAULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(providers, "_default_provider", SyntheticProvider(start="2024-01-01", end="2024-12-31"))
+    sink = MemorySink()
+    stock_analyzer_cli.analyze_stock("600000", "2024-03-02", "2024-03-03", log=lambda message: None, metrics=Metrics(sink))
+    assert sink.records[0]["ok"] is False
+    print("✓ 失败记录测试通过")
+
+
+def test_jsonl_sink_and_null_metrics(tmp_path):
+    """测试JSONL输出以及未启用时的空实现"""
+    path = tmp_path / "metrics.jsonl"
+    sink = JsonlSink(str(path))
+    metrics = Metrics(sink)
+    metrics.mark("fetch_stock", rows=3)
+    metrics.finish(code="000001")
+    sink.close()
+    record = json.loads(path.read_text(encoding="utf-8").splitlines()[0])
+    assert record["code"] == "000001" and record["rows"]["fetch_stock"] == 3
+
+    assert not NULL_METRICS.enabled
+    NULL_METRICS.mark("fetch_stock", rows=1)
+    assert NULL_METRICS.finish(code="000001") is None
+    print("✓ 指标输出测试通过")
+
+
+def test_log_sink_writes_to_stderr(monkeypatch, capsys):
+    """测试未配置日志时 log 输出也会把记录写到标准错误输出"""
+    logger = logging.getLogger("stock_tools.metrics")
+    monkeypatch.setattr(logger, "handlers", [])
+    monkeypatch.setattr(logger, "level", logging.NOTSET)
+    monkeypatch.setattr(logger, "propagate", True)
+    metrics = Metrics(sink_from_spec("log"))
+    metrics.mark("fetch_stock", rows=3)
+    metrics.finish(code="600000", ok=True)
+    record = json.loads(capsys.readouterr().err.strip())
+    assert record["code"] == "600000" and record["rows"] == {"fetch_stock": 3}
+    print("✓ 日志输出测试通过")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试本地日线缓存的增量补齐功能（使用离线的模拟数据源）
+"""
+from datetime import date
+
+import pandas as pd
+
+from price_cache import PriceCache, missing_segments, to_date
+
+
+class FakeFetcher:
+    """按工作日生成行情的模拟数据源，记录每次请求的区间"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, stock_code, start_date, end_date):
+        self.calls.append((start_date, end_date))
+        days = pd.bdate_range(to_date(start_date), to_date(end_date))
+        return pd.DataFrame({
+            "日期": [d.date() for d in days],
+            "股票代码": stock_code,
+            "收盘": [10.0 + d.day / 10 for d in days],
+        })
+
+
+def test_missing_segments():
+    """测试缺失区间的计算"""
+    coverage = [(date(2025, 1, 10), date(2025, 1, 20))]
+    assert missing_segments(date(2025, 1, 12), date(2025, 1, 18), coverage) == []
+    assert missing_segments(date(2025, 1, 5), date(2025, 1, 25), coverage) == [
+        (date(2025, 1, 5), date(2025, 1, 9)),
+        (date(2025, 1, 21), date(2025, 1, 25)),
+    ]
+    print("✓ 缺失区间计算测试通过")
+
+
+def test_repeat_range_is_served_from_disk(tmp_path):
+    """测试重复分析同一区间只读取本地缓存"""
+    fetcher = FakeFetcher()
+    cache = PriceCache(cache_dir=str(tmp_path), fetcher=fetcher, today=lambda: date(2025, 3, 1))
+
+    first = cache.get("000001", "20250101", "20250131")
+    assert len(fetcher.calls) == 1
+
+    # 新实例模拟下一次运行
+    cache = PriceCache(cache_dir=str(tmp_path), fetcher=fetcher, today=lambda: date(2025, 3, 1))
+    second = cache.get("000001", "2025-01-01", "2025-01-31")
+    assert len(fetcher.calls) == 1
+    assert cache.hits == 1
+    assert list(second["日期"]) == list(first["日期"])
+    assert list(second["收盘"]) == list(first["收盘"])
+    print("✓ 缓存命中测试通过")
+
+
+def test_daily_rerun_fetches_only_new_tail(tmp_path):
+    """测试每日重跑只拉取新增的一天"""
+    fetcher = FakeFetcher()
+    cache = PriceCache(cache_dir=str(tmp_path), fetcher=fetcher, today=lambda: date(2025, 2, 4))
+    cache.get("600000", "20250106", "20250203")
+
+    cache.today = lambda: date(2025, 2, 5)
+    result = cache.get("600000", "20250107", "20250204")
+    assert fetcher.calls[-1] == ("20250204", "20250204")
+    assert result["日期"].iloc[0] == "2025-01-07"
+    assert result["日期"].iloc[-1] == "2025-02-04"
+    print("✓ 增量补齐测试通过")
+
+
+def test_today_is_not_persisted(tmp_path):
+    """测试当天未收盘的数据不会写入缓存"""
+    fetcher = FakeFetcher()
+    cache = PriceCache(cache_dir=str(tmp_path), fetcher=fetcher, today=lambda: date(2025, 2, 5))
+    cache.get("300750", "20250203", "20250205")
+    cache.get("300750", "20250203", "20250205")
+    assert fetcher.calls[-1] == ("20250205", "20250205")
+    print("✓ 当天数据不落盘测试通过")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试分析结果缓存：历史区间永不过期，包含今天的区间随行情更新、超时和跨天失效
+"""
+from datetime import date
+
+from result_cache import ResultCache, notify_data_update, result_key
+
+TODAY = date(2025, 3, 14)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_past_ranges_never_expire():
+    """测试结束日期早于今天的结果不受行情更新和时间影响"""
+    clock = FakeClock()
+    cache = ResultCache(live_ttl=60, clock=clock, today=lambda: TODAY)
+    key = result_key("600000", "2025-01-02", "2025-01-24", "", "sh000001")
+    cache.put(key, "历史结果")
+    notify_data_update("600000")
+    notify_data_update("sh000001")
+    clock.now = 86400 * 30
+    assert cache.get(key) == "历史结果"
+    assert cache.stats()["expirations"] == 0
+    print("✓ 历史区间缓存测试通过")
+
+
+def test_live_ranges_expire():
+    """测试包含今天的结果在股票或基准指数更新、超过TTL或跨天后失效"""
+    clock = FakeClock()
+    today = [TODAY]
+    cache = ResultCache(live_ttl=60, clock=clock, today=lambda: today[0])
+    key = result_key("000001", "2025-03-01", "2025-03-14", "", "sz399001")
+
+    cache.put(key, "盘中结果")
+    assert cache.get(key) == "盘中结果"
+    notify_data_update("sz399001")
+    assert cache.get(key) is None
+
+    cache.put(key, "盘中结果")
+    notify_data_update("600000")  # 无关代码的更新不影响
+    clock.now = 59
+    assert cache.get(key) == "盘中结果"
+    clock.now = 61
+    assert cache.get(key) is None
+
+    cache.put(key, "盘中结果")
+    today[0] = date(2025, 3, 15)
+    assert cache.get(key) is None
+    assert cache.stats()["expirations"] == 3
+    print("✓ 当日区间失效测试通过")
+
+
+def test_lru_eviction_and_stats():
+    """测试容量满时淘汰最久未使用的结果，并统计命中率"""
+    cache = ResultCache(max_entries=2, today=lambda: TODAY)
+    keys = [result_key(code, "2025-01-02", "2025-01-24", "", "sh000001") for code in ("600000", "600001", "600002")]
+    cache.put(keys[0], 0)
+    cache.put(keys[1], 1)
+    assert cache.get(keys[0]) == 0
+    cache.put(keys[2], 2)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 0 and cache.get(keys[2]) == 2
+
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.75
+    print("✓ 容量淘汰与统计测试通过")
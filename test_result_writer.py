@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试结构化结果输出：批量模式写出的 CSV/JSONL 可直接加载，分块写出时缓冲区不随行数增长
+"""
+import io
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import index_store
+import price_cache
+import stock_analyzer_cli
+from result_writer import RESULT_COLUMNS, CsvResultWriter, JsonlResultWriter, error_row, open_writer
+from test_index_store import FakeIndexFetcher
+from test_price_cache import FakeFetcher
+
+
+def test_batch_writes_structured_rows(tmp_path, monkeypatch):
+    """测试批量模式的 --output：英文列名、原始精度，失败的股票写 ok=false 和原因"""
+    monkeypatch.setattr(price_cache, "_default_cache", price_cache.PriceCache(str(tmp_path), FakeFetcher()))
+    monkeypatch.setattr(index_store, "_default_store", index_store.IndexStore(str(tmp_path), FakeIndexFetcher(date(2025, 1, 31))))
+    monkeypatch.setattr(price_cache, "_default_cache_provider", None)
+    monkeypatch.setattr(index_store, "_default_store_provider", None)
+    codes = ["000001", "600000", "300750", "12345"]
+    watchlist = tmp_path / "watchlist.txt"
+    watchlist.write_text("\n".join(codes), encoding="utf-8")
+
+    jsonl_path = tmp_path / "results.jsonl"
+    stock_analyzer_cli.main(["--batch", str(watchlist), "--start", "2025-01-02", "--end", "2025-01-24",
+                             "--rate", "1000", "--output", str(jsonl_path)])
+    rows = {row["code"]: row for row in map(json.loads, jsonl_path.read_text(encoding="utf-8").splitlines())}
+    assert set(rows) == set(codes)
+    assert all(list(row) == RESULT_COLUMNS for row in rows.values())
+    assert rows["12345"]["ok"] is False and rows["12345"]["error"]
+    expected = stock_analyzer_cli.analyze_result("600000", "2025-01-02", "2025-01-24", log=lambda message: None)
+    assert rows["600000"]["deviation"] == expected.deviation
+    assert rows["600000"]["level"] in ("none", "medium", "high")
+    assert rows["600000"]["trigger_1d_always"] in (True, False)
+
+    csv_path = tmp_path / "results.csv"
+    stock_analyzer_cli.main(["--batch", str(watchlist), "--start", "2025-01-02", "--end", "2025-01-24",
+                             "--rate", "1000", "--output", str(csv_path)])
+    frame = pd.read_csv(csv_path, dtype={"code": str}).set_index("code")
+    assert list(frame.columns) == RESULT_COLUMNS[1:]
+    assert frame.loc["600000", "deviation"] == expected.deviation
+    assert np.isnan(frame.loc["12345", "deviation"])
+    print("✓ 批量结构化输出测试通过")
+
+
+def test_chunked_writers_keep_buffer_bounded():
+    """测试逐行和按 DataFrame 写入时每满一块就写出，NaN 和 numpy 类型写为标准值"""
+    stream = io.StringIO()
+    writer = JsonlResultWriter(stream, columns=["code", "value", "flag"], chunk_size=4)
+    sizes = []
+    for position in range(10):
+        writer.write({"code": f"{position:06d}", "value": position / 3, "flag": position % 2 == 0})
+        sizes.append(len(writer._buffer))
+    assert max(sizes) < 4 and stream.getvalue().count("\n") == 8
+    writer.write_frame(pd.DataFrame({"code": ["000010"], "value": [np.nan], "flag": [np.bool_(True)]}))
+    writer.close()
+    rows = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(rows) == writer.rows == 11
+    assert rows[3] == {"code": "000003", "value": 1.0, "flag": False}
+    assert rows[-1] == {"code": "000010", "value": None, "flag": True}
+
+    stream = io.StringIO()
+    with CsvResultWriter(stream, columns=["code", "value"], chunk_size=2) as writer:
+        writer.write_frame(pd.DataFrame({"code": ["000001", "000002", "000003"], "value": [0.1, np.nan, 3]}))
+    assert stream.getvalue() == "code,value\n000001,0.1\n000002,\n000003,3.0\n"
+
+    with pytest.raises(ValueError, match="Parquet"):
+        open_writer("-", "parquet")
+    print("✓ 分块输出测试通过")
+
+
+def test_parquet_schema_is_declared_up_front(tmp_path):
+    """测试第一块只有失败的股票时，Parquet 的数值列仍为数值类型，之后成功的行可以写入"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "results.parquet"
+    success = {"code": "600000", "ok": True, "deviation": 0.12, "rule_id": 2, "trigger_1d_lower": 9.5,
+               "trigger_1d_always": False, "analyzed_at": "2025-01-24T15:00:00"}
+    with open_writer(str(path), chunk_size=2) as writer:
+        writer.write(error_row("000000", "无法获取股票数据"))
+        writer.write(error_row("000001", "无法获取股票数据"))
+        writer.write(success)
+    table = pq.read_table(path)
+    assert table.column_names == RESULT_COLUMNS and table.num_rows == 3
+    types = {field.name: str(field.type) for field in table.schema}
+    assert types["deviation"] == "double" and types["trigger_1d_lower"] == "double"
+    assert types["rule_id"] == "int64" and types["ok"] == "bool" and types["trigger_1d_always"] == "bool"
+    assert table.column("deviation").to_pylist() == [None, None, 0.12]
+
+    # 其他列按 DataFrame 的类型声明
+    frame = pd.DataFrame({"date": pd.to_datetime(["2025-01-02", "2025-01-03"]), "code": ["600000", "000001"],
+                          "window": [3, 5], "deviation": [np.nan, 0.3]})
+    path = tmp_path / "scan.parquet"
+    with open_writer(str(path), columns=list(frame.columns), chunk_size=1) as writer:
+        writer.write_frame(frame)
+    table = pq.read_table(path)
+    assert [str(field.type) for field in table.schema] == ["string", "string", "int64", "double"]
+    assert table.column("date").to_pylist() == ["2025-01-02", "2025-01-03"]
+    print("✓ Parquet 列类型测试通过")
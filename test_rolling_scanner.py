@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试滚动窗口偏离值扫描
+"""
+import numpy as np
+
+from rolling_scanner import PrefixSums, rolling_deviation, scan_rolling_windows
+
+
+def test_window_matches_direct_computation():
+    """测试前缀和结果与逐窗口直接计算一致"""
+    rng = np.random.default_rng(1)
+    prices = 10 * np.cumprod(1 + rng.normal(0, 0.03, (60, 4)), axis=0)
+    index_prices = 3000 * np.cumprod(1 + rng.normal(0, 0.01, (60, 2)), axis=0)
+    benchmarks = np.array([0, 1, 0, 1])
+
+    for window in (3, 5, 10, 30):
+        result = rolling_deviation(prices, index_prices, benchmarks, window)
+        assert np.isnan(result["deviation"][:window]).all()
+        for t in range(window, 60):
+            for column in range(4):
+                stock_window = prices[t - window:t + 1, column]
+                index_window = index_prices[t - window:t + 1, benchmarks[column]]
+                expected = (stock_window[-1] / stock_window[0] - 1) - (index_window[-1] / index_window[0] - 1)
+                expected_avg = np.mean(np.diff(stock_window) / stock_window[:-1]) - np.mean(np.diff(index_window) / index_window[:-1])
+                assert np.isclose(result["deviation"][t, column], expected, rtol=1e-10, atol=1e-12)
+                assert np.isclose(result["avg_deviation"][t, column], expected_avg, rtol=1e-10, atol=1e-12)
+    print("✓ 滚动窗口计算测试通过")
+
+
+def test_suspended_days_carry_last_close():
+    """测试停牌日沿用上一个收盘价"""
+    prices = np.array([10.0, np.nan, np.nan, 11.0, 12.0])
+    sums = PrefixSums(prices)
+    cumulative, _ = sums.window(3)
+    assert np.isclose(cumulative[3, 0], 0.1)
+    assert np.isclose(cumulative[4, 0], 12.0 / 10.0 - 1)
+    print("✓ 停牌处理测试通过")
+
+
+def test_scan_flags_threshold_crossings():
+    """测试扫描结果只包含超过阈值的窗口"""
+    index_prices = np.full(10, 100.0)
+    prices = np.column_stack([
+        np.full(10, 10.0),
+        [10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.5, 11.0, 11.0, 11.0],
+    ])
+    flagged = scan_rolling_windows(prices, index_prices, [0, 0], windows=(3,), codes=["000001", "600000"])
+    assert set(flagged["code"]) == {"600000"}
+    assert list(flagged["date"]) == [6, 7, 8, 9]
+    assert list(flagged["level"]) == ["medium", "high", "high", "medium"]
+    print("✓ 阈值扫描测试通过")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试交易日历：编号、区间、最近N个交易日与二分对齐
+"""
+from datetime import date
+
+import numpy as np
+
+from index_store import IndexStore
+from test_index_store import FakeIndexFetcher
+from trading_calendar import TradingCalendar, align_sorted, load_trading_calendar
+
+# 2025年春节休市：1月28日至2月4日
+TRADING_DAYS = ["2025-01-22", "2025-01-23", "2025-01-24", "2025-01-27", "2025-02-05", "2025-02-06", "2025-02-07"]
+
+
+def test_day_ids_and_ranges():
+    """测试交易日编号与区间查找，节假日不计入"""
+    calendar = TradingCalendar(TRADING_DAYS[::-1])
+    assert list(calendar.day_ids(["2025-01-27", "2025-01-28", "2025-02-05", "2025-01-22"])) == [3, -1, 4, 0]
+    assert calendar.range_ids("2025-01-25", "2025-02-05") == (3, 5)
+    assert [str(day) for day in calendar.trading_days("2025-01-28", "2025-02-06")] == ["2025-02-05", "2025-02-06"]
+    print("✓ 交易日编号测试通过")
+
+
+def test_last_n_trading_days():
+    """测试最近N个交易日跨越长假，且结束日为非交易日或日历之后的工作日时的处理"""
+    calendar = TradingCalendar(TRADING_DAYS)
+    assert calendar.last_n(3, "2025-02-07") == ("2025-01-27", "2025-02-07")
+    assert calendar.last_n(2, "2025-02-02") == ("2025-01-23", "2025-01-27")
+    # 2025-02-10（周一）不在日历中，按交易日处理
+    assert calendar.last_n(1, "2025-02-10") == ("2025-02-07", "2025-02-10")
+    assert calendar.last_n(30, "2025-02-07") == ("2025-01-22", "2025-02-07")
+    print("✓ 最近N个交易日测试通过")
+
+
+def test_align_sorted_matches_intersect():
+    """测试二分对齐与 intersect1d 的结果一致"""
+    rng = np.random.default_rng(1)
+    days = np.arange("2024-01-01", "2025-01-01", dtype="datetime64[D]")
+    left = np.sort(rng.choice(days, 200, replace=False))
+    right = np.sort(rng.choice(days, 250, replace=False))
+    left_rows, right_rows = align_sorted(left, right)
+    _, expected_left, expected_right = np.intersect1d(left, right, assume_unique=True, return_indices=True)
+    assert list(left_rows) == list(expected_left) and list(right_rows) == list(expected_right)
+    print("✓ 二分对齐测试通过")
+
+
+def test_calendar_from_index_store(tmp_path):
+    """测试从指数仓库加载日历，并以工作日补齐到今天"""
+    store = IndexStore(str(tmp_path), FakeIndexFetcher(date(2025, 1, 31)), today=lambda: date(2025, 2, 3))
+    calendar = load_trading_calendar(store, today=date(2025, 2, 3))
+    assert str(calendar.days[-1]) == "2025-02-03"
+    assert np.is_busday(calendar.days).all()
+    print("✓ 日历加载测试通过")
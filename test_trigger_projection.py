@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试触发价格预测：按预测价格补齐未来几天后，滚动窗口的综合偏离度恰好落在阈值上
+"""
+import numpy as np
+
+from rolling_scanner import rolling_deviation
+from trigger_projection import project_for_stock, project_trigger_prices
+
+
+def combined_after(prices, index_prices, benchmarks, window, column, day, price, index_move):
+    """把股票第 day 天的收盘价设为 price（之前不变）、大盘每天涨跌 index_move 后的综合偏离度"""
+    stock_future = np.repeat(prices[-1:], day, axis=0)
+    stock_future[-1, column] = price
+    index_future = index_prices[-1] * (1 + index_move) ** np.arange(1, day + 1)[:, None]
+    result = rolling_deviation(np.concatenate([prices, stock_future]), np.concatenate([index_prices, index_future]),
+                               benchmarks, window)
+    return (abs(result["deviation"][-1, column]) + abs(result["avg_deviation"][-1, column])) / 2
+
+
+def test_trigger_prices_hit_threshold():
+    """测试全市场预测的上下触发价格代入后综合偏离度等于阈值，任意价格都超过阈值时给出标记"""
+    rng = np.random.default_rng(5)
+    prices = 10 * np.cumprod(1 + rng.normal(0, 0.02, (12, 30)), axis=0)
+    prices[-3, 4] = np.nan  # 停牌沿用上一个收盘价
+    prices[-2:, 7] *= 2  # 两天前翻倍，窗口内已大幅偏离
+    index_prices = 3000 * np.cumprod(1 + rng.normal(0, 0.01, (12, 2)), axis=0)
+    benchmarks = rng.integers(0, 2, 30)
+
+    for window in (3, 5):
+        result = project_trigger_prices(prices, index_prices, benchmarks, window, index_move=0.01, threshold=0.05)
+        assert result["upper"].shape == (3, 30)
+        for position, day in enumerate(result["days"]):
+            for column in range(30):
+                if result["always"][position, column]:
+                    for price in (prices[-1, column] * 0.5, prices[-3, column], prices[-1, column] * 2):
+                        assert combined_after(prices, index_prices, benchmarks, window, column, day, price, 0.01) > 0.05
+                    continue
+                for key in ("upper", "lower"):
+                    price = result[key][position, column]
+                    if np.isnan(price):
+                        continue
+                    value = combined_after(prices, index_prices, benchmarks, window, column, day, price, 0.01)
+                    assert np.isclose(value, 0.05, rtol=1e-9)
+                assert result["lower"][position, column] < result["upper"][position, column]
+        assert result["always"][0, 7]
+    print("✓ 触发价格测试通过")
+
+
+def test_single_stock_fills_missing_days():
+    """测试单只股票按大盘交易日对齐，缺少的交易日沿用上一个收盘价"""
+    index_dates = np.arange("2025-01-06", "2025-01-11", dtype="datetime64[D]")
+    index_closes = np.array([3000.0, 3010.0, 3020.0, 3015.0, 3030.0])
+    stock_dates = index_dates[[0, 1, 3, 4]]
+    stock_closes = np.array([10.0, 10.2, 10.1, 10.3])
+    projection = project_for_stock(stock_dates, stock_closes, index_dates, index_closes, threshold=0.05)
+    expected = project_trigger_prices(np.array([10.0, 10.2, 10.2, 10.1, 10.3]), index_closes, [0], 4, threshold=0.05)
+    assert [item.day for item in projection] == [1, 2, 3]
+    assert [item.upper for item in projection] == list(expected["upper"][:, 0])
+    assert projection[0].describe().startswith("收盘价高于")
+    print("✓ 单只股票预测测试通过")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试自选股监控表的数据模型：批量写入、排序与按需取行
+"""
+import time
+
+import numpy as np
+
+from watchlist_model import PENDING_TEXT, WatchlistModel
+
+
+def result(deviation):
+    return 0.1, 0.1 - deviation, deviation, f"建议{deviation}", "", ""
+
+
+def test_batched_updates_and_sorting():
+    """测试后台结果批量写入，排序时未分析和失败的行排在最后"""
+    model = WatchlistModel(["000001", "600000", "300750", "000002", "000001"])
+    assert len(model) == 4
+    model.post("600000", result(0.03))
+    model.post("300750", result(-0.08))
+    model.post("000002", None, "无法获取股票数据，请检查股票代码和日期范围是否正确")
+    model.post("600000", result(0.01))
+    assert model.rows(0, 4)[1][4] == PENDING_TEXT
+    assert model.apply_pending() == 3
+    assert model.completed == 3 and model.apply_pending() == 0
+
+    model.sort("deviation")
+    assert [row[0] for row in model.rows(0, 4)] == ["600000", "300750", "000001", "000002"]
+    model.sort("deviation")
+    assert [row[0] for row in model.rows(0, 4)] == ["300750", "600000", "000001", "000002"]
+    assert model.rows(0, 1)[0][3] == "-8.00%"
+
+    model.post("000001", result(0.5))
+    model.apply_pending()
+    assert model.rows(0, 1)[0][0] == "300750" and model.rows(1, 1)[0][0] == "600000"
+    model.sort("code", descending=False)
+    assert [row[0] for row in model.rows(1, 2)] == ["000002", "300750"]
+    print("✓ 批量写入与排序测试通过")
+
+
+def test_full_market_sort_is_instant():
+    """测试全市场列表排序和取一屏数据的耗时"""
+    codes = [f"{i:06d}" for i in range(5000)]
+    model = WatchlistModel(codes)
+    rng = np.random.default_rng(0)
+    for code, deviation in zip(codes, rng.normal(0, 0.05, len(codes))):
+        model.post(code, result(deviation))
+    model.apply_pending()
+    started = time.perf_counter()
+    model.sort("deviation", descending=True)
+    rows = model.rows(0, 25)
+    assert time.perf_counter() - started < 0.05
+    assert len(rows) == 25
+    values = model.numbers["deviation"][model.order]
+    assert (np.diff(values) <= 0).all()
+    print("✓ 全市场排序测试通过")
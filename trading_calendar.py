@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+交易日历
+
+以上证指数有行情的日期作为交易所的交易日，给每个交易日一个从0开始的整数编号。
+区间查找、对齐和"最近N个交易日"都在已排序的数组上二分查找，不需要解析日期或 merge。
+日历之后的工作日（如当天尚未收盘、或指数数据暂时无法获取时）按交易日处理。
+"""
+import threading
+from datetime import date
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+from index_store import get_index_store
+from price_cache import to_date
+
+CALENDAR_SYMBOL = "sh000001"
+CALENDAR_START = "1990-12-19"
+
+
+def _to_day(value):
+    return np.datetime64(to_date(value), "D")
+
+
+def align_sorted(left, right):
+    """
+    在已排序、无重复的 right 中二分查找 left 的每个元素
+    返回两边都存在的元素 (left中的位置, right中的位置)，按 left 的顺序排列
+    """
+    positions = np.searchsorted(right, left)
+    found = positions < len(right)
+    found[found] = right[positions[found]] == left[found]
+    return np.flatnonzero(found), positions[found]
+
+
+class TradingCalendar:
+    """已排序的交易日数组，编号即数组下标"""
+
+    def __init__(self, days):
+        self.days = np.unique(np.asarray(days).astype("datetime64[D]"))
+
+    def __len__(self):
+        return len(self.days)
+
+    def extended(self, end_date):
+        """返回把最后一天之后到 end_date 为止的工作日补为交易日的新日历"""
+        end = _to_day(end_date)
+        last = self.days[-1] if len(self.days) else end - np.timedelta64(1, "D")
+        if end <= last:
+            return self
+        extra = np.arange(last + np.timedelta64(1, "D"), end + np.timedelta64(1, "D"), dtype="datetime64[D]")
+        return TradingCalendar(np.concatenate([self.days, extra[np.is_busday(extra)]]))
+
+    def day_ids(self, dates):
+        """返回日期对应的交易日编号，非交易日为-1"""
+        dates = np.asarray(dates).astype("datetime64[D]")
+        rows, positions = align_sorted(dates, self.days)
+        result = np.full(len(dates), -1, dtype=np.int64)
+        result[rows] = positions
+        return result
+
+    def range_ids(self, start_date, end_date):
+        """返回 [start_date, end_date] 内交易日的编号区间 (lo, hi)，hi 不含"""
+        lo = int(np.searchsorted(self.days, _to_day(start_date), side="left"))
+        hi = int(np.searchsorted(self.days, _to_day(end_date), side="right"))
+        return lo, hi
+
+    def trading_days(self, start_date, end_date):
+        lo, hi = self.range_ids(start_date, end_date)
+        return self.days[lo:hi]
+
+    def last_n(self, n, end_date=None):
+        """
+        最近N个交易日的起止日期（YYYY-MM-DD）
+        区间包含N个交易日的涨跌幅，即起始日为结束日往前第N个交易日（基准收盘价所在日），
+        与 rolling_scanner 的N日窗口口径一致
+        """
+        if n < 1:
+            raise ValueError("交易日数必须大于0")
+        end_date = end_date or date.today()
+        days = self.extended(end_date).days
+        end_id = int(np.searchsorted(days, _to_day(end_date), side="right")) - 1
+        if end_id < 0:
+            raise ValueError(f"{to_date(end_date)} 之前没有交易日")
+        start_id = max(end_id - n, 0)
+        return str(days[start_id]), str(days[end_id])
+
+
+def weekday_calendar(start_date, end_date):
+    """没有指数数据时以工作日近似交易日"""
+    days = np.arange(_to_day(start_date), _to_day(end_date) + np.timedelta64(1, "D"), dtype="datetime64[D]")
+    return TradingCalendar(days[np.is_busday(days)])
+
+
+_calendar = None
+_calendar_day = None
+_calendar_lock = threading.Lock()
+
+
+def load_trading_calendar(index_store, today=None):
+    """由指数仓库中上证指数的交易日生成日历，并补齐到今天；指数数据无法获取时以工作日近似"""
+    today = today or date.today()
+    try:
+        days, _ = index_store.get_range_arrays(CALENDAR_SYMBOL, CALENDAR_START, today)
+        calendar = TradingCalendar(days)
+    except Exception:
+        calendar = TradingCalendar([])
+    if len(calendar) == 0:
+        calendar = weekday_calendar(f"{today.year - 1}-01-01", today)
+    return calendar.extended(today)
+
+
+def get_trading_calendar():
+    """返回进程内共享的交易日历，每天最多从默认指数仓库加载一次"""
+    global _calendar, _calendar_day
+    today = date.today()
+    with _calendar_lock:
+        if _calendar is None or _calendar_day != today:
+            _calendar, _calendar_day = load_trading_calendar(get_index_store(), today), today
+        return _calendar
+
+
+def last_trading_days(n, end_date=None):
+    """最近N个交易日的 (起始日期, 结束日期)"""
+    return get_trading_calendar().last_n(n, end_date)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+未来第1～3天的触发价格预测
+
+对长度为 N 个交易日的滚动窗口（口径同 rolling_scanner：停牌日沿用上一个收盘价），
+假设股票在此之前每天收盘价不变、大盘每天涨跌 index_move，求第k天的收盘价 P
+在多少时综合偏离度恰好达到阈值：
+
+    偏离值(P)       = P / 窗口基准价 - 1 - 大盘累计涨幅
+    平均日偏离(P)   = (窗口内已知的日收益率之和 + P / 最新收盘价 - 1) / N - 大盘平均日收益率
+    综合偏离度(P)   = (|偏离值(P)| + |平均日偏离(P)|) / 2
+
+两项都是 P 的一次函数，综合偏离度是分段线性的凸函数，与阈值的交点有闭式解：
+收盘价高于 upper 或低于 lower 时越过阈值。任意价格都超过阈值时 always 为真，
+upper/lower 为NaN。全部股票、全部天数都在数组上一次算出，不需要逐只循环。
+"""
+from dataclasses import dataclass
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+from advice_rules import get_advice_rules
+from deviation_engine import forward_fill
+
+DEFAULT_DAYS = (1, 2, 3)
+DEFAULT_INDEX_MOVE = 0.0
+DEFAULT_LEVEL = "high"
+
+
+@dataclass
+class TriggerPrice:
+    """单只股票第 day 天的触发价格，不存在时为NaN"""
+
+    day: int
+    lower: float
+    upper: float
+    always: bool
+
+    def describe(self):
+        if self.always:
+            return "任意收盘价均超过阈值"
+        parts = []
+        if not np.isnan(self.upper):
+            parts.append(f"收盘价高于 {self.upper:.2f}")
+        if not np.isnan(self.lower):
+            parts.append(f"低于 {self.lower:.2f}" if parts else f"收盘价低于 {self.lower:.2f}")
+        return " 或".join(parts) if parts else "无法估算"
+
+    def to_dict(self):
+        return {
+            "day": self.day,
+            "lower": None if np.isnan(self.lower) else float(self.lower),
+            "upper": None if np.isnan(self.upper) else float(self.upper),
+            "always": bool(self.always),
+        }
+
+
+def default_threshold():
+    """规则表中 level 为 high 的最小阈值（内置规则为 HIGH_DEVIATION_THRESHOLD）"""
+    return get_advice_rules().thresholds(DEFAULT_LEVEL)
+
+
+def _solve(alpha, beta, gamma, delta, target):
+    """
+    求 |alpha·P + beta| + |gamma·P + delta| = target 的最小和最大正根（alpha、gamma > 0）
+    在四种符号组合各自的线性段上求解，保留符号自洽的解
+    """
+    lower = np.full(np.shape(alpha), np.inf)
+    upper = np.full(np.shape(alpha), -np.inf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for sign_a in (1.0, -1.0):
+            for sign_b in (1.0, -1.0):
+                denominator = sign_a * alpha + sign_b * gamma
+                price = (target - sign_a * beta - sign_b * delta) / denominator
+                tolerance = 1e-12 * (1 + np.abs(price) * (alpha + gamma))
+                valid = ((denominator != 0) & (price > 0)
+                         & (sign_a * (alpha * price + beta) >= -tolerance)
+                         & (sign_b * (gamma * price + delta) >= -tolerance))
+                lower = np.where(valid & (price < lower), price, lower)
+                upper = np.where(valid & (price > upper), price, upper)
+        # 两条线性函数的零点处取到最小值
+        kinks = np.stack([-beta / alpha, -delta / gamma])
+        minimum = (np.abs(alpha * kinks + beta) + np.abs(gamma * kinks + delta)).min(axis=0)
+    always = minimum > target
+    lower = np.where(np.isinf(lower) | always, np.nan, lower)
+    upper = np.where(np.isinf(upper) | always, np.nan, upper)
+    return lower, upper, always & ~np.isnan(minimum)
+
+
+def project_trigger_prices(prices, index_prices, benchmark_columns, window, index_move=DEFAULT_INDEX_MOVE,
+                           threshold=None, days=DEFAULT_DAYS):
+    """
+    计算全部股票未来各天的触发价格
+
+    prices: (交易日, 股票) 收盘价矩阵，最后一行为最新交易日，停牌为NaN
+    index_prices: (交易日, 指数) 收盘价矩阵，行与 prices 对齐
+    benchmark_columns: 每只股票对应 index_prices 的列
+    window: 滚动窗口包含的日收益率个数 N，需要最后 N+1 行数据
+    threshold: 综合偏离度阈值，默认取规则表中"较大"的阈值
+
+    返回字典：lower、upper（形状为 (天数, 股票)）、always（同形状的布尔数组）、days、threshold
+    """
+    threshold = default_threshold() if threshold is None else threshold
+    prices = np.asarray(prices, dtype=np.float64)
+    index_prices = np.asarray(index_prices, dtype=np.float64)
+    if prices.ndim == 1:
+        prices = prices[:, None]
+    if index_prices.ndim == 1:
+        index_prices = index_prices[:, None]
+    if window < 1 or prices.shape[0] < window + 1:
+        raise ValueError(f"至少需要 {window + 1} 个交易日的数据")
+    benchmark_columns = np.asarray(benchmark_columns, dtype=np.intp)
+    days = tuple(days)
+    horizon = max(days)
+
+    stock = forward_fill(prices)[-(window + 1):]
+    index = forward_fill(index_prices)[-(window + 1):]
+    # 未来 horizon 天：股票收盘价不变，大盘每天涨跌 index_move
+    growth = (1 + index_move) ** np.arange(1, horizon + 1)
+    index = np.concatenate([index, index[-1] * growth[:, None]])
+    stock = np.concatenate([stock, np.repeat(stock[-1:], horizon, axis=0)])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stock_returns = stock[1:] / stock[:-1] - 1
+        index_returns = index[1:] / index[:-1] - 1
+    stock_sums = np.concatenate([np.zeros((1, stock.shape[1])), np.cumsum(stock_returns, axis=0)])
+    index_sums = np.concatenate([np.zeros((1, index.shape[1])), np.cumsum(index_returns, axis=0)])
+    last_close = stock[window]
+
+    lower = np.full((len(days), prices.shape[1]), np.nan)
+    upper = np.full_like(lower, np.nan)
+    always = np.zeros(lower.shape, dtype=bool)
+    for position, day in enumerate(days):
+        # 第 day 天的窗口为扩展后的第 day 行到第 window+day 行
+        end = window + day
+        index_cumulative = (index[end] / index[day] - 1)[benchmark_columns]
+        index_average = ((index_sums[end] - index_sums[day]) / window)[benchmark_columns]
+        known_sum = stock_sums[end - 1] - stock_sums[day]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            alpha = 1 / stock[day]
+            gamma = 1 / (window * last_close)
+        beta = -1 - index_cumulative
+        delta = (known_sum - 1) / window - index_average
+        lower[position], upper[position], always[position] = _solve(alpha, beta, gamma, delta, 2 * threshold)
+    return {"lower": lower, "upper": upper, "always": always, "days": days, "threshold": threshold}
+
+
+def project_for_stock(stock_dates, stock_closes, index_dates, index_closes, index_move=DEFAULT_INDEX_MOVE,
+                      threshold=None, days=DEFAULT_DAYS):
+    """
+    单只股票：以分析区间内大盘的交易日为窗口（N 为交易日数减1），返回 TriggerPrice 列表
+    股票在区间内缺少的交易日沿用上一个收盘价；数据不足时返回空列表
+    """
+    from trading_calendar import align_sorted
+
+    if len(index_dates) < 2:
+        return []
+    aligned = np.full(len(index_dates), np.nan)
+    stock_rows, index_rows = align_sorted(np.asarray(stock_dates), np.asarray(index_dates))
+    aligned[index_rows] = np.asarray(stock_closes, dtype=np.float64)[stock_rows]
+    result = project_trigger_prices(aligned, index_closes, [0], len(index_dates) - 1, index_move, threshold, days)
+    return [TriggerPrice(day, float(result["lower"][position, 0]), float(result["upper"][position, 0]),
+                         bool(result["always"][position, 0]))
+            for position, day in enumerate(result["days"])]
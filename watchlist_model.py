@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+自选股监控表的数据模型
+
+与界面无关：每列保存为一个数组，排序只重排行号，界面只取当前可见的几十行显示。
+后台线程通过 post 提交结果，主线程定时调用 apply_pending 一次性写入，避免每条结果触发一次界面刷新。
+"""
+import threading
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+# (列名, 标题)
+COLUMNS = [
+    ("code", "股票代码"),
+    ("stock_return", "股票累计涨幅"),
+    ("index_return", "大盘累计涨幅"),
+    ("deviation", "偏离值"),
+    ("advice", "第1天建议"),
+]
+NUMERIC_COLUMNS = ("stock_return", "index_return", "deviation")
+PENDING_TEXT = "等待分析"
+
+
+class WatchlistModel:
+    """自选股列表的结果与排序，post 可在任意线程调用，其余方法只在主线程调用"""
+
+    def __init__(self, stock_codes):
+        self.codes = list(dict.fromkeys(stock_codes))
+        self._rows = {code: row for row, code in enumerate(self.codes)}
+        self.numbers = {name: np.full(len(self.codes), np.nan) for name in NUMERIC_COLUMNS}
+        self.texts = [PENDING_TEXT] * len(self.codes)
+        self.order = np.arange(len(self.codes))
+        self.sort_column = None
+        self.descending = False
+        self.completed = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def post(self, stock_code, result, message=""):
+        """
+        提交一只股票的结果，result 为 analyze_stock 的6元组，失败时为None并附带 message
+        同一只股票在写入前多次提交时只保留最后一次
+        """
+        with self._lock:
+            self._pending[stock_code] = (result, message)
+
+    def apply_pending(self):
+        """把后台提交的结果写入各列，返回本次写入的行数；已按某列排序时重新排序"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for stock_code, (result, message) in pending.items():
+            row = self._rows.get(stock_code)
+            if row is None:
+                continue
+            if self.texts[row] == PENDING_TEXT:
+                self.completed += 1
+            if result is None:
+                for name in NUMERIC_COLUMNS:
+                    self.numbers[name][row] = np.nan
+                self.texts[row] = message
+            else:
+                stock_return, index_return, deviation, advice_1d = result[:4]
+                self.numbers["stock_return"][row] = stock_return
+                self.numbers["index_return"][row] = index_return
+                self.numbers["deviation"][row] = deviation
+                self.texts[row] = advice_1d
+        if pending and self.sort_column is not None:
+            self._resort()
+        return len(pending)
+
+    def sort(self, column, descending=None):
+        """按列排序；descending 为None时，再次按同一列排序会切换升降序。未分析的行始终排在最后"""
+        if descending is None:
+            descending = not self.descending if column == self.sort_column else column in NUMERIC_COLUMNS
+        self.sort_column = column
+        self.descending = descending
+        self._resort()
+
+    def _resort(self):
+        column = self.sort_column
+        if column in NUMERIC_COLUMNS:
+            values = self.numbers[column]
+            keys = -values if self.descending else values.copy()
+            keys[np.isnan(keys)] = np.inf
+            self.order = np.argsort(keys, kind="stable")
+            return
+        values = np.array(self.codes if column == "code" else self.texts)
+        order = np.argsort(values, kind="stable")
+        self.order = order[::-1] if self.descending else order
+
+    def rows(self, offset, count):
+        """返回排序后第 offset 行起的 count 行，每行为各列的显示文本"""
+        rows = []
+        for row in self.order[offset:offset + count]:
+            numbers = [self.numbers[name][row] for name in NUMERIC_COLUMNS]
+            cells = ["" if np.isnan(value) else f"{value * 100:.2f}%" for value in numbers]
+            rows.append((self.codes[row], *cells, self.texts[row]))
+        return rows
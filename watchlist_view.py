@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+自选股监控窗口
+
+表格只创建一屏的行（ttk.Treeview 固定数量的条目），滚动和排序时只改写这些条目的内容，
+几千只股票的列表也不会创建几千个界面元素。后台分析的结果先写入 WatchlistModel，
+由定时器每隔 FLUSH_INTERVAL_MS 毫秒批量刷新一次。
+"""
+import threading
+from tkinter import filedialog, ttk
+
+import customtkinter as ctk
+
+from stock_analyzer_cli import iter_batch, read_watchlist
+from watchlist_model import COLUMNS, WatchlistModel
+
+FLUSH_INTERVAL_MS = 200
+VISIBLE_ROWS = 25
+
+
+class VirtualTable:
+    """只渲染可见行的表格"""
+
+    def __init__(self, parent, model, height=VISIBLE_ROWS):
+        self.model = model
+        self.height = height
+        self.offset = 0
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=[name for name, _ in COLUMNS], show="headings",
+                                 height=height, selectmode="browse")
+        for name, title in COLUMNS:
+            self.tree.heading(name, text=title, command=lambda column=name: self.sort(column))
+            self.tree.column(name, width=360 if name == "advice" else 100, anchor="w" if name == "advice" else "center")
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self._on_scrollbar)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        # 滚轮事件：Windows/macOS 为 <MouseWheel>，X11 为 <Button-4>/<Button-5>
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1) or "break")
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-1) or "break")
+        self.tree.bind("<Button-5>", lambda event: self.scroll(1) or "break")
+
+        self.items = [self.tree.insert("", "end", values=[""] * len(COLUMNS)) for _ in range(height)]
+        self.refresh()
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_model(self, model):
+        self.model = model
+        self.offset = 0
+        self.refresh()
+
+    def refresh(self):
+        """用当前可见的行改写固定的条目"""
+        rows = self.model.rows(self.offset, self.height)
+        for index, item in enumerate(self.items):
+            self.tree.item(item, values=rows[index] if index < len(rows) else [""] * len(COLUMNS))
+        total = max(len(self.model), 1)
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.height) / total))
+        for name, title in COLUMNS:
+            arrow = ""
+            if name == self.model.sort_column:
+                arrow = " ▼" if self.model.descending else " ▲"
+            self.tree.heading(name, text=title + arrow)
+
+    def scroll(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    def scroll_to(self, offset):
+        self.offset = max(0, min(int(offset), len(self.model) - self.height))
+        self.refresh()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(value) * len(self.model))
+        elif action == "scroll":
+            step = self.height if unit == "pages" else 1
+            self.scroll(int(value) * step)
+
+    def sort(self, column):
+        self.model.sort(column)
+        self.refresh()
+
+
+class WatchlistWindow:
+    """自选股批量分析窗口，时间范围和复权方式取自主窗口"""
+
+    def __init__(self, app):
+        self.app = app
+        self.model = WatchlistModel([])
+        self.running = False
+
+        self.window = ctk.CTkToplevel(app.root)
+        self.window.title("自选股监控")
+        self.window.geometry("900x700")
+
+        input_frame = ctk.CTkFrame(self.window)
+        input_frame.pack(pady=10, padx=20, fill="x")
+        self.codes_textbox = ctk.CTkTextbox(input_frame, height=80)
+        self.codes_textbox.pack(side="left", padx=10, pady=10, fill="x", expand=True)
+        self.codes_textbox.insert("0.0", "# 每行一个或多个股票代码，以逗号或空白分隔\n")
+
+        buttons_frame = ctk.CTkFrame(input_frame)
+        buttons_frame.pack(side="right", padx=10, pady=10)
+        ctk.CTkButton(buttons_frame, text="从文件加载", command=self.load_file).pack(pady=5)
+        self.start_button = ctk.CTkButton(buttons_frame, text="分析全部", command=self.start)
+        self.start_button.pack(pady=5)
+
+        self.status_label = ctk.CTkLabel(self.window, text="")
+        self.status_label.pack(padx=20, anchor="w")
+
+        self.table = VirtualTable(self.window, self.model)
+        self.table.pack(pady=10, padx=20, fill="both", expand=True)
+
+        self.window.after(FLUSH_INTERVAL_MS, self.flush)
+
+    def load_file(self):
+        path = filedialog.askopenfilename(parent=self.window, title="选择自选股列表")
+        if not path:
+            return
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        self.codes_textbox.delete("0.0", "end")
+        self.codes_textbox.insert("0.0", content)
+
+    def start(self):
+        if self.running:
+            return
+        stock_codes = read_watchlist(self.codes_textbox.get("0.0", "end").splitlines())
+        start_date = self.app.start_date_entry.get().strip()
+        end_date = self.app.end_date_entry.get().strip()
+        adjust = self.app.selected_adjust()
+        if not stock_codes or not start_date or not end_date:
+            self.status_label.configure(text="请输入股票代码和起止日期")
+            return
+
+        self.model = WatchlistModel(stock_codes)
+        self.table.set_model(self.model)
+        self.running = True
+        self.start_button.configure(state="disabled")
+        thread = threading.Thread(target=self._run, args=(self.model, stock_codes, start_date, end_date, adjust),
+                                  daemon=True)
+        thread.start()
+
+    def _run(self, model, stock_codes, start_date, end_date, adjust):
+        try:
+            for stock_code, result, message in iter_batch(stock_codes, start_date, end_date, adjust=adjust):
+                model.post(stock_code, result, message)
+        finally:
+            self.running = False
+
+    def flush(self):
+        """定时批量写入后台结果并刷新可见行"""
+        if not self.window.winfo_exists():
+            return
+        if self.model.apply_pending():
+            self.table.refresh()
+        status = f"已完成 {self.model.completed}/{len(self.model)}"
+        if not self.running:
+            self.start_button.configure(state="normal")
+        self.status_label.configure(text=status if len(self.model) else "")
+        self.window.after(FLUSH_INTERVAL_MS, self.flush)